@@ -10,3 +10,7 @@ ES_INDEX = "patate-db"
 LOG_INDEX = "logs"
 ENV_VAR_FOR_ES_USER_ID = "PATATE_ES_USER_ID"
 ENV_VAR_FOR_ES_USER_KEY = "PATATE_ES_USER_PWD"
+ES_TIMEOUT = 30                 # Default timeout of a request, in second
+ES_MAX_RETRIES = 3              # Retries of a request on connection error, timeout or 502/503/504 status
+ES_MAX_CONNECTIONS = 10         # Size of the keep-alive connection pool of a client
+ES_HEALTH_CHECK_TTL = 300       # Time in second during which a successful ping of a cluster is trusted
@@ -5,6 +5,7 @@ import sys
 sys.path.append(str(Path(__file__).absolute().parents[1]))
 from get_data.src import training_session as ts
 from get_data.src import init_picture_folder as init
+from utils.frame_writer import POLICY_LIST, DROP, STORAGE_LIST, JPEG
 
 
 def get_args(description):
@@ -14,7 +15,23 @@ def get_args(description):
     group.add_argument("-o", "--picture_dir", type=str,
                        help="Path to the output directory where the picture shall be saved")
     parser.add_argument("-d", "--delay", type=float, default=0.1,
-                        help="Provide the delay (in sec) between 2 capture of images.\n")
+                        help="Provide the delay (in sec) between 2 capture of images when the steering doesn't "
+                             "change.\n")
+    parser.add_argument("-m", "--max_capture_fps", type=float, default=30,
+                        help="Max number of images captured per second, when the steering changes quickly.")
+    parser.add_argument("--min_difference", type=float, default=2.0,
+                        help="Images whose mean pixel difference (0-255) with the last captured one is lower are "
+                             "skipped. 0 to keep near duplicate images.")
+    parser.add_argument("-w", "--nb_writers", type=int, default=2,
+                        help="Number of threads saving the pictures in background.")
+    parser.add_argument("-p", "--writer_policy", type=str, default=DROP, choices=POLICY_LIST,
+                        help="When too many pictures are waiting to be saved, drop the new ones or wait for the "
+                             "writers in the control loop.")
+    parser.add_argument("-s", "--storage", type=str, default=JPEG, choices=STORAGE_LIST,
+                        help="Encode the pictures while driving (jpeg) or store the raw frames (raw), to be encoded "
+                             "on the desktop with transcode_raw.py before the upload.")
+    parser.add_argument("-r", "--control_rate", type=float, default=50,
+                        help="Frequency (Hz) of the control loop, independent of the camera frame rate.")
     return parser.parse_args()
 
 
@@ -25,7 +42,10 @@ def run_manual():
     """
     args = get_args(str(run_manual.__doc__))
     init.init_picture_folder(picture_dir=args.picture_dir)
-    session = ts.TrainingSession(args.delay, output_dir=args.picture_dir)
+    session = ts.TrainingSession(args.delay, output_dir=args.picture_dir, nb_writers=args.nb_writers,
+                                 writer_policy=args.writer_policy, control_rate=args.control_rate,
+                                 max_capture_fps=args.max_capture_fps, min_difference=args.min_difference,
+                                 storage=args.storage)
 
     print("Are you ready to drive?")
     starting_prompt = """Press 'go' + enter to start.
@@ -54,7 +74,7 @@ def run_manual():
     finally:
         if session:
             session.joy.close()
-            session.camera.close()
+            session.video_stream.stop()
         print("Race is over.")
 
 
@@ -3,6 +3,7 @@ from pathlib import Path
 import sys
 sys.path.append(str(Path(__file__).absolute().parents[1]))
 
+from get_data.src import es_utils
 from get_data.src import get_from_db
 from utils import logger
 from conf.cluster_conf import ES_HOST_PORT, ES_HOST_IP, LOG_INDEX
@@ -23,6 +24,8 @@ if __name__ == "__main__":
     get_from_db.search_and_download(query_json=args.query, picture_dir=args.picture_dir,
                                     verbose=1 if not args.verbose else 2)
     log.debug("Execution completed.")
+    if args.verbose:
+        log.debug(f'Elasticsearch sessions: {es_utils.get_es_session_stats()}')
     log.debug("Uploading log...")
     logger.Logger().upload_log(index=LOG_INDEX, es_host_ip=ES_HOST_IP, es_host_port=ES_HOST_PORT)
 
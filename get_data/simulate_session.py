@@ -0,0 +1,94 @@
+import argparse
+import cProfile
+import json
+import math
+import pstats
+import tempfile
+from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).absolute().parents[1]))
+from get_data.src import training_session as ts
+from get_data.src import xbox
+from get_data.src.label_handler import Label
+from conf.path import SESSION_TEMPLATE_NAME
+from utils import devices
+from utils.frame_writer import STORAGE_LIST, JPEG
+from utils.simulators import gamepad_state
+
+
+def get_args(description):
+    parser = argparse.ArgumentParser(description=description,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-o", "--picture_dir", type=str, default=None,
+                        help="Output directory of the pictures. Default is a temporary directory, removed at the end.")
+    parser.add_argument("-t", "--duration", type=float, default=10.0,
+                        help="Driving time in second before the A button is pressed.")
+    parser.add_argument("-d", "--delay", type=float, default=0.1,
+                        help="Delay (in sec) between 2 capture of images when the steering doesn't change.")
+    parser.add_argument("-r", "--control_rate", type=float, default=50,
+                        help="Frequency (Hz) of the control loop.")
+    parser.add_argument("-f", "--fps", type=float, default=30,
+                        help="Frame rate of the simulated camera.")
+    parser.add_argument("-p", "--steering_period", type=float, default=2.0,
+                        help="Period in second of the simulated slalom (left stick X axis).")
+    parser.add_argument("-l", "--write_latency", type=float, default=0.0,
+                        help="Fixed duration of a simulated PWM write, in second.")
+    parser.add_argument("--i2c_bus_speed", type=int, default=devices.I2C_BUS_SPEED,
+                        help="Simulated I2C clock in Hz. 0 to ignore the bus transfer time.")
+    parser.add_argument("-s", "--storage", type=str, default=JPEG, choices=STORAGE_LIST,
+                        help="Encode the pictures while driving (jpeg) or store the raw frames (raw).")
+    parser.add_argument("--profile", action="store_true",
+                        help="Profile the control loop and print the functions with the highest cumulative time.")
+    return parser.parse_args()
+
+
+def get_slalom_script(duration, steering_period=2.0, throttle=0.6):
+    """Gamepad script: slalom at constant throttle, then press A (stop) after 'duration' seconds."""
+    def script(elapsed_time):
+        if elapsed_time >= duration:
+            return gamepad_state(pressed=(xbox.BUTTON_A,))
+        return gamepad_state(left_x=math.sin(2 * math.pi * elapsed_time / steering_period), right_trigger=throttle)
+    return script
+
+
+def simulate_session():
+    """
+    Run a training session (see run_manual.py) with a simulated camera, PWM driver and Xbox controller, to measure and
+    profile the capture and control loops without the car.
+    """
+    args = get_args(str(simulate_session.__doc__))
+    tmp_dir = tempfile.TemporaryDirectory() if args.picture_dir is None else None
+    picture_dir = Path(tmp_dir.name if tmp_dir is not None else args.picture_dir)
+    picture_dir.mkdir(parents=True, exist_ok=True)
+    template_file = picture_dir / SESSION_TEMPLATE_NAME
+    if not template_file.is_file():
+        with template_file.open(mode='w', encoding='utf-8') as fp:
+            json.dump(Label.get_default_session_template(), fp, indent=4)
+
+    pwm = devices.get_pwm_driver(devices.SIMULATED, write_latency=args.write_latency,
+                                 bus_speed=args.i2c_bus_speed or None)
+    session = ts.TrainingSession(args.delay, output_dir=picture_dir.as_posix(), control_rate=args.control_rate,
+                                 storage=args.storage,
+                                 video_stream=devices.get_camera(devices.SIMULATED, fps=args.fps),
+                                 pwm=pwm,
+                                 joystick=devices.get_gamepad(devices.SIMULATED,
+                                                              get_slalom_script(args.duration, args.steering_period)))
+    profiler = cProfile.Profile() if args.profile else None
+    try:
+        if profiler is not None:
+            profiler.enable()
+        session.run()
+        if profiler is not None:
+            profiler.disable()
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+        print(f'PWM: {session.pwm.get_stats()} ; simulated I2C time: {pwm.write_time:.3f}s')
+    finally:
+        session.joy.close()
+        session.video_stream.stop()
+        if tmp_dir is not None:
+            tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    simulate_session()
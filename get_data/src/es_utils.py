@@ -1,4 +1,7 @@
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from threading import Lock
 import elasticsearch
 from elasticsearch import helpers
 import elasticsearch_dsl as esdsl
@@ -7,31 +10,176 @@ import json
 from pathlib import Path
 
 from conf.path import INDEX_TEMPLATE
-from conf.cluster_conf import ENV_VAR_FOR_ES_USER_ID, ENV_VAR_FOR_ES_USER_KEY
+from conf.cluster_conf import ENV_VAR_FOR_ES_USER_ID, ENV_VAR_FOR_ES_USER_KEY, ES_TIMEOUT, ES_MAX_RETRIES, \
+    ES_MAX_CONNECTIONS, ES_HEALTH_CHECK_TTL
 from utils import logger
 
 
 log = logger.Logger().create(logger_name=__name__)
 
+# Number of documents per request of 'scan_query'
+SEARCH_PAGE_SIZE = 1000
+# Unique keyword field (the labels are indexed with their fingerprint as id) used to page through the results
+SEARCH_SORT_FIELD = "label_fingerprint"
+
+# Bulk requests (see 'run_bulk'): number of parallel requests, chunk limits and retries of the documents rejected
+# because the cluster is overloaded (HTTP 429), waiting BULK_INITIAL_BACKOFF * 2**(retry - 1) second, at most
+# BULK_MAX_BACKOFF
+BULK_NB_THREADS = 4
+BULK_CHUNK_SIZE = 500
+BULK_MAX_CHUNK_BYTES = 10 * 1024 * 1024
+BULK_MAX_RETRIES = 5
+BULK_INITIAL_BACKOFF = 2
+BULK_MAX_BACKOFF = 60
+BULK_REQUEST_TIMEOUT = 60
+
+# Update by query (see 'run_update_by_query'): time between 2 polls of the task, and number of ids per query when the
+# labels to update are given by their fingerprint
+UPDATE_BY_QUERY_POLL_INTERVAL = 1.0
+UPDATE_BY_QUERY_IDS_SIZE = 10000
+
+# Painless scripts run by update_by_query on the "dataset" field of the labels. A label already in the dataset is left
+# untouched (noop) ; a "dataset" field which is not a list is turned into a list instead of failing.
+_ADD_DATASET_SCRIPT = """
+if (ctx._source.dataset == null) {
+    ctx._source.dataset = [params.dataset];
+} else if (!(ctx._source.dataset instanceof List)) {
+    ctx._source.dataset = [ctx._source.dataset, params.dataset];
+} else if (ctx._source.dataset.stream().anyMatch(d -> d.name == params.dataset.name)) {
+    ctx.op = 'noop';
+} else {
+    ctx._source.dataset.add(params.dataset);
+}
+"""
+_REMOVE_DATASET_SCRIPT = """
+if (ctx._source.dataset == null) {
+    ctx.op = 'noop';
+} else if (!(ctx._source.dataset instanceof List)) {
+    if (ctx._source.dataset.name == params.name) { ctx._source.dataset = []; } else { ctx.op = 'noop'; }
+} else if (!ctx._source.dataset.removeIf(d -> d.name == params.name)) {
+    ctx.op = 'noop';
+}
+"""
+
+
+class EsSession:
+    """
+    Elasticsearch client shared by all the operations on a cluster (see get_es_session), with the state of its health
+    check and usage counters.
+    """
 
-def get_es_session(host_ip, port):
-    try:
-        user = os.environ[ENV_VAR_FOR_ES_USER_ID]
-        pwd = os.environ[ENV_VAR_FOR_ES_USER_KEY]
-    except KeyError:
-        log.warning("  --> Elasticsearch user and/or password not found. Trying connection without authentication")
-        user = ""
-        pwd = ""
+    def __init__(self, client, health_check_ttl=ES_HEALTH_CHECK_TTL):
+        """
+        :param client:              [object]    Elasticsearch client
+        :param health_check_ttl:    [float]     Time in second during which a successful ping is trusted
+        """
+        self.client = client
+        self.health_check_ttl = health_check_ttl
+        self.last_check_time = None
+        self.nb_get = 0
+        self.nb_health_check = 0
+        self.lock = Lock()  # Protects the counters and the health check state, never held during a request
+
+    def is_healthy(self):
+        """Ping the cluster, unless the last successful ping is more recent than the TTL."""
+        now = time.monotonic()
+        with self.lock:
+            if self.last_check_time is not None and now - self.last_check_time < self.health_check_ttl:
+                return True
+            self.nb_health_check += 1
+        connection_ok = self.client.ping()
+        with self.lock:
+            self.last_check_time = now if connection_ok else None
+        return connection_ok
+
+    def get_stats(self):
+        """
+        :return:        [dict]      Number of sessions requested, of health checks, of HTTP requests sent and of HTTP
+                                    connections opened. Each request beyond the opened connections reused one of them
+        """
+        nb_request = 0
+        nb_connection = 0
+        for connection in self.client.transport.connection_pool.connections:
+            pool = getattr(connection, "pool", None)  # urllib3 connection pool
+            if pool is not None:
+                nb_request += pool.num_requests
+                nb_connection += pool.num_connections
+        return {"nb_get": self.nb_get, "nb_health_check": self.nb_health_check, "nb_request": nb_request,
+                "nb_connection": nb_connection, "nb_connection_reuse": max(0, nb_request - nb_connection)}
+
+
+# Process wide registry of the Elasticsearch sessions, by host and credentials
+_d_session = {}
+_session_lock = Lock()
+
+
+def _get_credentials():
+    return os.environ.get(ENV_VAR_FOR_ES_USER_ID, ""), os.environ.get(ENV_VAR_FOR_ES_USER_KEY, "")
+
+
+def get_es_session(host_ip, port, timeout=ES_TIMEOUT, max_retries=ES_MAX_RETRIES,
+                   health_check_ttl=ES_HEALTH_CHECK_TTL):
+    """
+    Return the Elasticsearch client of a cluster, shared by the whole process: the client, and its keep-alive HTTP
+    connections, is created on the first call only. The cluster is pinged on the first call, then again once the last
+    successful ping is older than 'health_check_ttl'. The ping is sent outside of the registry lock, so an unreachable
+    cluster doesn't block the sessions of the other threads.
+    Timed out requests are not retried: a bulk create that timed out on the client side may have been applied by the
+    cluster, its retry would then fail on a version conflict.
+    Note that credential to access the cluster is retrieved from env variable (see variable name in the conf file)
+    :param host_ip:             [string]    Public ip of the Elasticsearch host server
+    :param port:                [int]       Port open for Elasticsearch on host server
+    :param timeout:             [float]     Default timeout of a request in second
+    :param max_retries:         [int]       Retries of a request on connection error or 502/503/504 status
+    :param health_check_ttl:    [float]     Time in second during which a successful ping is trusted. 0 to always ping
+    :return:                    [object]    Elasticsearch client, or None if the cluster can't be reached
+    """
+    user, pwd = _get_credentials()
+    key = (host_ip, port, user, pwd, timeout, max_retries)
+    with _session_lock:
+        session = _d_session.get(key)
+        if session is None:
+            if user == "" or pwd == "":
+                log.warning("  --> Elasticsearch user and/or password not found. Trying connection without "
+                            "authentication")
+            client = elasticsearch.Elasticsearch([host_ip], http_auth=(user, pwd), scheme="https", port=443,
+                                                 timeout=timeout, max_retries=max_retries, retry_on_timeout=False,
+                                                 maxsize=ES_MAX_CONNECTIONS)
+            session = EsSession(client, health_check_ttl=health_check_ttl)
+            _d_session[key] = session
+        session.health_check_ttl = health_check_ttl
+        with session.lock:
+            session.nb_get += 1
     try:
-        es = elasticsearch.Elasticsearch([host_ip], http_auth=(user, pwd), scheme="https", port=443)
-        connection_ok = es.ping()
+        connection_ok = session.is_healthy()
         if not connection_ok:
             log.error(f'Failed to connect to Elasticsearch cluster "{host_ip}:{port}"')
-            return None
     except elasticsearch.ElasticsearchException as err:
         log.error(f'Failed to connect to Elasticsearch cluster "{host_ip}:{port}" because:\n{err}')
+        connection_ok = False
+    if not connection_ok:
+        # The client is not closed: other threads may still be using it. Its connections are released with it
+        with _session_lock:
+            if _d_session.get(key) is session:
+                del _d_session[key]
         return None
-    return es
+    return session.client
+
+
+def get_es_session_stats():
+    """
+    :return:        [dict]      Usage counters (see EsSession.get_stats) of each session, by "host_ip:port"
+    """
+    with _session_lock:
+        return {f'{host_ip}:{port}': session.get_stats() for (host_ip, port, *_), session in _d_session.items()}
+
+
+def close_es_sessions():
+    """Close the connections of all the Elasticsearch sessions. The next get_es_session calls create new clients."""
+    with _session_lock:
+        for session in _d_session.values():
+            session.client.close()
+        _d_session.clear()
 
 
 def create_es_index(host_ip, host_port, index_name, alias=None, index_pattern="_all"):
@@ -95,9 +243,9 @@ def _gen_bulk_doc_update_append_field(d_label, index, update_field, new_dataset)
         }
 
 
-def _gen_bulk_doc_update_delete_item_from_field_array(d_label, index, update_field, item):
+def _gen_bulk_doc_update_delete_item_from_field_array(labels, index, update_field, item):
     """Yield well formatted document for bulk update to ES"""
-    for img_id, label in tqdm(d_label.items()):
+    for label in tqdm(labels):
         yield {
             "_index": index,
             "_type": "_doc",
@@ -122,6 +270,99 @@ def _gen_bulk_doc_delete(l_doc_id, index):
         }
 
 
+def _gen_bulk_chunks(es, actions, chunk_size, max_chunk_bytes):
+    """Group bulk actions into lists of at most 'chunk_size' actions and 'max_chunk_bytes' bytes once serialized"""
+    chunk = []
+    chunk_bytes = 0
+    for action in actions:
+        action_bytes = len(es.transport.serializer.dumps(action).encode("utf-8")) + 1
+        if chunk and (len(chunk) >= chunk_size or chunk_bytes + action_bytes > max_chunk_bytes):
+            yield chunk, chunk_bytes
+            chunk = []
+            chunk_bytes = 0
+        chunk.append(action)
+        chunk_bytes += action_bytes
+    if chunk:
+        yield chunk, chunk_bytes
+
+
+def _send_bulk_chunk(es, chunk, chunk_bytes, max_chunk_bytes, max_retries, initial_backoff, max_backoff,
+                     request_timeout):
+    """
+    Send a chunk of bulk actions, retrying with an exponential backoff the documents rejected with a 429 status.
+    :return:                    [tuple]     (number of successful actions, list of errors, duration in second)
+    """
+    start_time = time.perf_counter()
+    success = 0
+    errors = []
+    for ok, item in helpers.streaming_bulk(es, chunk, chunk_size=len(chunk),
+                                           max_chunk_bytes=max(max_chunk_bytes, chunk_bytes), max_retries=max_retries,
+                                           initial_backoff=initial_backoff, max_backoff=max_backoff,
+                                           raise_on_error=False, raise_on_exception=False,
+                                           request_timeout=request_timeout):
+        if ok:
+            success += 1
+        else:
+            errors.append(item)
+    return success, errors, time.perf_counter() - start_time
+
+
+def run_bulk(es, actions, nb_threads=BULK_NB_THREADS, chunk_size=BULK_CHUNK_SIZE, max_chunk_bytes=BULK_MAX_CHUNK_BYTES,
+             max_retries=BULK_MAX_RETRIES, initial_backoff=BULK_INITIAL_BACKOFF, max_backoff=BULK_MAX_BACKOFF,
+             request_timeout=BULK_REQUEST_TIMEOUT, verbose=1):
+    """
+    Send bulk actions to Elasticsearch with 'nb_threads' requests in parallel. Actions are read from 'actions' as the
+    requests complete, so a generator of actions is never fully loaded in memory.
+    Same result as helpers.bulk(es, actions, raise_on_error=False), the documents rejected because the cluster is
+    overloaded (HTTP 429) being retried 'max_retries' times with an exponential backoff.
+    :param es:                  [object]    Elasticsearch session
+    :param actions:             [iterable]  Bulk actions (see the _gen_bulk_* functions)
+    :param nb_threads:          [int]       Number of requests sent in parallel
+    :param chunk_size:          [int]       Maximum number of actions per request
+    :param max_chunk_bytes:     [int]       Maximum size of a request in bytes
+    :param max_retries:         [int]       Number of retries of a document rejected with a 429 status
+    :param initial_backoff:     [float]     Wait before the first retry in second, doubled at each retry
+    :param max_backoff:         [float]     Maximum wait before a retry in second
+    :param request_timeout:     [float]     Timeout of a request in second
+    :param verbose:             [int]       verbosity level. >1 to log the throughput of each request
+    :return:                    [tuple]     (number of successful actions, list of errors)
+    """
+    success = 0
+    errors = []
+    nb_doc = 0
+    nb_bytes = 0
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=nb_threads) as executor:
+        pending = {}
+
+        def collect(futures):
+            nonlocal success, nb_doc, nb_bytes
+            for future in futures:
+                chunk_index, chunk_doc, chunk_bytes = pending.pop(future)
+                chunk_success, chunk_errors, duration = future.result()
+                success += chunk_success
+                errors.extend(chunk_errors)
+                nb_doc += chunk_doc
+                nb_bytes += chunk_bytes
+                if verbose > 1:
+                    log.debug(f'Bulk chunk {chunk_index}: {chunk_doc} doc(s) in {duration:.2f}s '
+                              f'({chunk_doc / duration:.0f} docs/s, {chunk_bytes / duration / 1e6:.2f} MB/s)')
+
+        for chunk_index, (chunk, chunk_bytes) in enumerate(_gen_bulk_chunks(es, actions, chunk_size, max_chunk_bytes)):
+            future = executor.submit(_send_bulk_chunk, es, chunk, chunk_bytes, max_chunk_bytes, max_retries,
+                                     initial_backoff, max_backoff, request_timeout)
+            pending[future] = (chunk_index, len(chunk), chunk_bytes)
+            if len(pending) >= 2 * nb_threads:  # bounded number of chunks in memory
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                collect(done)
+        collect(list(pending))
+    duration = time.perf_counter() - start_time
+    if verbose > 0 and nb_doc > 0:
+        log.debug(f'Bulk: {nb_doc} doc(s), {nb_bytes / 1e6:.2f} MB in {duration:.2f}s '
+                  f'({nb_doc / duration:.0f} docs/s, {nb_bytes / duration / 1e6:.2f} MB/s) ; {len(errors)} error(s)')
+    return success, errors
+
+
 def _print_bulk_update_synthesis(success, errors):
     synthesis = f'Update completed:\n{success} label(s) successfully updated.\n'
     if len(errors) > 0:
@@ -140,27 +381,155 @@ def append_value_to_field(d_label, field_to_update, value, es_index, es_host_ip,
     if es is None:
         return 0, len(d_label)
     log.debug(f'Connected to {es_host_ip}:{es_host_port} ; updating index "{es_index}"...')
-    success, errors = helpers.bulk(es, _gen_bulk_doc_update_append_field(d_label, es_index, field_to_update, value),
-                                   request_timeout=60, raise_on_error=False)
+    success, errors = run_bulk(es, _gen_bulk_doc_update_append_field(d_label, es_index, field_to_update, value),
+                               verbose=verbose)
     if verbose > 0:
         _print_bulk_update_synthesis(success, errors)
     return success, errors
 
 
 def delete_value_from_field(d_label, field_to_update, value, es_index, es_host_ip, es_host_port, verbose=1):
+    """
+    Remove 'value' from the list 'field_to_update' of labels.
+    :param d_label:             [dict]      Dict of labels {img_id: label}, or iterable of labels (e.g. a generator
+                                            streaming the result of a search). Only "label_fingerprint" is used
+    """
     es = get_es_session(host_ip=es_host_ip, port=es_host_port)
     if es is None:
-        return 0, len(d_label)
+        return 0, len(d_label) if isinstance(d_label, dict) else 0
     log.debug(f'Connected to {es_host_ip}:{es_host_port} ; updating index "{es_index}"...')
     log.debug(f'Deleting dataset "{value}"...')
-    success, errors = helpers.bulk(es, _gen_bulk_doc_update_delete_item_from_field_array(
-        d_label, es_index, field_to_update, value), request_timeout=60, raise_on_error=False)
+    labels = d_label.values() if isinstance(d_label, dict) else d_label
+    success, errors = run_bulk(es, _gen_bulk_doc_update_delete_item_from_field_array(
+        labels, es_index, field_to_update, value), verbose=verbose)
+    if verbose > 0:
+        _print_bulk_update_synthesis(success, errors)
+    return success, errors
+
+
+def _get_update_by_query_errors(response):
+    """Return the failures of an update_by_query response in the format of the bulk errors"""
+    errors = []
+    for failure in response.get("failures", []):
+        cause = failure.get("cause", failure.get("reason", {}))
+        if not isinstance(cause, dict):
+            cause = {"type": "failure", "reason": cause}
+        errors.append({"update": {"_id": failure.get("id", f'shard {failure.get("shard")}'),
+                                  "error": {"type": cause.get("type"), "reason": cause.get("reason")}}})
+    return errors
+
+
+def run_update_by_query(es, index, query, script, params=None, slices="auto",
+                        poll_interval=UPDATE_BY_QUERY_POLL_INTERVAL, verbose=1):
+    """
+    Run a script on every document matching a query, on the cluster side: an update_by_query request is started as a
+    background task, split into 'slices' sub tasks run in parallel, and polled until it completes.
+    :param es:                  [object]    Elasticsearch session
+    :param index:               [string]    Name of the index to update
+    :param query:               [dict]      Elasticsearch query (the "query" of a search body). None to update all
+                                            the documents
+    :param script:              [string]    Painless script updating 'ctx._source'
+    :param params:              [dict]      Parameters of the script
+    :param slices:              [int]       Number of sub tasks, or "auto" (one per shard)
+    :param poll_interval:       [float]     Time between 2 polls of the task, in second
+    :param verbose:             [int]       verbosity level
+    :return:                    [tuple]     (number of documents updated or already up to date (noop), list of errors
+                                            in the bulk errors format)
+    """
+    body = {"script": {"source": script, "lang": "painless", "params": params or {}}}
+    if query is not None:
+        body["query"] = query
+    task_id = es.update_by_query(index=index, body=body, slices=slices, conflicts="proceed", refresh=True,
+                                 wait_for_completion=False)["task"]
+    if verbose > 0:
+        log.debug(f'Update by query started on index "{index}" ; task "{task_id}"')
+    while True:
+        task = es.tasks.get(task_id=task_id)
+        status = task["task"]["status"]
+        if task.get("completed"):
+            break
+        if verbose > 0:
+            done = status["updated"] + status["noops"] + status["version_conflicts"]
+            log.debug(f'  --> {done}/{status["total"]} label(s) processed')
+        time.sleep(poll_interval)
+    if "error" in task:
+        error = {"type": task["error"].get("type"), "reason": task["error"].get("reason")}
+        return 0, [{"update": {"_id": f'task {task_id}', "error": error}}]
+    response = task.get("response", status)
+    errors = _get_update_by_query_errors(response)
+    if response.get("version_conflicts", 0) > 0:
+        errors.append({"update": {"_id": f'{response["version_conflicts"]} label(s)',
+                                  "error": {"type": "version_conflict_engine_exception",
+                                            "reason": "label modified during the update, not updated"}}})
+    if verbose > 0:
+        log.debug(f'Update by query completed: {response.get("updated", 0)} updated, {response.get("noops", 0)} '
+                  f'unchanged, {len(errors)} error(s) in {response.get("took", 0) / 1000:.1f}s')
+    return response.get("updated", 0) + response.get("noops", 0), errors
+
+
+def _get_ids_queries(l_doc_id, size=UPDATE_BY_QUERY_IDS_SIZE):
+    """Yield ids queries matching the documents of 'l_doc_id', 'size' ids at most per query"""
+    for start in range(0, len(l_doc_id), size):
+        yield {"ids": {"values": l_doc_id[start:start + size]}}
+
+
+def _get_connection_error(host_ip, port):
+    """Error, in the bulk errors format, of an update not sent because the cluster can't be reached"""
+    error = {"type": "connection_error", "reason": "Elasticsearch cluster can't be reached"}
+    return {"update": {"_id": f'{host_ip}:{port}', "error": error}}
+
+
+def add_dataset(dataset, es_index, es_host_ip, es_host_port, query=None, d_label=None, slices="auto", verbose=1):
+    """
+    Add a dataset to the "dataset" field of labels, on the cluster side (see run_update_by_query). The labels are those
+    matching 'query' if given, otherwise those of 'd_label'.
+    :param dataset:             [dict]      Dataset ("name", "comment", "created_on_date", "query")
+    :param query:               [dict]      Search description dictionary (see get_search_query_from_dict)
+    :param d_label:             [dict]      Dict of labels {img_id: label}. Only "label_fingerprint" is used
+    :param slices:              [int]       Number of sub tasks run in parallel by the cluster, or "auto"
+    :return:                    [tuple]     (number of labels updated or already up to date, list of errors)
+    """
+    es = get_es_session(host_ip=es_host_ip, port=es_host_port)
+    if es is None:
+        return 0, [_get_connection_error(es_host_ip, es_host_port)]
+    if query is not None:
+        l_query = [get_search_query_from_dict(es_index, query).to_dict().get("query")]
+    else:
+        l_query = _get_ids_queries([label["label_fingerprint"] for label in d_label.values()])
+    log.debug(f'Connected to {es_host_ip}:{es_host_port} ; adding dataset "{dataset["name"]}" in index "{es_index}"')
+    success = 0
+    errors = []
+    for es_query in l_query:
+        query_success, query_errors = run_update_by_query(es, es_index, es_query, _ADD_DATASET_SCRIPT,
+                                                          params={"dataset": dataset}, slices=slices, verbose=verbose)
+        success += query_success
+        errors += query_errors
     if verbose > 0:
         _print_bulk_update_synthesis(success, errors)
     return success, errors
 
 
-def upload_to_es(d_label, index, host_ip, port, overwrite=False):
+def remove_dataset(dataset_name, es_index, es_host_ip, es_host_port, slices="auto", verbose=1):
+    """
+    Remove a dataset from the "dataset" field of all the labels, on the cluster side (see run_update_by_query).
+    :param dataset_name:        [string]    Name of the dataset
+    :param slices:              [int]       Number of sub tasks run in parallel by the cluster, or "auto"
+    :return:                    [tuple]     (number of labels updated or already up to date, list of errors)
+    """
+    es = get_es_session(host_ip=es_host_ip, port=es_host_port)
+    if es is None:
+        return 0, [_get_connection_error(es_host_ip, es_host_port)]
+    log.debug(f'Connected to {es_host_ip}:{es_host_port} ; removing dataset "{dataset_name}" from index "{es_index}"')
+    query = {"term": {"dataset.name.keyword": dataset_name}}
+    success, errors = run_update_by_query(es, es_index, query, _REMOVE_DATASET_SCRIPT, params={"name": dataset_name},
+                                          slices=slices, verbose=verbose)
+    if verbose > 0:
+        _print_bulk_update_synthesis(success, errors)
+    return success, errors
+
+
+def upload_to_es(d_label, index, host_ip, port, overwrite=False, nb_threads=BULK_NB_THREADS, chunk_size=BULK_CHUNK_SIZE,
+                 max_chunk_bytes=BULK_MAX_CHUNK_BYTES):
     """
     Upload all label in d_label to Elasticsearch cluster.
     Note that credential to access the cluster is retrieved from env variable (see variable name in the code)
@@ -178,14 +547,17 @@ def upload_to_es(d_label, index, host_ip, port, overwrite=False):
     :param host_ip:             [string]    Public ip of the Elasticsearch host server
     :param port:                [int]       Port open for Elasticsearch on host server (typically 9200)
     :param overwrite:           [bool]      If True, existing doc with same fingerprint will be overwritten by new ones
+    :param nb_threads:          [int]       Number of bulk requests sent in parallel
+    :param chunk_size:          [int]       Maximum number of labels per bulk request
+    :param max_chunk_bytes:     [int]       Maximum size of a bulk request in bytes
     :return:                    [list]      list of failed to upload picture id
     """
     es = get_es_session(host_ip, port)
     if es is None:
         return [img_id for img_id, _ in d_label.items()]
     op_type = "index" if overwrite else "create"
-    success, errors = helpers.bulk(es, _gen_bulk_doc_ingest(d_label, index, op_type),
-                                   request_timeout=60, raise_on_error=False)
+    success, errors = run_bulk(es, _gen_bulk_doc_ingest(d_label, index, op_type), nb_threads=nb_threads,
+                               chunk_size=chunk_size, max_chunk_bytes=max_chunk_bytes)
     failed_doc_id = []
     for error in errors:
         for error_type in error:
@@ -226,8 +598,7 @@ def delete_document(index, l_doc_id, es=None, host_ip=None, port=9200):
                 return 0, l_doc_id
         else:
             raise AttributeError("At least one of 'es' or 'host_ip' argument shall be provided.")
-    nb_of_success, errors = helpers.bulk(es, _gen_bulk_doc_delete(l_doc_id, index),
-                                         request_timeout=60, raise_on_error=False)
+    nb_of_success, errors = run_bulk(es, _gen_bulk_doc_delete(l_doc_id, index))
     failed_doc_id = []
     for error in errors:
         for error_type in error:
@@ -307,3 +678,30 @@ def run_query(es, search_obj, source_filter=None):
         s = s.source(source_filter)
     s = s[0:10000]
     return s.execute()
+
+
+def scan_query(es, search_obj, source_filter=None, page_size=SEARCH_PAGE_SIZE, sort_field=SEARCH_SORT_FIELD):
+    """
+    Generator over all the documents matching the query defined by 'search_obj', whatever their number.
+    Results are requested page by page, sorted on 'sort_field', each page starting after the last document of the
+    previous one (search_after): unlike 'run_query', it is not limited to the first 10000 results and only one page is
+    in memory at a time. No scroll context is kept open on the cluster.
+    :param es:              [object]    Elasticsearch session
+    :param search_obj:      [object]    Elasticsearch-dsl search object
+    :param source_filter:   [list]      Fields of the _source to return. If None (default), all the _source is returned
+    :param page_size:       [int]       Number of documents per request
+    :param sort_field:      [string]    Field with a unique value per document, with doc values (keyword, number...)
+    :return:                [generator] _source dictionary of each matching document
+    """
+    s = search_obj.using(es).sort(sort_field).extra(size=page_size, track_total_hits=False)
+    if source_filter is not None:
+        s = s.source(source_filter)
+    search_after = None
+    while True:
+        page = s if search_after is None else s.extra(search_after=search_after)
+        hits = page.execute().to_dict()["hits"]["hits"]
+        for hit in hits:
+            yield hit["_source"]
+        if len(hits) < page_size:
+            return
+        search_after = hits[-1]["sort"]
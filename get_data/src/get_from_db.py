@@ -1,5 +1,6 @@
 from pathlib import Path
 import json
+import elasticsearch
 
 from get_data.src import es_utils
 from get_data.src import s3_utils
@@ -34,12 +35,52 @@ def _get_missing_picture(picture_dir, d_wanted_pic):
     return l_missing_pic
 
 
-def run_search_query(d_query, es_index=ES_INDEX, verbose=1):
+def iter_search_query(es, d_query, es_index=ES_INDEX, source_filter=None, page_size=es_utils.SEARCH_PAGE_SIZE,
+                      verbose=1):
+    """
+    Generator over the labels matching a query, whatever their number: the results are streamed page by page (see
+    es_utils.scan_query). When several labels point to the same picture, only the first one is returned.
+    :param es:              [object]        Elasticsearch session
+    :param d_query:         [dict]          Dictionary containing the query (see es_utils.get_search_query_from_dict)
+    :param es_index:        [string]        Name of the index
+    :param source_filter:   [list]          Fields of the labels to return. If None (default), the whole labels
+    :param page_size:       [int]           Number of labels per request
+    :param verbose:         [int]           verbosity level
+    :return:                [generator]     (img_id, label) for each matching label
+    """
+    search_obj = es_utils.get_search_query_from_dict(es_index, d_query)
+    if source_filter is not None and "img_id" not in source_filter:
+        source_filter = list(source_filter) + ["img_id"]
+    if verbose > 0:
+        log.debug(f'Query sent to {ES_HOST_IP}:{ES_HOST_PORT}')
+        if verbose > 1:
+            log.debug(f'{search_obj.to_dict()}')
+    d_fingerprint = {}
+    for label in es_utils.scan_query(es, search_obj, source_filter=source_filter, page_size=page_size):
+        img_id = label["img_id"]
+        if img_id in d_fingerprint:
+            log.warning(f'WARNING --> Your search returns multiple labels for a single picture: Labels '
+                        f'"{label.get("label_fingerprint")}" and "{d_fingerprint[img_id]}" points to the same picture: '
+                        f'"{img_id}". Only one label will be saved.')
+            continue
+        d_fingerprint[img_id] = label.get("label_fingerprint")
+        yield img_id, label
+
+
+def load_query_file(query_file):
+    """Return the query dictionary defined in a json file"""
+    with Path(query_file).open(mode='r', encoding='utf-8') as fp:
+        return json.load(fp)
+
+
+def run_search_query(d_query, es_index=ES_INDEX, verbose=1, source_filter=None):
     """
     Search labels in the database according to a json_file describing the query and return the list of matching labels.
+    All the labels are loaded in memory: use 'iter_search_query' to process large results label by label.
     :param d_query:         [string]        Dictionary containing the query
     :param es_index:        [string]        Name of the index
     :param verbose:         [int]           verbosity level
+    :param source_filter:   [list]          Fields of the labels to return. If None (default), the whole labels
     :return:                [dict]          Dictionary of labels as follow, or None on error.
                                             {
                                                 img_id: {
@@ -54,25 +95,7 @@ def run_search_query(d_query, es_index=ES_INDEX, verbose=1):
     es = es_utils.get_es_session(host_ip=ES_HOST_IP, port=ES_HOST_PORT)
     if es is None:
         return None
-    search_obj = es_utils.get_search_query_from_dict(es_index, d_query)
-    response = es_utils.run_query(es, search_obj)
-    if verbose > 0:
-        log.debug(f'Query sent to {ES_HOST_IP}:{ES_HOST_PORT}')
-        if verbose > 1:
-            log.debug(f'{search_obj.to_dict()}')
-        log.debug(f'Query returned successfully: {response.success()}')
-    if response.hits.total.relation != "eq":
-        log.warning(f'WARNING --> you hit the maximum number of results limit: the picture list might not be complete.')
-    d_match_pic = {}
-    for hit in response.to_dict()["hits"]["hits"]:
-        img_id = hit["_source"]["img_id"]
-        if img_id in d_match_pic:
-            fingerprint_1 = hit["_source"]["label_fingerprint"]
-            fingerprint_2 = d_match_pic[img_id]["label_fingerprint"]
-            log.warning(f'WARNING --> Your search returns multiple labels for a single picture: Labels "{fingerprint_1}"'
-                        f' and "{fingerprint_2}" points to the same picture: "{img_id}". Only one label will be saved.')
-        d_match_pic[img_id] = hit["_source"]
-    return d_match_pic
+    return dict(iter_search_query(es, d_query, es_index=es_index, source_filter=source_filter, verbose=verbose))
 
 
 def run_search_query_from_file(query_file, es_index=ES_INDEX, verbose=1):
@@ -92,17 +115,37 @@ def run_search_query_from_file(query_file, es_index=ES_INDEX, verbose=1):
                                                 ...
                                             }
     """
-    with Path(query_file).open(mode='r', encoding='utf-8') as fp:
-        d_query = json.load(fp)
-    return run_search_query(d_query, es_index=es_index, verbose=verbose)
+    return run_search_query(load_query_file(query_file), es_index=es_index, verbose=verbose)
 
 
-def _write_labels_to_file(output, d_label, verbose=1):
-    """Write d_label to the output file"""
-    with Path(output).open(mode='w', encoding='utf-8') as fp:
-        json.dump(d_label, fp, indent=4)
-        if verbose > 0:
-            log.info(f'Labels written to: "{Path(output)}"')
+def _write_labels_to_file(output, labels, verbose=1):
+    """
+    Write labels to the output file as a json dictionary {img_id: label}, one label at a time.
+    The labels are written to a temporary file, renamed to 'output' once all of them are written: if 'labels' raises
+    (e.g. a failed search request), no truncated file is left.
+    :param labels:          [iterable]      (img_id, label) pairs, or a dictionary of labels
+    :return:                [int]           Number of labels written
+    """
+    if isinstance(labels, dict):
+        labels = labels.items()
+    nb_label = 0
+    tmp_output = Path(output).with_name(Path(output).name + ".part")
+    try:
+        with tmp_output.open(mode='w', encoding='utf-8') as fp:
+            fp.write("{")
+            for img_id, label in labels:
+                # Same layout as json.dump(d_label, fp, indent=4): the entry without its enclosing braces
+                entry = json.dumps({img_id: label}, indent=4)[1:-2]
+                fp.write(entry if nb_label == 0 else "," + entry)
+                nb_label += 1
+            fp.write("\n}" if nb_label > 0 else "}")
+    except BaseException:
+        tmp_output.unlink()
+        raise
+    tmp_output.replace(output)
+    if verbose > 0:
+        log.info(f'Labels written to: "{Path(output)}"')
+    return nb_label
 
 
 def search_and_download(query_json, picture_dir, label_file_name="labels.json", es_index=ES_INDEX, force=False, verbose=1):
@@ -133,16 +176,30 @@ def search_and_download(query_json, picture_dir, label_file_name="labels.json",
         picture_dir.mkdir(parents=True)
         log.info(f'Output folder "{picture_dir}" created.')
     label_file_name = utils_fct.get_label_file_name(directory=picture_dir, base_name="labels")
+    es = es_utils.get_es_session(host_ip=ES_HOST_IP, port=ES_HOST_PORT)
+    if es is None:
+        return None
     log.debug(f'Searching for picture in "{es_index}" index')
-    d_matching_label = run_search_query_from_file(query_file=query_json, es_index=es_index, verbose=verbose)
-    if d_matching_label is None:
+    d_missing_pic = {}
+
+    def gen_matching_label():
+        """Stream the matching labels to the label file, keeping only the labels of the missing pictures"""
+        for img_id, label in iter_search_query(es, load_query_file(query_json), es_index=es_index, verbose=verbose):
+            if not (picture_dir / label["file_name"]).is_file():
+                d_missing_pic[img_id] = label
+            yield img_id, label
+
+    try:
+        nb_matching_label = _write_labels_to_file(output=label_file_name, labels=gen_matching_label(), verbose=0)
+    except elasticsearch.ElasticsearchException as err:
+        log.error(f'Search failed, no label written: {err}')
         return None
-    if len(d_matching_label) == 0:
+    if nb_matching_label == 0:
+        Path(label_file_name).unlink()
         log.info(f'No matching picture found.')
         return {}
-    _write_labels_to_file(output=label_file_name, d_label=d_matching_label)
-    d_missing_pic = _get_missing_picture(picture_dir, d_matching_label)
-    log.info(f'{len(d_matching_label)} picture(s) found matching the query')
+    log.info(f'Labels written to: "{Path(label_file_name)}"')
+    log.info(f'{nb_matching_label} picture(s) found matching the query')
     log.info(f'{len(d_missing_pic)} picture(s) missing in "{picture_dir}"')
     if len(d_missing_pic) == 0:
         return []
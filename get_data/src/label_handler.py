@@ -1,8 +1,11 @@
+import copy
 import json
+import time
 from pathlib import Path
 from datetime import datetime
 
 from utils import car_mapping as cm
+from utils.label_journal import merge_label
 from get_data.src import utils_fct
 from conf.path import SESSION_TEMPLATE_NAME, HARDWARE_CONF_FILE
 from conf.const import IMAGE_SIZE, FRAME_RATE, EXPOSURE_MODE, HEAD_DOWN, HEAD_UP,\
@@ -10,6 +13,36 @@ from conf.const import IMAGE_SIZE, FRAME_RATE, EXPOSURE_MODE, HEAD_DOWN, HEAD_UP
     RAW_DIR_TO_LABEL_MAPPING, RAW_SPEED_TO_LABEL_MAPPING
 
 
+# Label fields that change for every picture, the other ones are common to the session
+FRAME_FIELDS = ["img_id", "file_name", "file_type", "raw_value", "timestamp", "label_fingerprint"]
+FRAME_LABEL_FIELDS = ["label_direction", "label_speed", "created_on_date"]
+
+
+class LabelRecord:
+    """
+    Compact label of one picture, holding only what changes from a picture to the next. Expanded into a full label by
+    Label.get_frame_fields / Label.expand, out of the capture loop.
+    """
+    __slots__ = ["img_id", "file_name", "timestamp", "raw_direction", "raw_speed", "label_direction", "label_speed",
+                 "created_on", "camera_position"]
+
+    def __init__(self, img_id, file_name, timestamp, raw_direction, raw_speed, label_direction, label_speed,
+                 created_on=None, camera_position=None):
+        """
+        :param created_on:      [float]     Creation time of the label (time.time()). Default is now
+        :param camera_position: [int]       Camera position when the picture was taken, if it differs from the session
+        """
+        self.img_id = img_id
+        self.file_name = file_name
+        self.timestamp = timestamp
+        self.raw_direction = raw_direction
+        self.raw_speed = raw_speed
+        self.label_direction = label_direction
+        self.label_speed = label_speed
+        self.created_on = time.time() if created_on is None else created_on
+        self.camera_position = camera_position
+
+
 class Label:
 
     def __init__(self, picture_dir=None, camera_position="unknown", car_mapping=None, raise_error=True):
@@ -123,12 +156,8 @@ class Label:
             "label": {
                 "label_direction": label_direction,
                 "label_speed": label_speed,
-                "created_by": "auto",
                 "created_on_date": datetime.now().strftime("%Y%m%dT%H-%M-%S-%f"),
-                "raw_dir_to_label_mapping": RAW_DIR_TO_LABEL_MAPPING,
-                "raw_speed_to_label_mapping": RAW_SPEED_TO_LABEL_MAPPING,
-                "nb_of_direction": len(RAW_DIR_TO_LABEL_MAPPING),
-                "nb_of_speed": len(RAW_SPEED_TO_LABEL_MAPPING),
+                **Label.get_label_constants()
             },
             "timestamp": timestamp,
         }
@@ -137,8 +166,64 @@ class Label:
         self._template["label_fingerprint"] = utils_fct.get_label_finger_print(self._template)
 
     def get_copy(self):
+        """Shallow copy of the current label: nested dictionaries (car_setting, hardware_conf...) are shared."""
         return self._template.copy()
 
+    def new_record(self, img_id, file_name, timestamp, raw_direction, raw_speed, label_direction, label_speed,
+                   camera_position=None):
+        """Cheap label of a picture, to be expanded with 'get_frame_fields' or 'expand' out of the capture loop."""
+        return LabelRecord(img_id, file_name, timestamp, raw_direction, raw_speed, label_direction, label_speed,
+                           camera_position=camera_position)
+
+    def get_session_metadata(self):
+        """Return a copy of the label fields common to every picture of the session."""
+        metadata = {key: copy.deepcopy(val) for key, val in self._template.items() if key not in FRAME_FIELDS}
+        metadata["label"] = {key: val for key, val in metadata["label"].items() if key not in FRAME_LABEL_FIELDS}
+        return metadata
+
+    def get_frame_fields(self, record):
+        """
+        Return the label fields of one picture, to be merged with the session metadata (see 'expand').
+        :param record:      [LabelRecord]   Compact label of the picture
+        :return:            [dict]
+        """
+        fields = {
+            "img_id": record.img_id,
+            "file_name": record.file_name,
+            "file_type": record.file_name.split(".")[-1],
+            "raw_value": {
+                "raw_direction": record.raw_direction,
+                "raw_speed": record.raw_speed,
+                "normalized_speed": self.car_mapping.get_normalized_speed(record.raw_speed),
+                "normalized_direction": self.car_mapping.get_normalized_direction(record.raw_direction),
+            },
+            "label": {
+                "label_direction": record.label_direction,
+                "label_speed": record.label_speed,
+                "created_on_date": datetime.fromtimestamp(record.created_on).strftime("%Y%m%dT%H-%M-%S-%f"),
+            },
+            "timestamp": record.timestamp,
+        }
+        fields["label_fingerprint"] = utils_fct.get_label_finger_print(
+            {"img_id": record.img_id, "label": {**fields["label"], **Label.get_label_constants()}})
+        if record.camera_position is not None:
+            fields["car_setting"] = {"camera": {"camera_position": record.camera_position}}
+        return fields
+
+    def expand(self, record):
+        """Return the full label of a picture from its record. Nothing is shared with other labels."""
+        return merge_label(self.get_session_metadata(), self.get_frame_fields(record))
+
+    @staticmethod
+    def get_label_constants():
+        return {
+            "created_by": "auto",
+            "raw_dir_to_label_mapping": RAW_DIR_TO_LABEL_MAPPING,
+            "raw_speed_to_label_mapping": RAW_SPEED_TO_LABEL_MAPPING,
+            "nb_of_direction": len(RAW_DIR_TO_LABEL_MAPPING),
+            "nb_of_speed": len(RAW_SPEED_TO_LABEL_MAPPING),
+        }
+
     @staticmethod
     def get_default_session_template():
         return {
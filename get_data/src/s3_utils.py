@@ -3,9 +3,10 @@ import re
 import os
 import boto3
 from botocore import exceptions as boto3_exceptions
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from threading import Lock
 from tqdm import tqdm
-import threading
-import queue
 import time
 
 from conf.cluster_conf import ENV_VAR_FOR_AWS_USER_ID, ENV_VAR_FOR_AWS_USER_KEY
@@ -14,6 +15,17 @@ from utils import logger
 
 log = logger.Logger().create(logger_name=__name__)
 
+# Transfers (see S3TransferEngine): number of objects transferred at the same time (and size of the connection pool),
+# retries of an object on throttling, server or connection error, waiting S3_INITIAL_BACKOFF * 2**(retry - 1) second,
+# at most S3_MAX_BACKOFF
+S3_MAX_IN_FLIGHT = 64
+S3_MAX_RETRIES = 4
+S3_INITIAL_BACKOFF = 0.2
+S3_MAX_BACKOFF = 5.0
+# Error codes worth retrying: throttling and server side errors
+S3_RETRY_ERROR_CODES = {"SlowDown", "Throttling", "ThrottlingException", "RequestTimeout", "InternalError",
+                        "ServiceUnavailable", "500", "502", "503", "504"}
+
 
 def is_valid_s3_key(name):
     if "valid" not in is_valid_s3_key.__dict__:  # check if it is the first call to this function
@@ -54,48 +66,180 @@ def object_exist_in_bucket(s3, bucket, key):
     return True
 
 
-def _worker(q, s3_bucket_name, prefix, overwrite, picture_dir, lock, up_success, up_failed):
-    with lock:
-        s3 = get_s3_resource()
-        if s3 is None:
-            log.error(f"Thread {threading.get_ident()} failed to connect.")
-            return -1
-    success = []
-    fail = []
-    while True:
+def get_s3_client(max_pool_connections=S3_MAX_IN_FLIGHT):
+    """
+    Return a s3 client. Unlike the resources, a client is thread safe: a single client is shared by all the threads of
+    a transfer, with a connection pool sized to the number of concurrent transfers. Retries are left to the caller.
+    :return:                    [object]    boto3 s3 client, None if the credentials are not found
+    """
+    try:
+        access_key_id = os.environ[ENV_VAR_FOR_AWS_USER_ID]
+        access_key = os.environ[ENV_VAR_FOR_AWS_USER_KEY]
+    except KeyError:
+        log.error(f'Environment variable {ENV_VAR_FOR_AWS_USER_ID} or {ENV_VAR_FOR_AWS_USER_KEY} not found. '
+                  f'Can\'t connect to S3 without credential.')
+        return None
+    config = Config(max_pool_connections=max_pool_connections, retries={"mode": "standard", "total_max_attempts": 1})
+    return boto3.client("s3", aws_access_key_id=access_key_id, aws_secret_access_key=access_key, config=config)
+
+
+class TransferResult:
+    """Outcome of a transfer: ids of the objects succeeded, skipped (already there) and failed as (id, reason)"""
+
+    def __init__(self):
+        self.succeeded = []
+        self.skipped = []
+        self.failed = []
+
+    def __len__(self):
+        return len(self.succeeded) + len(self.skipped) + len(self.failed)
+
+    def __str__(self):
+        return f'{len(self.succeeded)} succeeded, {len(self.skipped)} skipped, {len(self.failed)} failed'
+
+
+class SkipTransfer(Exception):
+    """Raised by a transfer function when the object doesn't need to be transferred"""
+
+
+def _is_retryable(err):
+    if isinstance(err, boto3_exceptions.ClientError):
+        error = err.response.get("Error", {})
+        status = err.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+        return error.get("Code") in S3_RETRY_ERROR_CODES or status == 429 or status >= 500
+    return isinstance(err, (boto3_exceptions.ConnectionError, boto3_exceptions.HTTPClientError))
+
+
+def _get_error_reason(err):
+    if isinstance(err, boto3_exceptions.ClientError):
+        return f'{err.response.get("Error", {}).get("Code")}: {err}'
+    return f'{type(err).__name__}: {err}'
+
+
+class S3TransferEngine:
+    """
+    Transfer of many small objects (pictures) to and from s3, latency bound rather than bandwidth bound: up to
+    'max_in_flight' objects are transferred at the same time through a single shared client, each object being retried
+    with an exponential backoff on throttling, server or connection errors.
+
+    Usage:
+        engine = S3TransferEngine()
+        result = engine.upload({"img_id": ("pictures/img_id.jpg", "my-bucket", "key/prefix/img_id")})
+        print(result.failed)
+    """
+
+    def __init__(self, client=None, max_in_flight=S3_MAX_IN_FLIGHT, max_retries=S3_MAX_RETRIES,
+                 initial_backoff=S3_INITIAL_BACKOFF, max_backoff=S3_MAX_BACKOFF):
+        """
+        :param client:              [object]    boto3 s3 client. Default: a client from get_s3_client
+        :param max_in_flight:       [int]       Number of objects transferred at the same time
+        :param max_retries:         [int]       Retries of an object on throttling, server or connection error
+        :param initial_backoff:     [float]     Wait before the first retry in second, doubled at each retry
+        :param max_backoff:         [float]     Maximum wait before a retry in second
+        """
+        self.client = get_s3_client(max_pool_connections=max_in_flight) if client is None else client
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.nb_retry = 0
+        self.lock = Lock()  # Protects 'nb_retry', incremented by the transfer threads
+
+    def _run_with_retry(self, transfer, *args):
+        for retry in range(self.max_retries + 1):
+            if retry > 0:
+                time.sleep(min(self.max_backoff, self.initial_backoff * 2 ** (retry - 1)))
+                with self.lock:
+                    self.nb_retry += 1
+            try:
+                return transfer(*args)
+            except (boto3_exceptions.ClientError, boto3_exceptions.BotoCoreError) as err:
+                if retry == self.max_retries or not _is_retryable(err):
+                    raise
+
+    def run(self, d_item, transfer, description=""):
+        """
+        Call 'transfer(*args)' for each item of 'd_item' {item_id: args}, 'max_in_flight' at a time.
+        :return:                    [TransferResult]
+        """
+        result = TransferResult()
+        if self.client is None:
+            result.failed = [(item_id, "no s3 client") for item_id in d_item]
+            return result
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor, \
+                tqdm(total=len(d_item), desc=description, ncols=100) as progress_bar:
+            pending = {}
+
+            def collect(futures):
+                for future in futures:
+                    item_id = pending.pop(future)
+                    try:
+                        future.result()
+                        result.succeeded.append(item_id)
+                    except SkipTransfer:
+                        result.skipped.append(item_id)
+                    except (boto3_exceptions.ClientError, boto3_exceptions.BotoCoreError, OSError) as err:
+                        result.failed.append((item_id, _get_error_reason(err)))
+                    progress_bar.update(1)
+
+            for item_id, args in d_item.items():
+                pending[executor.submit(self._run_with_retry, transfer, *args)] = item_id
+                if len(pending) >= 2 * self.max_in_flight:  # bounded number of submitted transfers
+                    done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                    collect(done)
+            collect(list(pending))
+        return result
+
+    def _upload_file(self, file, bucket, key, overwrite):
+        if not overwrite and self.object_exists(bucket, key):
+            raise SkipTransfer()
+        with Path(file).open(mode='rb') as fp:
+            self.client.put_object(Bucket=bucket, Key=key, Body=fp.read())
+
+    def _download_file(self, bucket, key, output_file, overwrite):
+        output_file = Path(output_file)
+        if not overwrite and output_file.is_file():
+            raise SkipTransfer()
+        body = self.client.get_object(Bucket=bucket, Key=key)["Body"].read()
+        tmp_file = output_file.with_name(output_file.name + ".part")
+        tmp_file.write_bytes(body)
+        tmp_file.replace(output_file)
+
+    def object_exists(self, bucket, key):
         try:
-            pic_id, label = q.get(block=True, timeout=0.05)
-        except queue.Empty:
-            break
-        picture = Path(picture_dir) / label["file_name"]
-        key = prefix + pic_id
-        if not overwrite and object_exist_in_bucket(s3, s3_bucket_name, key):
-            log.warning(f'  --> Can\'t upload file "{picture}" because key "{key}" already exists in bucket "{s3_bucket_name}"')
-            fail.append(pic_id)
-        else:
-            s3.meta.client.upload_file(str(picture), s3_bucket_name, key)
-            success.append(pic_id)
-    with lock:
-        up_failed += fail
-        up_success += success
-
-
-def _print_progress(q, total):
-    start_time = time.time()
-    while not q.empty():
-        finished = total - q.qsize()
-        elapsed_time = time.time() - start_time
-        progress_bar = tqdm.format_meter(finished, total, elapsed_time, ncols=100)
-        print(f'{progress_bar}', end='')
-        time.sleep(0.5)
-        print('', end='\r', flush=True)
-    finished = total - q.qsize()
-    elapsed_time = time.time() - start_time
-    progress_bar = tqdm.format_meter(finished, total, elapsed_time, ncols=100)
-    print(f'{progress_bar}')
-
-
-def upload_to_s3_from_label(d_label, picture_dir, s3_bucket_name, prefix="", overwrite=False, nb_of_thread=10):
+            self.client.head_object(Bucket=bucket, Key=key)
+        except boto3_exceptions.ClientError as err:
+            if err.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    def upload(self, d_file, overwrite=False):
+        """
+        :param d_file:              [dict]      Files to upload: {item_id: (file path, bucket name, key)}
+        :param overwrite:           [bool]      If False, the objects which already exist are skipped
+        :return:                    [TransferResult]
+        """
+        return self.run({item_id: args + (overwrite,) for item_id, args in d_file.items()}, self._upload_file,
+                        description="Upload")
+
+    def download(self, d_object, overwrite=True):
+        """
+        :param d_object:            [dict]      Objects to download: {item_id: (bucket name, key, output file path)}
+        :param overwrite:           [bool]      If False, the objects whose output file already exists are skipped
+        :return:                    [TransferResult]
+        """
+        return self.run({item_id: args + (overwrite,) for item_id, args in d_object.items()}, self._download_file,
+                        description="Download")
+
+
+def _log_transfer_failures(result, action):
+    for item_id, reason in result.failed:
+        log.warning(f'  --> Can\'t {action} picture "{item_id}" because: {reason}')
+
+
+def upload_to_s3_from_label(d_label, picture_dir, s3_bucket_name, prefix="", overwrite=False,
+                            nb_of_thread=S3_MAX_IN_FLIGHT, engine=None):
     """
     Upload picture to s3 bucket.
     Note that credential to access the s3 bucket is retrieved from env variable (see variable name in the code)
@@ -106,26 +250,21 @@ def upload_to_s3_from_label(d_label, picture_dir, s3_bucket_name, prefix="", ove
     :param s3_bucket_name:      [string]    Name of the bucket
     :param prefix:              [string]    Prefix for every picture
     :param overwrite:           [bool]      If True, existing pic will be overwritten by new one sharing the same img_id
-    :param nb_of_thread:        [int]       Number of thread
-    :return:                    [tuple]     list of picture id successfully upladed, list of picture id failed to upload
+    :param nb_of_thread:        [int]       Number of pictures uploaded at the same time
+    :param engine:              [object]    S3TransferEngine to use. Default: a new engine with 'nb_of_thread' transfers
+    :return:                    [tuple]     list of picture id successfully upladed, list of picture id not uploaded
+                                            because already existing in the bucket, list of picture id failed to upload
     """
-    already_exist_pic = []
-    upload_success = []
-    q = queue.Queue()
-    for pic_id, label in d_label.items():
-        item = (pic_id, label)
-        q.put(item)
-    l_thread = []
-    lock = threading.RLock()
-    for i in range(nb_of_thread):
-        thread = threading.Thread(target=_worker, args=(q, s3_bucket_name, prefix, overwrite, picture_dir, lock,
-                                                        upload_success, already_exist_pic))
-        thread.start()
-        l_thread.append(thread)
-    _print_progress(q, len(d_label))
-    for thread in l_thread:
-        thread.join()
-    return upload_success, already_exist_pic
+    engine = S3TransferEngine(max_in_flight=nb_of_thread) if engine is None else engine
+    d_file = {pic_id: (Path(picture_dir) / label["file_name"], s3_bucket_name, prefix + pic_id)
+              for pic_id, label in d_label.items()}
+    result = engine.upload(d_file, overwrite=overwrite)
+    for pic_id in result.skipped:
+        log.warning(f'  --> Can\'t upload file "{d_file[pic_id][0]}" because key "{d_file[pic_id][2]}" already exists '
+                    f'in bucket "{s3_bucket_name}"')
+    _log_transfer_failures(result, "upload")
+    log.debug(f'Upload to s3: {result} ; {engine.nb_retry} retries')
+    return result.succeeded, result.skipped, [pic_id for pic_id, _ in result.failed]
 
 
 def get_s3_formatted_bucket_path(bucket_name, key_prefix, file_name=None):
@@ -209,41 +348,7 @@ def delete_all_in_s3_folder(bucket, key_prefix, s3_resource=None):
     return True
 
 
-def _download_worker(q, lock, output_dir, error_log):
-    """
-    Download file from an s3 bucket and write it to output_file
-    :param q:               [queue obj] queue containing item to download as tuple (img_id, picture_label)
-    :param lock:            [lock obj]  lock object
-    :param output_dir:      [str]       Path to the directory where to download the pictures
-    :param error_log:       [list]      List where errors will be appended
-    """
-    with lock:
-        s3 = get_s3_resource()
-        if s3 is None:
-            log.error(f"Thread {threading.get_ident()} failed to connect.")
-            return -1
-    error = []
-    while True:
-        try:
-            img_id, picture = q.get(block=True, timeout=0.05)
-        except queue.Empty:
-            break
-        output_file = output_dir / picture["file_name"]
-        bucket, key_prefix, file_name = split_s3_path(f'{picture["s3_bucket"]}/{img_id}')
-        try:
-            s3.meta.client.download_file(bucket, key_prefix + file_name, output_file.as_posix())
-        except boto3_exceptions.ClientError as e:
-            if e.response['Error']['Code'] != 404:
-                log.error(f'Error: picture "{key_prefix + file_name}" not found in bucket {bucket}.')
-                error.append((img_id, e.response['Error']['Code'], f'{e}'))
-            else:
-                log.error(f'Unexpected error: {e}')
-                error.append((img_id, e.response['Error']['Code'], f'{e}'))
-    with lock:
-        error_log += error
-
-
-def download_from_s3(d_picture, output_dir, nb_of_thread=10):
+def download_from_s3(d_picture, output_dir, nb_of_thread=S3_MAX_IN_FLIGHT, engine=None):
     """
     :param d_picture:       [dict]      Dictionary of downloaded pictures as follow:
                                         {
@@ -255,17 +360,16 @@ def download_from_s3(d_picture, output_dir, nb_of_thread=10):
                                             ...
                                         }
     :param output_dir:      [str]       Path to the directory where to save the pictures
+    :param nb_of_thread:    [int]       Number of pictures downloaded at the same time
+    :param engine:          [object]    S3TransferEngine to use. Default: a new engine with 'nb_of_thread' transfers
     """
-    lock = threading.RLock()
-    q = queue.Queue()
-    error_log = []
+    engine = S3TransferEngine(max_in_flight=nb_of_thread) if engine is None else engine
+    d_object = {}
     for img_id, picture in d_picture.items():
-        q.put((img_id, picture))
-    for i in range(nb_of_thread):
-        thread = threading.Thread(target=_download_worker, args=(q, lock, output_dir, error_log))
-        thread.start()
-    _print_progress(q, len(d_picture))
-    success = len(d_picture) - len(error_log)
-    if len(error_log) > 0:
-        log.info(f'{len(error_log)} pictures couldn\'t be download')
-    log.info(f'{success} pictures have successfully been downloaded to "{output_dir}"')
+        bucket, key_prefix, file_name = split_s3_path(f'{picture["s3_bucket"]}/{img_id}')
+        d_object[img_id] = (bucket, key_prefix + file_name, Path(output_dir) / picture["file_name"])
+    result = engine.download(d_object)
+    _log_transfer_failures(result, "download")
+    if len(result.failed) > 0:
+        log.info(f'{len(result.failed)} pictures couldn\'t be download')
+    log.info(f'{len(result.succeeded)} pictures have successfully been downloaded to "{output_dir}"')
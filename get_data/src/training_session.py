@@ -1,41 +1,61 @@
 import time
 from datetime import datetime
-from PIL import Image
 from pathlib import Path
-import json
 
-import Adafruit_PCA9685
-try:
-    from picamera import PiCamera
-    from picamera.array import PiRGBArray
-except ModuleNotFoundError:
-    pass
-    # print("WARNING: can\'t import PiCamera package. Running in TEST MODE with fake PiCamera.")
-    # from test.fake_package.fake_picamera import PiCamera
-    # from test.fake_package.fake_picamera import PiRGBArray
-
-from get_data.src import xbox
 from get_data.src import label_handler
 from conf.const import HEAD_DOWN, STOP_SPEED, MAX_DIRECTION_LEFT, MAX_DIRECTION_RIGHT, STOP_SPEED_LABEL
 from utils import car_mapping as cm
-from utils.pivideostream import init_cam
+from utils.capture_scheduler import CaptureScheduler
+from utils.actuator import Actuator, DIRECTION_CHANNEL, SPEED_CHANNEL, HEAD_CHANNEL
+from utils.control_history import ControlHistory, ControlSample
+from utils.frame_writer import FrameWriter, DROP, JPEG
+from utils.stage_timer import LatencyHistogram
+from utils import devices
 from get_data.src import utils_fct
 
 
 class TrainingSession:
-    def __init__(self, delay, output_dir, pwm_freq=50):
-        # Setup Camera
-        self.camera, self.rawCapture = init_cam()
+    def __init__(self, delay, output_dir, pwm_freq=50, pwm_refresh=1.0, nb_writers=2, writer_policy=DROP,
+                 control_rate=50, max_capture_fps=30, min_difference=2.0, storage=JPEG, video_stream=None, pwm=None,
+                 joystick=None):
+        """
+        :param delay:           [float] Time between 2 recorded pictures when the steering doesn't change. 0 to record
+                                        at 'max_capture_fps'
+        :param nb_writers:      [int]   Number of threads saving the pictures in background
+        :param writer_policy:   [str]   What to do when the queue of pictures to save is full: drop the picture (DROP)
+                                        or wait in the control loop (BLOCK)
+        :param control_rate:    [float] Frequency (Hz) of the control loop, independent of the camera frame rate
+        :param max_capture_fps: [float] Max pictures recorded per second, when the steering changes quickly
+        :param min_difference:  [float] Min mean pixel difference (0-255) with the last recorded picture. 0 to record
+                                        near duplicate pictures
+        :param storage:         [str]   JPEG to encode the pictures while driving, RAW to store the raw frames and
+                                        encode them later with get_data/transcode_raw.py
+        :param video_stream:    [object]    Started camera to use instead of the Pi camera (see utils.devices)
+        :param pwm:             [object]    PWM driver to use instead of the PCA9685
+        :param joystick:        [object]    Gamepad to use instead of the Xbox controller
+        """
+        # Setup Camera: frames are captured by a background thread
+        self.video_stream = devices.get_camera() if video_stream is None else video_stream
 
         self.delay = float(delay)
+        target_fps = max_capture_fps if self.delay <= 0 else 1 / self.delay
+        self.capture_scheduler = CaptureScheduler(target_fps=target_fps, max_fps=max_capture_fps,
+                                                  min_difference=min_difference)
         self.label = [-1, 2]
-        self.buffer = []
+        self.nb_writers = nb_writers
+        self.writer_policy = writer_policy
+        self.storage = storage
+        self.frame_writer = None
         self.car_mapping = cm.CarMapping()
+        self.control_rate = float(control_rate)
+        # about one second of controller states to pair each frame with the one nearest to its capture time
+        self.control_history = ControlHistory(maxlen=max(int(self.control_rate), 2))
 
         # set controls
         self.x_cursor = 0
         self.trigger = 0
-        self.pwm = Adafruit_PCA9685.PCA9685()
+        # the joystick is read on every control loop iteration: motors are written only when their value changes
+        self.pwm = Actuator(devices.get_pwm_driver() if pwm is None else pwm, refresh_period=pwm_refresh)
         self.pwm.set_pwm_freq(pwm_freq)
 
         # Init speed direction
@@ -44,70 +64,118 @@ class TrainingSession:
         self.head = HEAD_DOWN
 
         # Set head down
-        self.pwm.set_pwm(2, 0, self.head)
+        self.pwm.set_pwm(HEAD_CHANNEL, 0, self.head)
 
         # Setup xbox pad
-        self.joy = xbox.Joystick()
+        self.joy = devices.get_gamepad() if joystick is None else joystick
+        # Time from a controller event to the PWM write it leads to
+        self.input_latency = LatencyHistogram()
+        self.last_input_time = 0
 
         # Init Label
         self.meta_label = label_handler.Label(picture_dir=output_dir, camera_position=self.head,
                                               car_mapping=self.car_mapping)
 
-    def save_and_clear_buffer(self):
-        print(f'Saving picture to "{self.meta_label.picture_dir}" ...', end=" ", flush=True)
-        self.pwm.set_pwm(0, 0, 0)
-        self.pwm.set_pwm(1, 0, 0)
-        for picture_path, im in self.buffer:
-            im.save(picture_path.as_posix())
-        print(f'Done ! {len(self.buffer)} pictures saved !')
-        self.buffer.clear()
+    def stop_writer(self):
+        """Wait for the pictures still in the queue to be saved, write the labels file and print the writer counters."""
+        print(f'Saving remaining pictures to "{self.meta_label.picture_dir}" ...', end=" ", flush=True)
+        self.frame_writer.stop()
+        writer = self.frame_writer
+        print(f'Done ! {writer.nb_written} pictures saved, {writer.nb_dropped} dropped (queue full), '
+              f'{writer.nb_failed} failed, {writer.blocked_time:.2f}s waiting for the queue.')
+        print(f'Labels saved to "{writer.label_file}"')
 
     def run(self, show_mode=False, max_buff_size=100):
-        # Loop over camera frames
-        start = time.time()
+        """
+        Drive and record pictures until the A button is pressed. The controls run at 'control_rate' Hz whatever the
+        camera frame rate ; each picture is labelled with the controller state nearest in time to its capture.
+        Pictures are saved in background, without stopping.
+        :param max_buff_size:   [int]   Max number of pictures waiting to be saved
+        """
+        label_file = utils_fct.get_label_file_name(self.meta_label.picture_dir)
+        self.frame_writer = FrameWriter(label_file, max_queue_size=max_buff_size, nb_workers=self.nb_writers,
+                                        policy=self.writer_policy, label_session=self.meta_label,
+                                        storage=self.storage).start()
+        period = 1 / self.control_rate
+        start_seq = self.video_stream.frame_seq
+        start_time = time.time()
+        self.capture_scheduler.reset()
+        next_time = start_time
+        nb_loop = 0
+        nb_overrun = 0
+        pending_frame = None
         i = 0
-        l_label = {}
-        for frame in self.camera.capture_continuous(self.rawCapture, format="rgb", use_video_port=True):
-            # convert img as Array
-            image = frame.array
+        while True:
             # control car
             self.controls()
-            if self.label[0] != STOP_SPEED_LABEL and time.time() - start > self.delay:
-                im = Image.fromarray(image, 'RGB')
-                t_stamp = datetime.now().strftime("%Y%m%dT%H-%M-%S-%f")
-                picture_path = Path(self.meta_label.picture_dir) / f'{str(t_stamp)}.jpg'
-                self.meta_label.set_label(img_id=t_stamp,
-                                          file_name=picture_path.name,
-                                          timestamp=t_stamp,
-                                          raw_direction=self.direction,
-                                          raw_speed=self.speed,
-                                          label_direction=self.label[1],
-                                          label_speed=self.label[0])
-                l_label[t_stamp] = self.meta_label.get_copy()
-                self.buffer.append((picture_path, im))
-                if show_mode:
-                    print(f'{i}: speed:x={self.trigger}|l={self.label[0]}|'
-                          f'n={self.meta_label["raw_value"]["normalized_speed"]} ; dir:x={self.x_cursor}|'
-                          f'l={self.label[1]}|n={self.meta_label["raw_value"]["normalized_direction"]} ; '
-                          f'pic_path:"{picture_path}"')
-                i += 1
-                start = time.time()
-                if len(self.buffer) > max_buff_size:
-                    self.save_and_clear_buffer()
-            # Clean image before the next comes
-            self.rawCapture.truncate(0)
+            self.control_history.append(ControlSample(time.time(), self.trigger, self.x_cursor, self.speed,
+                                                      self.direction, self.label[0], self.label[1]))
+            nb_loop += 1
+            # keep the latest captured frame until a controller state is known after its capture time
+            stamped_frame = self.video_stream.read_new(timeout=0)
+            if stamped_frame is not None:
+                pending_frame = stamped_frame
+            if pending_frame is not None and self.control_history.last_time >= pending_frame[1]:
+                _, frame_time, image = pending_frame
+                pending_frame = None
+                sample = self.control_history.nearest(frame_time)
+                if self.capture_scheduler.should_capture(frame_time, image, sample.x_cursor,
+                                                         moving=sample.label_speed != STOP_SPEED_LABEL):
+                    self.record(image, frame_time, sample, i, show_mode)
+                    i += 1
             if self.joy.A():  # Test state of the A button (1=pressed, 0=not pressed)
-                self.pwm.set_pwm(0, 0, 0)
-                self.pwm.set_pwm(1, 0, 0)
-                self.save_and_clear_buffer()
+                self.pwm.stop_channels([DIRECTION_CHANNEL, SPEED_CHANNEL])
                 print("Stop")
-                output_label = utils_fct.get_label_file_name(self.meta_label.picture_dir)
-                with output_label.open(mode='w', encoding='utf-8') as fp:
-                    json.dump(l_label, fp, indent=4)
-                print(f'Labels saved to "{output_label}"')
+                elapsed_time = time.time() - start_time
+                self.stop_writer()
+                print(f'Capture: {(self.video_stream.frame_seq - start_seq) / elapsed_time:.1f} fps ; control loop: '
+                      f'{nb_loop / elapsed_time:.1f} Hz (target {self.control_rate:.0f} Hz, {nb_overrun} overrun(s)) ; '
+                      f'{i} picture(s) recorded')
+                print(f'Capture scheduler: {self.capture_scheduler}')
+                self.print_input_latency()
                 return
+            next_time += period
+            sleep_time = next_time - time.time()
+            if sleep_time > 0:
+                time.sleep(sleep_time)
+            else:  # late: restart the schedule from now instead of running several iterations in a row
+                nb_overrun += 1
+                next_time = time.time()
+
+    def record(self, image, frame_time, sample, i=0, show_mode=False):
+        """
+        Queue a frame and its label for writing.
+        :param image:           [np.array]      rgb frame
+        :param frame_time:      [float]         Capture time of the frame (time.time())
+        :param sample:          [ControlSample] Controller state the frame is labelled with
+        """
+        t_stamp = datetime.fromtimestamp(frame_time).strftime("%Y%m%dT%H-%M-%S-%f")
+        picture_path = Path(self.meta_label.picture_dir) / f'{str(t_stamp)}.jpg'
+        # the full label is built by the writer threads from this record and the session metadata
+        record = self.meta_label.new_record(img_id=t_stamp,
+                                            file_name=picture_path.name,
+                                            timestamp=t_stamp,
+                                            raw_direction=sample.direction,
+                                            raw_speed=sample.speed,
+                                            label_direction=sample.label_direction,
+                                            label_speed=sample.label_speed)
+        # the video stream allocates a new array for each frame: no copy needed
+        self.frame_writer.put(image, picture_path.as_posix(), t_stamp, record)
+        if show_mode:
+            print(f'{i}: speed:x={sample.trigger}|l={sample.label_speed}|'
+                  f'n={self.car_mapping.get_normalized_speed(sample.speed)} ; dir:x={sample.x_cursor}|'
+                  f'l={sample.label_direction}|n={self.car_mapping.get_normalized_direction(sample.direction)} ; '
+                  f'pic_path:"{picture_path}"')
+
+    def print_input_latency(self):
+        latency = self.input_latency.to_dict()
+        if latency["count"] > 0:
+            print(f'Controller to PWM latency over {latency["count"]} event(s): p50={latency["p50_ms"]:.1f}ms '
+                  f'p95={latency["p95_ms"]:.1f}ms max={latency["max_ms"]:.1f}ms')
 
     def controls(self):
+        # Snapshots are produced by the joystick reader thread: reading them never waits on the controller
+        input_time = self.joy.state.timestamp
         # Get speed label
         self.trigger = round(self.joy.rightTrigger(), 2)  # Right trigger position (values 0 to 1.0)
         self.speed = self.car_mapping.get_raw_speed_from_xbox_trigger(self.trigger)
@@ -117,5 +185,7 @@ class TrainingSession:
         self.direction = self.car_mapping.get_raw_dir_from_xbox_joystick(self.x_cursor)
         self.label[1] = self.car_mapping.get_label_from_raw_dir(self.direction)
         # Set motor direction and speed
-        self.pwm.set_pwm(0, 0, self.direction)
-        self.pwm.set_pwm(1, 0, self.speed)
+        self.pwm.set_channels([(DIRECTION_CHANNEL, self.direction), (SPEED_CHANNEL, self.speed)])
+        if input_time > self.last_input_time:
+            self.input_latency.add(time.time() - input_time)
+            self.last_input_time = input_time
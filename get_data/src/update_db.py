@@ -214,7 +214,9 @@ def _ask_user_dataset_details(dataset):
 def create_dataset(label_json_file, raw_query_file=None, overwrite_input_file=True, es_index=ES_INDEX,
                    es_host_ip=ES_HOST_IP, es_host_port=ES_HOST_PORT):
     """
-    Create a dataset interactively and add all the labels in label_json_file to this dataset
+    Create a dataset interactively and add all the labels in label_json_file to this dataset.
+    The labels are updated by the Elasticsearch cluster itself (update by query): if the raw query is given, the labels
+    tagged are the ones matching it in the database, otherwise the ones of the input file.
     :param label_json_file:             [str]   Path to the input file containing all the labels
     :param raw_query_file:              [str]   Path to the raw query file used to get the labels json from the database
     :param overwrite_input_file:        [bool]  If True (default), the input file will be modified with the new dataset.
@@ -238,7 +240,18 @@ def create_dataset(label_json_file, raw_query_file=None, overwrite_input_file=Tr
         dataset = {"query": None}
     dataset = _ask_user_dataset_details(dataset)
     log.info(f'Uploading dataset "{dataset["name"]}" to {es_host_ip}:{es_host_port}')
-    es_utils.append_value_to_field(d_label, "dataset", dataset, es_index, es_host_ip, es_host_port)
+    success, errors = es_utils.add_dataset(dataset, es_index, es_host_ip, es_host_port, query=dataset["query"],
+                                           d_label=d_label)
+    if len(errors) > 0:
+        log.error(f'Dataset "{dataset["name"]}" not added to all the labels ({len(errors)} error(s)), input file '
+                  f'"{label_json_file}" not updated:')
+        for err in errors:
+            log.error(f'  --> "{err["update"]["_id"]}" got "{err["update"]["error"]["type"]}" because: '
+                      f'{err["update"]["error"]["reason"]}')
+        return False
+    if dataset["query"] is not None and success != len(d_label):
+        log.warning(f'{success} label(s) matching the query are in the dataset in the database, while the input file '
+                    f'has {len(d_label)} label(s): the database changed since the labels were downloaded.')
     if overwrite_input_file:
         for img_id, label in d_label.items():
             if label["dataset"] is None:
@@ -255,7 +268,7 @@ def create_dataset(label_json_file, raw_query_file=None, overwrite_input_file=Tr
 
 
 def delete_dataset(dataset_name, es_index=ES_INDEX, es_host_ip=ES_HOST_IP, es_host_port=ES_HOST_PORT, verbose=1,
-                   force=False):
+                   force=False, slices="auto"):
     """
     Delete a dataset from the database. All labels with this dataset name in their "dataset.name" field will be updated.
     No labels nor pictures are removed, only the dataset field of the labels is updated.
@@ -265,6 +278,7 @@ def delete_dataset(dataset_name, es_index=ES_INDEX, es_host_ip=ES_HOST_IP, es_ho
     :param es_host_port                 [str]   port opened for ES. If None, value is retrieved from the config file
     :param verbose:                     [int]   verbosity level
     :param force:                       [bool]  If True, user won't be prompt for validation before deleting the dataset
+    :param slices:                      [int]   Number of sub tasks run in parallel by the cluster, or "auto"
     :return                             [bool]
     """
     search_query = {
@@ -274,21 +288,18 @@ def delete_dataset(dataset_name, es_index=ES_INDEX, es_host_ip=ES_HOST_IP, es_ho
             "query": dataset_name
         }
     }
-    d_label = get_from_db.run_search_query(search_query, es_index=es_index, verbose=0)
-    if len(d_label) == 0:
+    es = es_utils.get_es_session(host_ip=es_host_ip, port=es_host_port)
+    if es is None:
+        return False
+    nb_label = es_utils.get_search_query_from_dict(es_index, search_query).using(es).count()
+    if nb_label == 0:
         log.info(f'No labels found for dataset "{dataset_name}".')
         return True
-    _, first_doc = next(iter(d_label.items()))
-    l_dataset = first_doc["dataset"]
-    for dataset in l_dataset:
-        if dataset["name"] == dataset_name:
-            break
-    else:
-        log.error("Dataset not found in result...")
-        exit(1)
-    log.debug(f'Dataset is : {dataset}')
     validation = "" if not force else "y"
     while validation not in ["y", "n"]:
-        validation = input(f'{len(d_label)} labels found in this dataset. Do you want to delete this dataset (y/n)? ')
-    es_utils.delete_value_from_field(d_label, "dataset", dataset, es_index, es_host_ip, es_host_port)
-    return True
+        validation = input(f'{nb_label} labels found in this dataset. Do you want to delete this dataset (y/n)? ')
+    if validation == "n":
+        return False
+    _, errors = es_utils.remove_dataset(dataset_name, es_index, es_host_ip, es_host_port, slices=slices,
+                                        verbose=verbose)
+    return len(errors) == 0
@@ -35,18 +35,21 @@ def _remove_missing_pic_from_dic(label_dict, picture_dir):
     return missing_pic_id
 
 
-def _print_upload_synthesis(bucket, index_name, es_success, failed_es, s3_success, missing_pic, already_exist_pic):
+def _print_upload_synthesis(bucket, index_name, es_success, failed_es, s3_success, missing_pic, already_exist_pic,
+                            failed_s3):
     synthesis = '----------------------------------------\n'
     synthesis += f'Upload Completed ! {s3_success} picture(s) uploaded to s3 and {es_success} uploaded to ES\n'
     if bucket is not None:
         synthesis += f'Upload to s3:\n'
         synthesis += f' Upload bucket: "{bucket}"\n'
         synthesis += f' {s3_success} picture(s) were successful uploaded to s3.\n'
-        synthesis += f' {len(missing_pic) + len(already_exist_pic)} upload failed to s3.\n'
+        synthesis += f' {len(missing_pic) + len(already_exist_pic) + len(failed_s3)} upload failed to s3.\n'
         if len(missing_pic) > 0:
             synthesis += f'   --> Picture not found:                   {missing_pic}\n'
         if len(already_exist_pic) > 0:
             synthesis += f'   --> Picture id already exists in bucket: {already_exist_pic}\n'
+        if len(failed_s3) > 0:
+            synthesis += f'   --> Transfer failed:                     {failed_s3}\n'
     synthesis += f'Upload ES:\n'
     synthesis += f' Index name: "{index_name}"\n'
     synthesis += f' {es_success} picture(s) were successful uploaded to ES.\n'
@@ -98,7 +101,8 @@ def generate_key_prefix(d_label):
     return f'{event}/{date.strftime("%Y%m%d")}/'
 
 
-def upload_to_db(label_file, es_host_ip, es_port, es_index, bucket_name=None, key_prefix=None, overwrite=False):
+def upload_to_db(label_file, es_host_ip, es_port, es_index, bucket_name=None, key_prefix=None, overwrite=False,
+                 es_threads=es_utils.BULK_NB_THREADS, es_chunk_size=es_utils.BULK_CHUNK_SIZE):
     """
     Upload picture(s) to the DataBase according to the label file, json format.
     Labels are uploaded to Elasticsearch cluster ; pictures are uploaded to S3 bucket. The label file and the pictures
@@ -127,6 +131,8 @@ def upload_to_db(label_file, es_host_ip, es_port, es_index, bucket_name=None, ke
                                         {event_name}/{upload_date}/
                                         So the picture will be uploaded to:
                                         "https://s3.amazonaws.com/{my-bucket}/{event_name}/{picture_date}/"
+    :param es_threads:      [int]       Number of bulk requests sent in parallel to Elasticsearch
+    :param es_chunk_size:   [int]       Maximum number of labels per bulk request
     :return:                [tuple]     (int) s3 success upload, (int) ES success upload, (int) total nb of failed upload
     """
     picture_folder = Path(label_file).parent
@@ -147,17 +153,19 @@ def upload_to_db(label_file, es_host_ip, es_port, es_index, bucket_name=None, ke
                 return 0, 0, total_label
         upload_bucket_dir, bucket_name, key_prefix = s3_utils.get_s3_formatted_bucket_path(bucket_name, key_prefix)
         log.debug(f'Uploading to s3...')
-        s3_upload_success, already_exist_pic = s3_utils.upload_to_s3_from_label(
+        s3_upload_success, already_exist_pic, failed_s3_upload = s3_utils.upload_to_s3_from_label(
             d_label, picture_dir=picture_folder, s3_bucket_name=bucket_name, prefix=key_prefix, overwrite=overwrite)
         utils_fct.edit_label(d_label, "s3_bucket", upload_bucket_dir)
         utils_fct.edit_label(d_label, "upload_date", datetime.now().strftime("%Y%m%dT%H-%M-%S-%f"))
     else:
         upload_bucket_dir = None
-        s3_upload_success = missing_pic = already_exist_pic = []
+        s3_upload_success = missing_pic = already_exist_pic = failed_s3_upload = []
     log.debug(f'Uploading to Elasticsearch cluster...')
     failed_es_upload = es_utils.upload_to_es(
-        d_label=d_label, index=es_index, host_ip=es_host_ip, port=es_port, overwrite=overwrite)
+        d_label=d_label, index=es_index, host_ip=es_host_ip, port=es_port, overwrite=overwrite, nb_threads=es_threads,
+        chunk_size=es_chunk_size)
     es_success = len(d_label) - len(failed_es_upload)
-    _print_upload_synthesis(upload_bucket_dir, es_index,
-                            es_success, failed_es_upload, len(s3_upload_success), missing_pic, already_exist_pic)
-    return len(s3_upload_success), es_success, len(failed_es_upload) + len(already_exist_pic) + len(missing_pic)
+    _print_upload_synthesis(upload_bucket_dir, es_index, es_success, failed_es_upload, len(s3_upload_success),
+                            missing_pic, already_exist_pic, failed_s3_upload)
+    nb_s3_fail = len(already_exist_pic) + len(failed_s3_upload) + len(missing_pic)
+    return len(s3_upload_success), es_success, len(failed_es_upload) + nb_s3_fail
@@ -1,12 +1,12 @@
 from datetime import datetime
 from pathlib import Path
-import json
 import hashlib
 import sys
 
 sys.path.append(str(Path(__file__).absolute().parents[1]))
 from get_data.src import s3_utils
 from utils import logger
+from utils.label_journal import read_label_file
 
 log = logger.Logger().create(logger_name=__name__)
 
@@ -17,13 +17,14 @@ def get_label_file_name(directory, base_name="labels", suffix=".json"):
 
 
 def get_label_dict_from_file(file):
-    """Open and read file containing the label(s). Return a dictionary of label or None on errors."""
+    """
+    Open and read file containing the label(s): labels json file or label journal (.jsonl, see utils.label_journal).
+    Return a dictionary of label or None on errors.
+    """
     if not Path(file).is_file():
         log.error(f'File "{file}" can\'t be found.')
         return None
-    with Path(file).open(mode='r', encoding='utf-8') as fp:
-        d_label = json.load(fp)
-    return d_label
+    return read_label_file(file)
 
 
 def remove_label_to_delete_from_dict(d_label):
@@ -28,80 +28,55 @@ All controller buttons are supported.  See code for all functions.
 import subprocess
 import select
 import time
+from collections import namedtuple
+from threading import Thread
 
 
-# noinspection PyPep8Naming
-class Joystick:
-    """Initializes the joystick/wireless receiver, launching 'xboxdrv' as a subprocess
-    and checking that the wired joystick or wireless receiver is attached.
-    The refreshRate determines the maximnum rate at which events are polled from xboxdrv.
-    Calling any of the Joystick methods will cause a refresh to occur, if refreshTime has elapsed.
-    Routinely call a Joystick method, at least once per second, to avoid overfilling the event buffer.
+# Immutable snapshot of the controller, parsed once per xboxdrv event. Axes are raw values (-32768 to 32767), triggers
+# raw values (0 to 255) and buttons a tuple of 0/1 indexed by the button constants below. 'timestamp' is the time the
+# event was read from xboxdrv.
+JoystickState = namedtuple("JoystickState", ["timestamp", "connected", "left_x", "left_y", "right_x", "right_y",
+                                             "left_trigger", "right_trigger", "buttons"])
 
-    Usage:
-        joy = xbox.Joystick()
-    """
+DPAD_UP, DPAD_DOWN, DPAD_LEFT, DPAD_RIGHT, BACK, GUIDE, START, LEFT_THUMBSTICK, RIGHT_THUMBSTICK, BUTTON_A, BUTTON_B, \
+    BUTTON_X, BUTTON_Y, LEFT_BUMPER, RIGHT_BUMPER = range(15)
+# Position of each button in a 140 chars xboxdrv line, in the order of the constants above
+_BUTTON_POSITIONS = (45, 50, 55, 60, 68, 76, 84, 90, 95, 100, 104, 108, 112, 118, 123)
+XBOXDRV_LINE_LENGTH = 140
 
-    def __init__(self, refreshRate=30):
-        self.proc = subprocess.Popen(['xboxdrv', '--no-uinput', '--detach-kernel-driver'], stdout=subprocess.PIPE,
-                                     bufsize=0)
-        self.pipe = self.proc.stdout
-        #
-        self.connectStatus = False  # will be set to True once controller is detected and stays on
-        self.reading = '0' * 140  # initialize stick readings to all zeros
-        #
-        self.refreshTime = 0  # absolute time when next refresh (read results from xboxdrv stdout pipe) is to occur
-        self.refreshDelay = 1.0 / refreshRate  # joystick refresh is to be performed 30 times per sec by default
-        #
-        # Read responses from 'xboxdrv' for upto 2 seconds, looking for controller/receiver to respond
-        found = False
-        waitTime = time.time() + 2
-        while waitTime > time.time() and not found:
-            readable, writeable, exception = select.select([self.pipe], [], [], 0)
-            if readable:
-                response = self.pipe.readline()
-                # Hard fail if we see this, so force an error
-                if response[0:7] == b'No Xbox':
-                    raise IOError('No Xbox controller/receiver found')
-                # Success if we see the following
-                if response[0:12].lower() == b'press ctrl-c':
-                    found = True
-                # If we see 140 char line, we are seeing valid input
-                if len(response) == 140:
-                    found = True
-                    self.connectStatus = True
-                    self.reading = response
-        # if the controller wasn't found, then halt
-        if not found:
-            self.close()
-            raise IOError('Unable to detect Xbox controller/receiver - Run python as sudo')
 
-    """Used by all Joystick methods to read the most recent events from xboxdrv.
-    The refreshRate determines the maximum frequency with which events are checked.
-    If a valid event response is found, then the controller is flagged as 'connected'.
+def parse_reading(reading, timestamp=0.0):
+    """Parse a 140 chars xboxdrv line (bytes) into a JoystickState."""
+    return JoystickState(timestamp=timestamp, connected=True,
+                         left_x=int(reading[3:9]), left_y=int(reading[13:19]),
+                         right_x=int(reading[24:30]), right_y=int(reading[34:40]),
+                         left_trigger=int(reading[129:132]), right_trigger=int(reading[136:139]),
+                         buttons=tuple(reading[position] - 48 for position in _BUTTON_POSITIONS))  # 48 is ord('0')
+
+
+IDLE_STATE = parse_reading(b'X1:     0 Y1:     0  X2:     0 Y2:     0  du:0 dd:0 dl:0 dr:0  back:0 guide:0 start:0  '
+                           b'TL:0 TR:0  A:0 B:0 X:0 Y:0  LB:0 RB:0  LT:  0 RT:  0\n')._replace(connected=False)
+
+
+# noinspection PyPep8Naming
+class Gamepad:
     """
+    Interface of the gamepads: 'state' is the latest JoystickState snapshot, replaced (never modified) by the thread
+    reading the device, and the methods below read it. See Joystick for the Xbox controller and
+    utils.simulators.SimulatedGamepad for a scripted one.
+    """
+
+    def __init__(self):
+        self.state = IDLE_STATE  # replaced (never modified) by the reader thread
+        self.nb_event = 0
+        self.error = None
+        self.stopped = False
 
     def refresh(self):
-        # Refresh the joystick readings based on regular defined freq
-        response = None
-        if self.refreshTime < time.time():
-            self.refreshTime = time.time() + self.refreshDelay  # set next refresh time
-            # If there is text available to read from xboxdrv, then read it.
-            readable, writeable, exception = select.select([self.pipe], [], [], 0)
-            if readable:
-                # Read every line that is availabe.  We only need to decode the last one.
-                while readable:
-                    response = self.pipe.readline()
-                    # A zero length response means controller has been unplugged.
-                    if len(response) == 0:
-                        raise IOError('Xbox controller disconnected from USB')
-                    readable, writeable, exception = select.select([self.pipe], [], [], 0)
-                # Valid controller response will be 140 chars.
-                if len(response) == 140:
-                    self.connectStatus = True
-                    self.reading = response
-                else:  # Any other response means we have lost wireless or controller battery
-                    self.connectStatus = False
+        """Return the latest snapshot. Raise the error of the reader thread if the controller has been unplugged."""
+        if self.error is not None:
+            raise self.error
+        return self.state
 
     """Return a status of True, when the controller is actively connected.
     Either loss of wireless signal or controller powering off will break connection.  The
@@ -115,32 +90,23 @@ class Joystick:
     """
 
     def connected(self):
-        self.refresh()
-        return self.connectStatus
+        return self.refresh().connected
 
     # Left stick X axis value scaled between -1.0 (left) and 1.0 (right) with deadzone tolerance correction
     def leftX(self, deadzone=4000):
-        self.refresh()
-        raw = int(self.reading[3:9])
-        return self.axisScale(raw, deadzone)
+        return self.axisScale(self.refresh().left_x, deadzone)
 
     # Left stick Y axis value scaled between -1.0 (down) and 1.0 (up)
     def leftY(self, deadzone=4000):
-        self.refresh()
-        raw = int(self.reading[13:19])
-        return self.axisScale(raw, deadzone)
+        return self.axisScale(self.refresh().left_y, deadzone)
 
     # Right stick X axis value scaled between -1.0 (left) and 1.0 (right)
     def rightX(self, deadzone=4000):
-        self.refresh()
-        raw = int(self.reading[24:30])
-        return self.axisScale(raw, deadzone)
+        return self.axisScale(self.refresh().right_x, deadzone)
 
     # Right stick Y axis value scaled between -1.0 (down) and 1.0 (up)
     def rightY(self, deadzone=4000):
-        self.refresh()
-        raw = int(self.reading[34:40])
-        return self.axisScale(raw, deadzone)
+        return self.axisScale(self.refresh().right_y, deadzone)
 
     # Scale raw (-32768 to +32767) axis with deadzone correcion
     # Deadzone is +/- range of values to consider to be center stick (ie. 0.0)
@@ -156,103 +122,154 @@ class Joystick:
 
     # Dpad Up status - returns 1 (pressed) or 0 (not pressed)
     def dpadUp(self):
-        self.refresh()
-        return int(self.reading[45:46])
+        return self.refresh().buttons[DPAD_UP]
 
     # Dpad Down status - returns 1 (pressed) or 0 (not pressed)
     def dpadDown(self):
-        self.refresh()
-        return int(self.reading[50:51])
+        return self.refresh().buttons[DPAD_DOWN]
 
     # Dpad Left status - returns 1 (pressed) or 0 (not pressed)
     def dpadLeft(self):
-        self.refresh()
-        return int(self.reading[55:56])
+        return self.refresh().buttons[DPAD_LEFT]
 
     # Dpad Right status - returns 1 (pressed) or 0 (not pressed)
     def dpadRight(self):
-        self.refresh()
-        return int(self.reading[60:61])
+        return self.refresh().buttons[DPAD_RIGHT]
 
     # Back button status - returns 1 (pressed) or 0 (not pressed)
     def Back(self):
-        self.refresh()
-        return int(self.reading[68:69])
+        return self.refresh().buttons[BACK]
 
     # Guide button status - returns 1 (pressed) or 0 (not pressed)
     def Guide(self):
-        self.refresh()
-        return int(self.reading[76:77])
+        return self.refresh().buttons[GUIDE]
 
     # Start button status - returns 1 (pressed) or 0 (not pressed)
     def Start(self):
-        self.refresh()
-        return int(self.reading[84:85])
+        return self.refresh().buttons[START]
 
     # Left Thumbstick button status - returns 1 (pressed) or 0 (not pressed)
     def leftThumbstick(self):
-        self.refresh()
-        return int(self.reading[90:91])
+        return self.refresh().buttons[LEFT_THUMBSTICK]
 
     # Right Thumbstick button status - returns 1 (pressed) or 0 (not pressed)
     def rightThumbstick(self):
-        self.refresh()
-        return int(self.reading[95:96])
+        return self.refresh().buttons[RIGHT_THUMBSTICK]
 
     # A button status - returns 1 (pressed) or 0 (not pressed)
     def A(self):
-        self.refresh()
-        return int(self.reading[100:101])
+        return self.refresh().buttons[BUTTON_A]
 
     # B button status - returns 1 (pressed) or 0 (not pressed)
     def B(self):
-        self.refresh()
-        return int(self.reading[104:105])
+        return self.refresh().buttons[BUTTON_B]
 
     # X button status - returns 1 (pressed) or 0 (not pressed)
     def X(self):
-        self.refresh()
-        return int(self.reading[108:109])
+        return self.refresh().buttons[BUTTON_X]
 
     # Y button status - returns 1 (pressed) or 0 (not pressed)
     def Y(self):
-        self.refresh()
-        return int(self.reading[112:113])
+        return self.refresh().buttons[BUTTON_Y]
 
     # Left Bumper button status - returns 1 (pressed) or 0 (not pressed)
     def leftBumper(self):
-        self.refresh()
-        return int(self.reading[118:119])
+        return self.refresh().buttons[LEFT_BUMPER]
 
     # Right Bumper button status - returns 1 (pressed) or 0 (not pressed)
     def rightBumper(self):
-        self.refresh()
-        return int(self.reading[123:124])
+        return self.refresh().buttons[RIGHT_BUMPER]
 
     # Left Trigger value scaled between 0.0 to 1.0
     def leftTrigger(self):
-        self.refresh()
-        return int(self.reading[129:132]) / 255.0
+        return self.refresh().left_trigger / 255.0
 
     # Right trigger value scaled between 0.0 to 1.0
     def rightTrigger(self):
-        self.refresh()
-        return int(self.reading[136:139]) / 255.0
+        return self.refresh().right_trigger / 255.0
 
     # Returns tuple containing X and Y axis values for Left stick scaled between -1.0 to 1.0
     # Usage:
     #     x,y = joy.leftStick()
     def leftStick(self, deadzone=4000):
-        self.refresh()
-        return self.leftX(deadzone), self.leftY(deadzone)
+        state = self.refresh()
+        return self.axisScale(state.left_x, deadzone), self.axisScale(state.left_y, deadzone)
 
     # Returns tuple containing X and Y axis values for Right stick scaled between -1.0 to 1.0
     # Usage:
     #     x,y = joy.rightStick()
     def rightStick(self, deadzone=4000):
-        self.refresh()
-        return self.rightX(deadzone), self.rightY(deadzone)
+        state = self.refresh()
+        return self.axisScale(state.right_x, deadzone), self.axisScale(state.right_y, deadzone)
+
+    # Time since the last event was read from the device, in second
+    def inputAge(self):
+        return time.time() - self.state.timestamp
+
+    def close(self):
+        self.stopped = True
+
+
+# noinspection PyPep8Naming
+class Joystick(Gamepad):
+    """Initializes the joystick/wireless receiver, launching 'xboxdrv' as a subprocess
+    and checking that the wired joystick or wireless receiver is attached.
+    A background thread reads every event from xboxdrv and parses it once into an immutable JoystickState snapshot:
+    the Joystick methods only read the latest snapshot, they never wait on the xboxdrv pipe.
+    'state.timestamp' is the time the last event was read, to measure the input to actuation latency.
+
+    Usage:
+        joy = xbox.Joystick()
+    """
+
+    def __init__(self, refreshRate=30):
+        """:param refreshRate: [int] Not used anymore, events are read by the reader thread. Kept for compatibility"""
+        self.proc = subprocess.Popen(['xboxdrv', '--no-uinput', '--detach-kernel-driver'], stdout=subprocess.PIPE,
+                                     bufsize=0)
+        self.pipe = self.proc.stdout
+        super().__init__()
+        # Read responses from 'xboxdrv' for upto 2 seconds, looking for controller/receiver to respond
+        found = False
+        waitTime = time.time() + 2
+        while waitTime > time.time() and not found:
+            readable, writeable, exception = select.select([self.pipe], [], [], 0)
+            if readable:
+                response = self.pipe.readline()
+                # Hard fail if we see this, so force an error
+                if response[0:7] == b'No Xbox':
+                    raise IOError('No Xbox controller/receiver found')
+                # Success if we see the following
+                if response[0:12].lower() == b'press ctrl-c':
+                    found = True
+                # If we see 140 char line, we are seeing valid input
+                if len(response) == XBOXDRV_LINE_LENGTH:
+                    found = True
+                    self.state = parse_reading(response, time.time())
+        # if the controller wasn't found, then halt
+        if not found:
+            self.close()
+            raise IOError('Unable to detect Xbox controller/receiver - Run python as sudo')
+        Thread(target=self._read_events, daemon=True).start()
+
+    def _read_events(self):
+        """Reader thread: parse each xboxdrv line into a new snapshot. Any line but a 140 chars one means the
+        wireless signal or the controller battery has been lost."""
+        while not self.stopped:
+            response = self.pipe.readline()
+            now = time.time()
+            # A zero length response means controller has been unplugged.
+            if len(response) == 0:
+                if not self.stopped:
+                    self.error = IOError('Xbox controller disconnected from USB')
+                    self.state = self.state._replace(timestamp=now, connected=False)
+                return
+            if len(response) == XBOXDRV_LINE_LENGTH:
+                self.state = parse_reading(response, now)
+            else:
+                self.state = self.state._replace(timestamp=now, connected=False)
+            self.nb_event += 1
 
     # Cleanup by ending the xboxdrv subprocess
     def close(self):
+        super().close()
         self.proc.kill()
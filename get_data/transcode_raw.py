@@ -0,0 +1,43 @@
+import argparse
+from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).absolute().parents[1]))
+from utils.raw_frame_store import transcode_raw_store, RAW_SUFFIX
+from utils import logger
+
+log = logger.Logger().create(logger_name=Path(__file__).name)
+
+
+def _get_args(description):
+    parser = argparse.ArgumentParser(description=description,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", type=str,
+                        help="Path to a raw frame store (.raw file) or to a folder holding one or more of them")
+    parser.add_argument("-w", "--nb_workers", type=int, default=4,
+                        help="Number of threads encoding the pictures.")
+    parser.add_argument("-k", "--keep", action="store_true",
+                        help="Keep the raw frame stores once the pictures are written.")
+    parser.add_argument("-f", "--force", action="store_true",
+                        help="Encode the pictures that already exist again.")
+    return parser.parse_args()
+
+
+def transcode_raw():
+    """
+    Write the JPEG pictures of the raw frame stores recorded with the 'raw' storage (see run_manual.py), next to their
+    labels file, so that they can be uploaded with upload_data.py.
+    """
+    args = _get_args(transcode_raw.__doc__)
+    path = Path(args.path)
+    l_raw_file = sorted(path.glob(f'*{RAW_SUFFIX}')) if path.is_dir() else [path]
+    if not l_raw_file:
+        log.error(f'No raw frame store found in "{path}".')
+    for raw_file in l_raw_file:
+        nb_written = transcode_raw_store(raw_file, nb_workers=args.nb_workers, remove=not args.keep,
+                                         overwrite=args.force)
+        log.info(f'{nb_written} picture(s) written from "{raw_file}".')
+
+
+if __name__ == "__main__":
+    transcode_raw()
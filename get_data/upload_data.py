@@ -5,6 +5,7 @@ import sys
 sys.path.append(str(Path(__file__).absolute().parents[1]))
 from get_data.src import upload_to_db as upload
 from get_data.src import update_db
+from get_data.src import es_utils
 from conf.cluster_conf import ES_HOST_PORT, ES_HOST_IP, ES_INDEX, LOG_INDEX, BUCKET_NAME
 from utils import logger
 
@@ -28,6 +29,10 @@ def _get_args(description):
     parser.add_argument("-e", "--es_only", action="store_true",
                         help="Only upload labels to Elasticsearch cluster and doesn't upload pictures to S3."
                              "However, picture in S3 will still be removed based on instruction from the label_file.")
+    parser.add_argument("-t", "--es_threads", type=int, default=es_utils.BULK_NB_THREADS,
+                        help="Number of bulk requests sent in parallel to Elasticsearch.")
+    parser.add_argument("-c", "--chunk_size", type=int, default=es_utils.BULK_CHUNK_SIZE,
+                        help="Maximum number of labels per bulk request to Elasticsearch.")
     return parser.parse_args()
 
 
@@ -50,7 +55,8 @@ def upload_data():
     key_prefix = args.key
     update_db.delete_picture_and_label(label_file, es_index=args.index, bucket=bucket_name)
     upload.upload_to_db(label_file, ES_HOST_IP, ES_HOST_PORT, args.index,
-                        bucket_name=bucket_name, overwrite=args.force, key_prefix=key_prefix)
+                        bucket_name=bucket_name, overwrite=args.force, key_prefix=key_prefix,
+                        es_threads=args.es_threads, es_chunk_size=args.chunk_size)
     log.debug("Execution completed.")
     log.debug("Uploading log...")
     logger.Logger().upload_log(index=LOG_INDEX, es_host_ip=ES_HOST_IP, es_host_port=ES_HOST_PORT)
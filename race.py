@@ -1,64 +1,138 @@
 import argparse
-from collections import deque
 import numpy as np
 from queue import Queue
-from threading import Thread
+from threading import Lock, Thread
 import time
 from datetime import datetime
 from pathlib import Path
-import json
 
-import Adafruit_PCA9685
-# noinspection PyUnresolvedReferences
-from PIL import Image
-import tensorflow as tf
-from tensorflow.keras.models import load_model
-
-from utils.pivideostream import PiVideoStream
+from utils.latest_value import LatestValue
+from utils.frame_ring import get_input_batch, BATCH_MODE_LIST, SINGLE_FRAME
+from utils.preprocessing import PIXEL_SCALE
+from utils.inference_backend import get_backend, BACKEND_LIST
+from utils.smoothing import get_smoother, SMOOTHING_LIST, NO_SMOOTHING
+from utils.stage_timer import StageTimer
+from utils.actuator import Actuator, DIRECTION_CHANNEL, SPEED_CHANNEL, HEAD_CHANNEL
+from utils import devices
 from conf.const import HEAD_UP, HEAD_DOWN
-from conf.path import DEFAULT_OUTPUT_DIRECTORY
+from conf.path import DEFAULT_OUTPUT_DIRECTORY, LOG_DIRECTORY
 from utils import car_mapping as cm
-from get_data.src import init_picture_folder as init
-from get_data.src import label_handler as lh
-from get_data.src import utils_fct
+
+# Heavy or hardware dependent packages (tensorflow, picamera, Adafruit, PIL, get_data which loads boto3...) are imported
+# where they are used, so that the model loading and the camera warm up can start as soon as possible.
 
 
 def get_args():
     parser = argparse.ArgumentParser()
     parser.add_argument("model_path", type=str,
                         help="Provide the model path.\n")
+    parser.add_argument("-b", "--backend", type=str, default=None, choices=BACKEND_LIST,
+                        help="Inference backend. By default, 'tflite' for a .tflite model and 'keras' otherwise.")
+    parser.add_argument("-t", "--num_threads", type=int, default=None,
+                        help="Number of threads used by the tflite interpreter.")
     parser.add_argument("-o", "--output_dir", type=str, default=DEFAULT_OUTPUT_DIRECTORY,
                         help=f"Directory where to save pictures. Default is '{DEFAULT_OUTPUT_DIRECTORY}''")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Run camera, inference and actuation as concurrent stages.")
+    parser.add_argument("--allow_duplicate", action="store_true",
+                        help="Predict on the latest frame even if it was already used by the previous prediction.")
+    parser.add_argument("--frame_ring", type=int, default=0,
+                        help="Capture frames into a ring of FRAME_RING preallocated arrays (0 to disable).")
+    parser.add_argument("--pwm_refresh", type=float, default=1.0,
+                        help="PWM channels are written only when their value changes, or when their last write is "
+                             "older than PWM_REFRESH seconds. Negative to never refresh.")
+    parser.add_argument("--pwm_batch_write", action="store_true",
+                        help="Write the 3 PWM channels in a single I2C block write.")
+    parser.add_argument("--batch_mode", type=str, default=SINGLE_FRAME, choices=BATCH_MODE_LIST,
+                        help="Predict on the latest frame only, on a batch of the most recent frames or on a batch of "
+                             "crops of the latest frame. Outputs of the batch are averaged.")
+    parser.add_argument("--batch_size", type=int, default=3,
+                        help="Number of frames or crops of a batch. Ignored in 'single' batch mode.")
+    parser.add_argument("-s", "--smoothing", type=str, default=NO_SMOOTHING, choices=SMOOTHING_LIST,
+                        help="Temporal smoothing of the model outputs before the argmax.")
+    parser.add_argument("--smoothing_param", type=float, default=None,
+                        help="EMA alpha (default 0.5) or window size (default 3).")
+    parser.add_argument("--simulated", action="store_true",
+                        help="Race with a simulated camera (synthetic frames) and PWM driver (see utils.simulators), "
+                             "to profile the race loop without the car.")
+    parser.add_argument("--model_rescaling", action="store_true",
+                        help="The model normalizes its input itself (trained with multi_output_train.py --rescaling).")
+    parser.add_argument("--raw_frames", action="store_true",
+                        help="Debug mode: store the raw frames instead of JPEG pictures (to be encoded on the desktop "
+                             "with get_data/transcode_raw.py).")
     return parser.parse_args()
 
 
+RACE_STAGES = ["acquisition", "normalization", "inference", "mapping", "pwm", "debug", "frame_to_pwm"]
+
+
 class RaceOn:
-    def __init__(self, model_path):
+    def __init__(self, model_path, frame_ring=0, backend=None, num_threads=None, video_stream=None, pwm=None,
+                 batch_mode=SINGLE_FRAME, batch_size=1, smoothing=NO_SMOOTHING, smoothing_param=None,
+                 pwm_refresh=1.0, pwm_batch_write=False, raw_frames=False, model_rescaling=False):
+        """
+        Prediction mode parameters are described in 'set_prediction_mode'.
+        :param pwm_refresh:     [float]     Max time in second before an unchanged PWM channel is written again. None
+                                            to write channels only on change
+        :param pwm_batch_write: [bool]      Write the PWM channels in a single I2C block write
+        :param video_stream:    [object]    Started frame source to use instead of the camera (see utils.replay)
+        :param pwm:             [object]    PWM driver to use instead of the PCA9685 (see utils.replay)
+        :param raw_frames:      [bool]      Debug mode: store the raw frames instead of JPEG pictures
+        :param model_rescaling: [bool]      The model normalizes its input itself (utils.preprocessing rescaling layer):
+                                            it is fed with the pixel values
+        """
         # Load configuration
         self.car_mapping = cm.CarMapping()
         self.dir_center_label = round(len(self.car_mapping.label_to_raw_dir_mapping) / 2)
 
-        # Init label for debug mode
+        # Init label and background picture writer for debug mode
         self.meta_label = None
-        self.l_label = {}
+        self.frame_writer = None
+        self.raw_frames = raw_frames
+        self.input_scale = 1.0 if model_rescaling else PIXEL_SCALE
 
         # Racing_status
         self.racing = False
         self.pause = False
-
-        # Load model
-        self.model = load_model(model_path)
+        # Pipeline mode: the frame counters are updated by the inference thread and reset by the actuation thread
+        self.counter_lock = Lock()
+
+        # Startup duration of each phase, in second. Camera init runs concurrently with the model loading.
+        self.startup_time = {}
+        startup_start = time.perf_counter()
+
+        # Create a *threaded *video stream in background, its init lets the camera sensor warm_up
+        self.video_stream = video_stream
+        camera_thread = Thread(target=self._init_video_stream, args=(frame_ring,))
+        if video_stream is None:
+            camera_thread.start()
+
+        # Load model and run a first inference so that the first prediction of the race doesn't pay the tracing cost
+        phase_start = time.perf_counter()
+        self.backend = get_backend(model_path, backend=backend, num_threads=num_threads)
+        self.startup_time["model loading"] = time.perf_counter() - phase_start
+        phase_start = time.perf_counter()
+        self.set_prediction_mode(batch_mode, batch_size, smoothing, smoothing_param)
+        self.startup_time["model warm up"] = time.perf_counter() - phase_start
 
         # Init engines
-        self.pwm = Adafruit_PCA9685.PCA9685()
+        phase_start = time.perf_counter()
+        if pwm is None:
+            pwm = devices.get_pwm_driver()
+        self.pwm = Actuator(pwm, refresh_period=pwm_refresh, batch_write=pwm_batch_write)
         self.pwm.set_pwm_freq(50)
-
-        # Create a *threaded *video stream, allow the camera sensor to warm_up
-        self.video_stream = PiVideoStream().start()
-        time.sleep(2)
-        # self.video_stream.test()
-        self.frame = self.video_stream.read()
-        self.buffer = None
+        self.startup_time["pwm init"] = time.perf_counter() - phase_start
+
+        # Wait for the camera and its first frame
+        phase_start = time.perf_counter()
+        if video_stream is None:
+            camera_thread.join()
+        if self.video_stream is None:
+            raise RuntimeError("Camera initialization failed.")
+        self.video_stream.read_new(timeout=2, last_seq=0)
+        self.startup_time["first frame wait"] = time.perf_counter() - phase_start
+        self.frame_seq, self.frame_time, self.frame = self.video_stream.read_stamped()
+        self.startup_time["total"] = time.perf_counter() - startup_start
 
         # Debug and print
         self.start_time = 0
@@ -66,9 +140,52 @@ class RaceOn:
         self.nb_pred = 0
         self.sampling = 0
         self.debug = 0
+        self.nb_dropped = 0
+        self.nb_duplicate = 0
+
+        # Pipeline mode: stale commands dropped by the actuation stage
+        self.nb_stale = 0
 
+        # If not None, (frame sequence number, predicted labels) of every prediction are appended to it
+        self.prediction_log = None
+
+        # Latency histograms of each stage of the race loop, and of the whole frame capture to PWM write
+        self.stage_timer = StageTimer(RACE_STAGES)
+
+        self._print_startup_info()
         print("RaceOn initialized")
 
+    def _init_video_stream(self, frame_ring):
+        phase_start = time.perf_counter()
+        self.video_stream = devices.get_camera(frame_ring=frame_ring)
+        self.startup_time["camera init"] = time.perf_counter() - phase_start
+
+    def set_prediction_mode(self, batch_mode=SINGLE_FRAME, batch_size=1, smoothing=NO_SMOOTHING, smoothing_param=None):
+        """
+        Set how predictions are made, and run a first inference with the new input batch.
+        :param batch_mode:      [str]       One of BATCH_MODE_LIST: predict on the latest frame, on the 'batch_size'
+                                            most recent frames or on 'batch_size' crops of the latest frame. Outputs of
+                                            the batch are averaged.
+        :param batch_size:      [int]       Number of frames or crops of a batch
+        :param smoothing:       [str]       One of SMOOTHING_LIST, temporal smoothing of the outputs before the argmax
+        :param smoothing_param: [float]     EMA alpha or window size
+        """
+        self.prediction_mode = {"batch_mode": batch_mode, "batch_size": batch_size if batch_mode != SINGLE_FRAME else 1,
+                                "smoothing": smoothing, "smoothing_param": smoothing_param}
+        self.input_batch = get_input_batch(batch_mode, batch_size, scale=self.input_scale)
+        self.smoother = get_smoother(smoothing, smoothing_param)
+        self.backend.predict(self.input_batch.array)
+
+    @property
+    def decision_lag(self):
+        """Mean age of the frames a decision is based on, in number of frames (0 without batching nor smoothing)."""
+        return self.input_batch.lag + self.smoother.lag
+
+    def _print_startup_info(self):
+        print("Startup time (camera init runs concurrently with the model):")
+        for phase, duration in self.startup_time.items():
+            print(f'  {phase:<20} {duration:6.2f}s')
+
     def _get_motor_direction(self, predicted_labels):
         return self.car_mapping.get_raw_dir_from_label(predicted_labels[0])
 
@@ -83,101 +200,255 @@ class RaceOn:
             return HEAD_UP
         return HEAD_DOWN
 
-    @tf.function
-    def _graph_predict(self, image):
-        return self.model(image)
+    def _count_frame(self, frame_seq):
+        """Update the dropped / duplicate frame counters with the sequence number of the frame used for prediction."""
+        if frame_seq == self.frame_seq:
+            self.nb_duplicate += 1
+        elif self.frame_seq > 0:
+            self.nb_dropped += frame_seq - self.frame_seq - 1
+        self.frame_seq = frame_seq
+
+    def _grab_frame(self, fresh_only=True, timeout=0.1):
+        """
+        Grab the latest frame from the threaded video stream into self.frame.
+        :param fresh_only:  [bool]      If True, wait for a frame that was not already used for a prediction
+        :param timeout:     [float]     Max time to wait for a new frame, in second
+        :return:            [bool]      False if no new frame came in time
+        """
+        start = time.perf_counter()
+        if fresh_only:
+            stamped = self.video_stream.read_new(timeout=timeout, last_seq=self.frame_seq)
+            if stamped is None:
+                return False
+        else:
+            stamped = self.video_stream.read_stamped()
+        frame_seq, self.frame_time, self.frame = stamped
+        self._count_frame(frame_seq)
+        self.stage_timer.add("acquisition", time.perf_counter() - start)
+        return True
+
+    def _wait_next_frame(self, timeout=0.1):
+        """Paused: wait for the next frame of the video stream, so that the race loop doesn't spin on the last one."""
+        self.video_stream.read_new(timeout=timeout, last_seq=self.video_stream.frame_seq)
 
     def _get_predictions(self, motor_speed):
-        # Grab the self.frame from the threaded video stream
-        self.frame = self.video_stream.read()
-        image = tf.convert_to_tensor(np.array([self.frame]) / 255.0)  # [jj] Do we need to create a new array ? img = self.frame / 255. ?
+        return self._predict(self.frame)
+
+    def _predict(self, frame):
+        start = time.perf_counter()
+        image = self.input_batch.load(frame)
+        normalized = time.perf_counter()
 
-        # Get model prediction
-        predictions_raw = self._graph_predict(image)
-        predicted_labels = [int(np.argmax(pred)) for pred in predictions_raw]
+        # Get model prediction, averaged over the batch and smoothed over time
+        predictions_raw = self.backend.predict(image)
+        inferred = time.perf_counter()
+        probabilities = self.smoother.update([pred.mean(axis=0) for pred in predictions_raw])
+        predicted_labels = [int(np.argmax(proba)) for proba in probabilities]
 
         motor_direction = self._get_motor_direction(predicted_labels)
         motor_head = self._get_motor_head(predicted_labels)
         motor_speed = self._get_motor_speed(predicted_labels)
+        self.stage_timer.add("normalization", normalized - start)
+        self.stage_timer.add("inference", inferred - normalized)
+        self.stage_timer.add("mapping", time.perf_counter() - inferred)
         return predicted_labels, motor_direction, motor_head, motor_speed
 
     def _check_debug_mode(self, predicted_labels, motor_direction, motor_head, motor_speed):
+        start = time.perf_counter()
+        self._debug_bookkeeping(predicted_labels, motor_direction, motor_head, motor_speed)
+        self.stage_timer.add("debug", time.perf_counter() - start)
+
+    def _debug_bookkeeping(self, predicted_labels, motor_direction, motor_head, motor_speed):
         if self.debug > 0 and self.sampling > 1:
             self.sampling = 0
             t_stamp = datetime.now().strftime("%Y%m%dT%H-%M-%S-%f")
             picture_path = Path(self.meta_label.picture_dir) / f'{str(t_stamp)}.jpg'
-            self.meta_label.set_label(img_id=t_stamp,
-                                      file_name=picture_path.name,
-                                      timestamp=t_stamp,
-                                      raw_direction=motor_direction,
-                                      raw_speed=motor_speed,
-                                      label_direction=predicted_labels[0],
-                                      label_speed=predicted_labels[1])
-            self.meta_label["car_setting"]["camera"]["camera_position"] = motor_head
-            self.l_label[t_stamp] = self.meta_label.get_copy()
-            sample = {
-                "array": self.frame,
-                "picture_file": picture_path.as_posix()
-            }
-            self.buffer.append(sample)
+            record = self.meta_label.new_record(img_id=t_stamp,
+                                                file_name=picture_path.name,
+                                                timestamp=t_stamp,
+                                                raw_direction=motor_direction,
+                                                raw_speed=motor_speed,
+                                                label_direction=predicted_labels[0],
+                                                label_speed=predicted_labels[1],
+                                                camera_position=motor_head)
+            # frame is copied since it might be a view on the camera frame ring
+            self.frame_writer.put(self.frame.copy(), picture_path.as_posix(), t_stamp, record)
             if self.debug > 1:
                 print("Predictions = {}, Direction = {}, Head = {}, Speed = {}".format(
                     predicted_labels, motor_direction, motor_head, motor_speed))
 
-    def _run_engine(self, motor_direction, motor_speed, motor_head):
-        self.pwm.set_pwm(0, 0, motor_direction)
-        self.pwm.set_pwm(1, 0, motor_speed)
-        self.pwm.set_pwm(2, 0, motor_head)
+    def _run_engine(self, motor_direction, motor_speed, motor_head, frame_time=None):
+        start = time.perf_counter()
+        self.pwm.set_channels([(DIRECTION_CHANNEL, motor_direction), (SPEED_CHANNEL, motor_speed),
+                               (HEAD_CHANNEL, motor_head)])
+        self.stage_timer.add("pwm", time.perf_counter() - start)
+        if frame_time is not None:
+            self.stage_timer.add("frame_to_pwm", time.time() - frame_time)
 
     def _treat_user_input(self, user_inp):
         if user_inp == 'q':
             self.elapsed_time += (time.time() - self.start_time)
             self.stop()
         elif user_inp == 'p':
-            self.pwm.set_pwm(1, 0, 0)
-            if self.pause is False:
-                self.elapsed_time += (time.time() - self.start_time)
-                self._print_info()
-                self.elapsed_time, self.nb_pred = 0, 0
-            else:
-                print("Already paused.")
-            self.pause = True
+            self.pwm.set_pwm(SPEED_CHANNEL, 0, 0)
+            with self.counter_lock:
+                if self.pause is False:
+                    # set first: the inference stage doesn't count any frame once it sees the pause
+                    self.pause = True
+                    self.elapsed_time += (time.time() - self.start_time)
+                    self._print_info()
+                    self.elapsed_time, self.nb_pred = 0, 0
+                    self.nb_dropped, self.nb_duplicate = 0, 0
+                    self.frame_seq = 0  # frames captured during the pause are not counted as dropped
+                else:
+                    print("Already paused.")
         elif user_inp == 'go':
             if self.pause is True:
                 self.start_time = time.time()
+                # decisions after the pause are not smoothed with the frames before it
+                self.input_batch.reset()
+                self.smoother.reset()
             else:
                 print("Already on the go.")
             self.pause = False
 
-    def race(self, debug=0, buff_size=100, queue_input=None, picture_dir=None):
-        self.buffer = deque(maxlen=buff_size)
+    def race(self, debug=0, buff_size=100, queue_input=None, picture_dir=None, fresh_only=True):
         self.start_time = time.time()
         self.racing = True
         self.nb_pred = 0
+        self.nb_dropped, self.nb_duplicate = 0, 0
         self.sampling = 0
         self.debug = debug
         motor_speed = self.car_mapping.get_raw_speed_from_label(0)
         if debug > 0:
-            self.meta_label = lh.Label(picture_dir=picture_dir)
+            self._start_frame_writer(picture_dir, buff_size)
 
         while self.racing:
-            if not self.pause:
+            if not self.pause and self._grab_frame(fresh_only=fresh_only):
                 # Decide action and run motor
                 predicted_labels, motor_direction, motor_head, motor_speed = self._get_predictions(motor_speed)
-                self._run_engine(motor_direction, motor_speed, motor_head)
-                self._check_debug_mode(predicted_labels, motor_direction, motor_speed, motor_head)
+                if self.prediction_log is not None:
+                    self.prediction_log.append((self.frame_seq, predicted_labels))
+                self._run_engine(motor_direction, motor_speed, motor_head, frame_time=self.frame_time)
+                self._check_debug_mode(predicted_labels, motor_direction, motor_head, motor_speed)
                 self.nb_pred += 1
                 self.sampling += 1
+            elif self.pause:
+                self._wait_next_frame()
             if not queue_input.empty():
                 self._treat_user_input(queue_input.get(block=False))
 
-    def stop(self):
+    def _inference_stage(self, command_slot):
+        """
+        Run the model on each new frame of the video stream (the camera stage) and publish the resulting command.
+        Never waits on the actuation.
+        """
+        while self.racing:
+            if self.pause:
+                self._wait_next_frame()
+                continue
+            start = time.perf_counter()
+            stamped = self.video_stream.read_new(timeout=0.1, last_seq=self.frame_seq)
+            if stamped is None or self.pause:
+                continue
+            frame_seq, t_capture, frame = stamped
+            self.stage_timer.add("acquisition", time.perf_counter() - start)
+            predicted_labels, motor_direction, motor_head, motor_speed = self._predict(frame)
+            with self.counter_lock:
+                if self.pause:
+                    continue  # paused during the prediction: the counters were reset and the command is not used
+                self._count_frame(frame_seq)
+                self.nb_pred += 1
+            if self.prediction_log is not None:
+                self.prediction_log.append((frame_seq, predicted_labels))
+            command_slot.put({
+                "t_capture": t_capture,
+                "t_inferred": time.time(),
+                "frame": frame,
+                "predicted_labels": predicted_labels,
+                "motor_direction": motor_direction,
+                "motor_head": motor_head,
+                "motor_speed": motor_speed
+            })
+        command_slot.close()
+
+    def _actuation_stage(self, command_slot, queue_input):
+        """Write the latest command to the engines. A command older than one inference period is dropped."""
+        version = 0
+        last_inferred = None
+        inference_period = None
+        while self.racing:
+            version, command = command_slot.get(last_version=version, timeout=0.01)
+            if command is not None and not self.pause:
+                if last_inferred is not None:
+                    period = command["t_inferred"] - last_inferred
+                    inference_period = period if inference_period is None else 0.9 * inference_period + 0.1 * period
+                last_inferred = command["t_inferred"]
+                if inference_period is not None and time.time() - command["t_inferred"] > inference_period:
+                    self.nb_stale += 1
+                else:
+                    self._run_engine(command["motor_direction"], command["motor_speed"], command["motor_head"],
+                                     frame_time=command["t_capture"])
+                    self.frame = command["frame"]
+                    self._check_debug_mode(command["predicted_labels"], command["motor_direction"],
+                                           command["motor_head"], command["motor_speed"])
+                    self.sampling += 1
+            if not queue_input.empty():
+                self._treat_user_input(queue_input.get(block=False))
+
+    def race_pipeline(self, debug=0, buff_size=100, queue_input=None, picture_dir=None):
+        """
+        Same as 'race' but the camera, the inference and the actuation run as concurrent stages connected by
+        single slot handoffs (the video stream itself for the frames): inference never waits on the I2C writes and the
+        debug bookkeeping.
+        """
+        self.start_time = time.time()
+        self.racing = True
+        self.nb_pred = 0
+        self.sampling = 0
+        self.debug = debug
+        self.nb_stale = 0
+        self.nb_dropped, self.nb_duplicate = 0, 0
+        if debug > 0:
+            self._start_frame_writer(picture_dir, buff_size)
+
+        command_slot = LatestValue()
+        inference_thread = Thread(target=self._inference_stage, args=(command_slot,))
+        inference_thread.start()
+        self._actuation_stage(command_slot, queue_input)
+        inference_thread.join()
+
+    def _start_frame_writer(self, picture_dir, queue_size):
+        """Debug mode: pictures and labels are written by a background thread, fed through a queue of queue_size."""
+        from get_data.src import label_handler as lh
+        from get_data.src import utils_fct
+        from utils.frame_writer import FrameWriter, JPEG, RAW
+        self.meta_label = lh.Label(picture_dir=picture_dir)
+        label_file = utils_fct.get_label_file_name(picture_dir)
+        self.frame_writer = FrameWriter(label_file, max_queue_size=queue_size, label_session=self.meta_label,
+                                        storage=RAW if self.raw_frames else JPEG).start()
+        print(f'Debug pictures will be saved to "{picture_dir}" and labels to "{label_file}"')
+
+    def print_stats(self):
+        print(f'Race loop latency per stage (since start):\n{self.stage_timer}')
+
+    def stop(self, save_stats=True, settle_time=2.0):
+        """
+        :param save_stats:      [bool]      Save the latency statistics to a race_stats json file in the log directory
+        :param settle_time:     [float]     Wait in second before the engines are stopped
+        """
         self.racing = False
         self._print_info()
-        time.sleep(2)  # TODO check without
-        self.pwm.set_pwm(0, 0, 0)
-        self.pwm.set_pwm(1, 0, 0)
-        self.pwm.set_pwm(2, 0, 0)
+        if save_stats:
+            stats_file = Path(LOG_DIRECTORY) / f'race_stats_{datetime.now().strftime("%Y%m%dT%H-%M-%S-%f")}.json'
+            self.stage_timer.dump(stats_file)
+            print(f'Latency statistics saved to "{stats_file}"')
+        if self.frame_writer is not None:
+            print("Writing remaining debug pictures...")
+            self.frame_writer.stop()
+            self._print_frame_writer_info()
+        time.sleep(settle_time)  # TODO check without
+        self.pwm.stop_channels([DIRECTION_CHANNEL, SPEED_CHANNEL, HEAD_CHANNEL])
         self.video_stream.stop()
         print("Stopped properly")
 
@@ -186,29 +457,33 @@ class RaceOn:
         if self.elapsed_time > 0:
             pred_rate = self.nb_pred / float(self.elapsed_time)
             print(f'{self.nb_pred} prediction in {self.elapsed_time}s -> {pred_rate} pred/s')
-        self._write_and_clear_buffer()
-
-    def _write_and_clear_buffer(self):
-        if self.buffer is not None and len(self.buffer) > 0:
-            print(f'Saving buffer pictures to : "{self.meta_label.picture_dir}"')
-            i = 0
-            for i, img in enumerate(self.buffer):
-                pic = Image.fromarray(img["array"], 'RGB')
-                pic.save(img["picture_file"])
-            print(f'{i + 1} pictures saved.')
-            output_label = utils_fct.get_label_file_name(self.meta_label.picture_dir)
-            with output_label.open(mode='w', encoding='utf-8') as fp:
-                json.dump(self.l_label, fp, indent=4)
-            print(f'Labels saved to "{output_label}"')
-            self.buffer.clear()
-
-
-def get_input_queue(out_q):
+            print(f'{self.nb_dropped} frame(s) dropped ; {self.nb_duplicate} frame(s) predicted twice')
+        frame_to_pwm = self.stage_timer["frame_to_pwm"].to_dict()
+        if frame_to_pwm["count"] > 0:
+            print(f'Frame to PWM latency: mean={frame_to_pwm["mean_ms"]:.1f}ms p95={frame_to_pwm["p95_ms"]:.1f}ms '
+                  f'max={frame_to_pwm["max_ms"]:.1f}ms ; {self.nb_stale} stale command(s) dropped')
+        print(f'PWM: {self.pwm.nb_write} channel write(s), {self.pwm.nb_skipped} skipped (value unchanged)')
+        if self.frame_writer is not None:
+            self._print_frame_writer_info()
+            self.frame_writer.flush_labels()
+
+    def _print_frame_writer_info(self):
+        writer = self.frame_writer
+        print(f'Debug pictures: {writer.nb_queued} queued, {writer.nb_written} written, '
+              f'{writer.nb_dropped} dropped (queue full), {writer.nb_failed} failed')
+
+
+def get_input_queue(out_q, race_on=None):
     racing_prompt = """Press 'q' + enter to totally stop the race
     Press 'p' + enter to pause the race
-    Press 'go' + enter to resume race\n"""
+    Press 'go' + enter to resume race
+    Press 'stats' + enter to print the latency of each stage of the race loop\n"""
     while True:
         user_inp = input(racing_prompt)
+        if user_inp == 'stats' and race_on is not None:
+            # read directly from the input thread, the race loop is not interrupted
+            race_on.print_stats()
+            continue
         out_q.put(user_inp)
         if user_inp == 'q':
             break
@@ -226,7 +501,19 @@ if __name__ == '__main__':
     debug_mode_list = [1, 2]
     race_on = None
     try:
-        race_on = RaceOn(options.model_path)
+        d_device = {}
+        if options.simulated:
+            d_device = {'video_stream': devices.get_camera(devices.SIMULATED),
+                        'pwm': devices.get_pwm_driver(devices.SIMULATED)}
+        race_on = RaceOn(options.model_path, frame_ring=options.frame_ring, backend=options.backend,
+                         num_threads=options.num_threads, batch_mode=options.batch_mode,
+                         batch_size=options.batch_size, smoothing=options.smoothing,
+                         smoothing_param=options.smoothing_param,
+                         pwm_refresh=options.pwm_refresh if options.pwm_refresh >= 0 else None,
+                         pwm_batch_write=options.pwm_batch_write, raw_frames=options.raw_frames,
+                         model_rescaling=options.model_rescaling, **d_device)
+        race_function = race_on.race_pipeline if options.pipeline else race_on.race
+        race_kwargs = {} if options.pipeline else {'fresh_only': not options.allow_duplicate}
         q = Queue()
 
         starting_prompt = f"""Type 'go' to start.
@@ -237,20 +524,22 @@ if __name__ == '__main__':
             user_input = input(starting_prompt)
             if user_input == "go":
                 print("Race is on.")
-                input_thread = Thread(target=get_input_queue, args=(q,))
-                race_thread = Thread(target=race_on.race, kwargs={'debug': 0, 'queue_input': q})
+                input_thread = Thread(target=get_input_queue, args=(q, race_on))
+                race_thread = Thread(target=race_function, kwargs={'debug': 0, 'queue_input': q, **race_kwargs})
                 run_threads(input_thread, race_thread)
                 break
             elif user_input[:6] == "debug=":
+                from get_data.src import init_picture_folder as init
                 init.init_picture_folder(options.output_dir)
                 debug_lvl = int(user_input.split("=")[1])
                 if debug_lvl not in debug_mode_list:
                     print("'{}' is not a valid debug mode. Please choose between:{}".format(debug_lvl, debug_mode_list))
                 else:
                     print("Race is on in Debug mode level {}".format(debug_lvl))
-                    input_thread = Thread(target=get_input_queue, args=(q,))
-                    race_thread = Thread(target=race_on.race, kwargs={'debug': debug_lvl, 'queue_input': q,
-                                                                      'picture_dir': options.output_dir})
+                    input_thread = Thread(target=get_input_queue, args=(q, race_on))
+                    race_thread = Thread(target=race_function, kwargs={'debug': debug_lvl, 'queue_input': q,
+                                                                       'picture_dir': options.output_dir,
+                                                                       **race_kwargs})
                     run_threads(input_thread, race_thread)
                     break
             elif user_input == "q":
@@ -0,0 +1,218 @@
+import argparse
+import json
+import time
+from queue import Queue
+from threading import Thread
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from race import RaceOn
+from utils.inference_backend import BACKEND_LIST
+from utils.frame_ring import BATCH_MODE_LIST
+from utils.smoothing import SMOOTHING_LIST
+from utils.replay import load_session, ReplayVideoStream
+from utils.simulators import SimulatedPCA9685
+from utils.actuator import Actuator
+from conf.path import LOG_DIRECTORY
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Benchmark the race loop on a recorded session, without camera nor "
+                                                 "PCA9685: pred/s, latency of each stage and agreement of the "
+                                                 "predictions with the recorded labels.")
+    parser.add_argument("model_path", type=str,
+                        help="Provide the model path.")
+    parser.add_argument("session_path", type=str,
+                        help="Labels json file of the recorded pictures (pictures in the same folder), or directory "
+                             "holding labels*.json files and their pictures.")
+    parser.add_argument("-f", "--fps", type=float, default=None,
+                        help="Replay the frames at FPS, as the camera would. By default, as fast as possible (a frame "
+                             "is published as soon as the previous one is read).")
+    parser.add_argument("-n", "--nb_frames", type=int, default=None,
+                        help="Max number of pictures to replay.")
+    parser.add_argument("-b", "--backend", type=str, default=None, choices=BACKEND_LIST,
+                        help="Inference backend. By default, 'tflite' for a .tflite model and 'keras' otherwise.")
+    parser.add_argument("-t", "--num_threads", type=int, default=None,
+                        help="Number of threads used by the tflite interpreter.")
+    parser.add_argument("-l", "--write_latency", type=float, default=0.0,
+                        help="Simulated duration of a PWM write, in second.")
+    parser.add_argument("--i2c_bus_speed", type=int, default=None,
+                        help="Simulated I2C clock in Hz (100000 or 400000 on the Raspberry Pi): the time to send the "
+                             "bytes of each PWM write is added to its duration.")
+    parser.add_argument("--pwm_refresh", type=float, default=1.0,
+                        help="Max time in second before an unchanged PWM channel is written again. Negative to never "
+                             "refresh.")
+    parser.add_argument("--pwm_batch_write", action="store_true",
+                        help="Write the 3 PWM channels in a single block write.")
+    parser.add_argument("-c", "--config", type=str, nargs="+", default=["single:1:none"],
+                        help="Prediction modes to compare, as BATCH_MODE:BATCH_SIZE:SMOOTHING[:SMOOTHING_PARAM], e.g. "
+                             f"'frames:3:ema:0.5'. Batch modes: {BATCH_MODE_LIST}, smoothings: {SMOOTHING_LIST}.")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Run camera, inference and actuation as concurrent stages.")
+    parser.add_argument("--allow_duplicate", action="store_true",
+                        help="Predict on the latest frame even if it was already used by the previous prediction.")
+    parser.add_argument("-o", "--output", type=str, default=None,
+                        help="Json file where to save the report. Default is in the log directory.")
+    return parser.parse_args()
+
+
+def get_label_agreement(prediction_log, labels):
+    """
+    Return the share of predictions equal to the recorded labels, as {"direction": float, "speed": float}.
+    :param prediction_log:  [list]  (frame sequence number, predicted labels) of each prediction, as logged by RaceOn
+    :param labels:          [list]  Recorded labels, in replay order (frame sequence number 1 is labels[0])
+    """
+    l_predicted, l_recorded = [], []
+    for frame_seq, predicted_labels in prediction_log:
+        label = labels[frame_seq - 1]["label"]
+        if label["label_direction"] is None or label["label_speed"] is None:
+            continue
+        l_predicted.append(predicted_labels)
+        l_recorded.append([label["label_direction"], label["label_speed"]])
+    if not l_predicted:
+        return {"direction": None, "speed": None}
+    agreement = (np.array(l_predicted) == np.array(l_recorded)).mean(axis=0)
+    return {"direction": float(agreement[0]), "speed": float(agreement[1])}
+
+
+def parse_config(config):
+    """Return the RaceOn.set_prediction_mode kwargs of a BATCH_MODE:BATCH_SIZE:SMOOTHING[:SMOOTHING_PARAM] string."""
+    fields = config.split(":")
+    if len(fields) not in (3, 4):
+        raise ValueError(f'Invalid config "{config}", expected BATCH_MODE:BATCH_SIZE:SMOOTHING[:SMOOTHING_PARAM]')
+    return {"batch_mode": fields[0], "batch_size": int(fields[1]), "smoothing": fields[2],
+            "smoothing_param": float(fields[3]) if len(fields) == 4 else None}
+
+
+def get_direction_change_rate(prediction_log):
+    """Share of the predictions whose direction label differs from the previous one (steering flickering)."""
+    l_direction = [predicted_labels[0] for _, predicted_labels in prediction_log]
+    if len(l_direction) < 2:
+        return None
+    return float(np.mean(np.diff(l_direction) != 0))
+
+
+def replay(race_on, frames, labels, fps=None, write_latency=0.0, pipeline=False, fresh_only=True, bus_speed=None):
+    """
+    Race on the frames replayed by a ReplayVideoStream until the last one has been read, then stop the race. Camera
+    and PWM driver of race_on are replaced by the replay ones.
+    :param frames:          [list]      Frames to replay, as returned by load_session
+    :param labels:          [list]      Recorded labels of the frames
+    :param fps:             [float]     Replay frame rate. If None, as fast as possible
+    :param write_latency:   [float]     Simulated duration of a PWM write, in second
+    :param bus_speed:       [int]       Simulated I2C clock in Hz, None to ignore the bus transfer time
+    :return:                [dict]      Report of the replay
+    """
+    video_stream = ReplayVideoStream(frames, fps=fps).start()
+    race_on.video_stream = video_stream
+    race_on.pwm = Actuator(SimulatedPCA9685(write_latency=write_latency, bus_speed=bus_speed),
+                           refresh_period=race_on.pwm.refresh_period,
+                           batch_write=race_on.pwm.batch_write)
+    race_on.frame_seq = 0
+    race_on.elapsed_time = 0
+    race_on.nb_stale = 0
+    race_on.prediction_log = []
+    race_on.stage_timer.reset()
+    race_on.input_batch.reset()
+    race_on.smoother.reset()
+    queue_input = Queue()
+    if pipeline:
+        race_thread = Thread(target=race_on.race_pipeline, kwargs={'queue_input': queue_input})
+    else:
+        race_thread = Thread(target=race_on.race, kwargs={'queue_input': queue_input, 'fresh_only': fresh_only})
+    race_thread.start()
+    video_stream.wait_finished(timeout=1.0)
+    # Stopped by the harness rather than by a 'q' input: no stats file nor settle time for each replayed config, the
+    # report holds the statistics
+    race_on.racing = False
+    race_thread.join()
+    race_on.elapsed_time += time.time() - race_on.start_time
+    race_on.stop(save_stats=False, settle_time=0)
+    elapsed_time = race_on.elapsed_time  # race duration, without the stop
+    stages = race_on.stage_timer.to_dict()
+    decision_latency = None
+    if race_on.nb_pred > 0 and stages["frame_to_pwm"]["count"] > 0:
+        # frame to PWM latency plus the mean age of the frames the decision is based on (batching and smoothing)
+        prediction_period = elapsed_time / race_on.nb_pred
+        decision_latency = stages["frame_to_pwm"]["mean_ms"] + 1000 * race_on.decision_lag * prediction_period
+    return {
+        "prediction_mode": race_on.prediction_mode,
+        "nb_frames": video_stream.frame_seq,
+        "nb_pred": race_on.nb_pred,
+        "elapsed_time": elapsed_time,
+        "pred_rate": race_on.nb_pred / elapsed_time,
+        "nb_dropped": race_on.nb_dropped,
+        "nb_duplicate": race_on.nb_duplicate,
+        "nb_stale": race_on.nb_stale,
+        "nb_pwm_write": len(race_on.pwm.driver.commands),
+        "pwm": race_on.pwm.get_stats(),
+        "decision_latency_ms": decision_latency,
+        "direction_change_rate": get_direction_change_rate(race_on.prediction_log),
+        "label_agreement": get_label_agreement(race_on.prediction_log, labels),
+        "stages": stages
+    }
+
+
+def print_report(report):
+    agreement = report["label_agreement"]
+    print(f'Prediction mode: {report["prediction_mode"]}')
+    print(f'{report["nb_pred"]} prediction(s) on {report["nb_frames"]} frame(s) in {report["elapsed_time"]:.2f}s '
+          f'-> {report["pred_rate"]:.1f} pred/s')
+    print(f'{report["nb_dropped"]} frame(s) dropped ; {report["nb_duplicate"]} frame(s) predicted twice ; '
+          f'{report["nb_stale"]} stale command(s) dropped')
+    print(f'PWM: {report["pwm"]["nb_write"]} channel write(s) in {report["nb_pwm_write"]} command(s), '
+          f'{report["pwm"]["nb_skipped"]} skipped (value unchanged)')
+    if agreement["direction"] is not None:
+        print(f'Agreement with recorded labels: direction={100 * agreement["direction"]:.1f}% '
+              f'speed={100 * agreement["speed"]:.1f}%')
+    if report["decision_latency_ms"] is not None:
+        print(f'Decision latency: {report["decision_latency_ms"]:.1f}ms ; direction changed on '
+              f'{100 * report["direction_change_rate"]:.1f}% of the predictions')
+
+
+def _format_percent(value):
+    return "-" if value is None else f'{100 * value:.1f}%'
+
+
+def print_summary(l_report):
+    print(f'{"config":<24}{"pred/s":>9}{"latency ms":>12}{"changes":>9}{"dir agr.":>10}{"speed agr.":>11}')
+    for report in l_report:
+        mode = report["prediction_mode"]
+        config = f'{mode["batch_mode"]}:{mode["batch_size"]}:{mode["smoothing"]}'
+        if mode["smoothing_param"] is not None:
+            config += f':{mode["smoothing_param"]:g}'
+        latency = "-" if report["decision_latency_ms"] is None else f'{report["decision_latency_ms"]:.1f}'
+        agreement = report["label_agreement"]
+        print(f'{config:<24}{report["pred_rate"]:>9.1f}{latency:>12}'
+              f'{_format_percent(report["direction_change_rate"]):>9}{_format_percent(agreement["direction"]):>10}'
+              f'{_format_percent(agreement["speed"]):>11}')
+
+
+if __name__ == '__main__':
+    options = get_args()
+    l_config = [parse_config(config) for config in options.config]
+    l_frame, l_label = load_session(options.session_path, options.nb_frames)
+    print(f'{len(l_frame)} frame(s) loaded.')
+    race_on = RaceOn(options.model_path, backend=options.backend, num_threads=options.num_threads,
+                     video_stream=ReplayVideoStream(l_frame[:1]).start(), pwm=SimulatedPCA9685(),
+                     pwm_refresh=options.pwm_refresh if options.pwm_refresh >= 0 else None,
+                     pwm_batch_write=options.pwm_batch_write, **l_config[0])
+    l_report = []
+    for d_config in l_config:
+        race_on.set_prediction_mode(**d_config)
+        d_report = replay(race_on, l_frame, l_label, fps=options.fps, write_latency=options.write_latency,
+                          pipeline=options.pipeline, fresh_only=not options.allow_duplicate,
+                          bus_speed=options.i2c_bus_speed)
+        print_report(d_report)
+        l_report.append(d_report)
+    if len(l_report) > 1:
+        print_summary(l_report)
+    report_file = Path(LOG_DIRECTORY) / f'replay_{datetime.now().strftime("%Y%m%dT%H-%M-%S-%f")}.json' \
+        if options.output is None else Path(options.output)
+    report_file.parent.mkdir(parents=True, exist_ok=True)
+    with report_file.open(mode='w', encoding='utf-8') as fp:
+        json.dump({"model": options.model_path, "session": options.session_path, "fps": options.fps,
+                   "pipeline": options.pipeline, "replays": l_report}, fp, indent=4)
+    print(f'Report saved to "{report_file}"')
@@ -0,0 +1,7 @@
+from pathlib import Path
+import tempfile
+
+from utils import logger
+
+# Write the log file of the test session out of the repository "logs" directory
+logger.Logger.log_file = Path(tempfile.mkdtemp(prefix="test_logs_"), logger.Logger.log_file.name)
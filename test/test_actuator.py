@@ -0,0 +1,95 @@
+from utils.actuator import Actuator, MODE1, AUTO_INCREMENT, LED0_ON_L
+from utils.simulators import SimulatedPCA9685
+
+
+class FakeDevice:
+    def __init__(self):
+        self.registers = {MODE1: 0x01}
+        self.block_writes = []
+
+    def readU8(self, register):
+        return self.registers.get(register, 0)
+
+    def write8(self, register, value):
+        self.registers[register] = value
+
+    def writeList(self, register, data):
+        self.block_writes.append((register, data))
+
+
+class FakeAdafruitPCA9685:
+    def __init__(self):
+        self._device = FakeDevice()
+        self.l_set_pwm = []
+
+    def set_pwm(self, channel, on, off):
+        self.l_set_pwm.append((channel, on, off))
+
+
+def test_actuator_skip_unchanged_values():
+    driver = SimulatedPCA9685()
+    actuator = Actuator(driver)
+    assert actuator.set_channels([(0, 300), (1, 310), (2, 120)]) == 3
+    assert actuator.set_channels([(0, 300), (1, 310), (2, 120)]) == 0
+    assert actuator.set_channels([(0, 320), (1, 310), (2, 120)]) == 1
+    assert driver.get_channel_commands(0) == [300, 320]
+    assert driver.get_channel_commands(1) == [310]
+    assert actuator.nb_write == 4
+    assert actuator.nb_skipped == 5
+
+
+def test_actuator_set_pwm_and_force():
+    driver = SimulatedPCA9685()
+    actuator = Actuator(driver)
+    assert actuator.set_pwm(1, 0, 310)
+    assert not actuator.set_pwm(1, 0, 310)
+    assert actuator.set_pwm(1, 0, 310, force=True)
+    assert actuator.stop_channels([0, 1]) == 2
+    assert driver.get_channel_commands(1) == [310, 310, 0]
+
+
+def test_actuator_refresh_period():
+    driver = SimulatedPCA9685()
+    actuator = Actuator(driver, refresh_period=0)
+    actuator.set_channels([(0, 300)])
+    actuator.set_channels([(0, 300)])
+    assert driver.get_channel_commands(0) == [300, 300]
+    assert actuator.nb_skipped == 0
+
+
+def test_actuator_invalidate():
+    driver = SimulatedPCA9685()
+    actuator = Actuator(driver)
+    actuator.set_channels([(0, 300)])
+    actuator.invalidate()
+    actuator.set_channels([(0, 300)])
+    assert driver.get_channel_commands(0) == [300, 300]
+
+
+def test_actuator_batch_write_fake_driver():
+    driver = SimulatedPCA9685()
+    actuator = Actuator(driver, batch_write=True)
+    actuator.set_channels([(0, 300), (1, 310), (2, 120)])
+    assert actuator.nb_block_write == 1
+    # channel 1 is unchanged but written again as part of the block from channel 0 to 2
+    actuator.set_channels([(0, 320), (1, 310), (2, 150)])
+    assert actuator.nb_block_write == 2
+    assert driver.get_channel_commands(1) == [310, 310]
+    assert driver.get_channel_commands(2) == [120, 150]
+
+
+def test_actuator_batch_write_adafruit_driver():
+    driver = FakeAdafruitPCA9685()
+    actuator = Actuator(driver, batch_write=True)
+    assert driver._device.registers[MODE1] & AUTO_INCREMENT
+    actuator.set_channels([(1, 311), (2, 120)])
+    assert driver._device.block_writes == [(LED0_ON_L + 4, [0, 0, 311 & 0xFF, 311 >> 8, 0, 0, 120, 0])]
+    assert driver.l_set_pwm == []
+
+
+def test_actuator_batch_write_unknown_channel_in_between():
+    driver = FakeAdafruitPCA9685()
+    actuator = Actuator(driver, batch_write=True)
+    actuator.set_channels([(0, 300), (2, 120)])
+    assert driver._device.block_writes == []
+    assert driver.l_set_pwm == [(0, 0, 300), (2, 0, 120)]
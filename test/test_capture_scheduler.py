@@ -0,0 +1,47 @@
+import numpy as np
+
+from utils.capture_scheduler import CaptureScheduler
+
+
+def _frame(value):
+    return np.full((96, 160, 3), value, dtype=np.uint8)
+
+
+def test_capture_at_target_fps():
+    scheduler = CaptureScheduler(target_fps=8, min_difference=0)
+    kept = [scheduler.should_capture(i / 32, _frame(0), 0.0) for i in range(33)]
+    assert kept == [i % 4 == 0 for i in range(33)]
+    assert scheduler.get_stats() == {"nb_kept": 9, "nb_skipped_rate": 24, "nb_skipped_duplicate": 0,
+                                     "nb_skipped_stopped": 0}
+
+
+def test_capture_rate_does_not_drift_with_jitter():
+    scheduler = CaptureScheduler(target_fps=10, min_difference=0)
+    l_frame_time = [i / 30 + (0.003 if i % 2 else -0.003) for i in range(1, 301)]
+    kept = [scheduler.should_capture(frame_time, _frame(0), 0.0) for frame_time in l_frame_time]
+    assert 99 <= kept.count(True) <= 101
+
+
+def test_capture_rate_increases_with_steering_rate():
+    scheduler = CaptureScheduler(target_fps=8, max_fps=32, min_difference=0)
+    l_steering = [(-1) ** i * 0.5 for i in range(33)]
+    kept = [scheduler.should_capture(i / 32, _frame(0), steering) for i, steering in enumerate(l_steering)]
+    assert kept.count(True) == 33
+    assert scheduler.get_interval() == 1 / 32
+
+
+def test_skip_near_duplicate_frames():
+    scheduler = CaptureScheduler(target_fps=10, min_difference=2.0)
+    assert scheduler.should_capture(0.0, _frame(100), 0.0)
+    assert not scheduler.should_capture(0.2, _frame(101), 0.0)
+    assert scheduler.should_capture(0.4, _frame(110), 0.0)
+    assert scheduler.nb_skipped_duplicate == 1
+
+
+def test_skip_when_stopped():
+    scheduler = CaptureScheduler(target_fps=10)
+    assert not scheduler.should_capture(0.0, _frame(0), 0.0, moving=False)
+    assert scheduler.should_capture(0.1, _frame(0), 0.0)
+    assert scheduler.nb_skipped_stopped == 1
+    scheduler.reset()
+    assert scheduler.get_stats()["nb_kept"] == 0
@@ -1,6 +1,8 @@
 import pytest
 import random
 
+import numpy as np
+
 from utils import car_mapping as cm
 from conf.const import MAX_DIRECTION_LEFT, MAX_DIRECTION_RIGHT, MAX_SPEED, STOP_SPEED
 from conf.const import LABEL_TO_RAW_SPEED_MAPPING, LABEL_TO_RAW_DIR_MAPPING
@@ -156,3 +158,50 @@ def test_get_closest_item_index_eq_max():
     mylist = [1, 2, 3, 7, 11, 15, 23]
     val = 23
     assert 6 == cm.CarMapping.get_closest_value_index_in_sorted_list(value=val, list_=mylist)
+
+
+def test_car_mapping_lookup_same_as_computed():
+    car_mapping = cm.CarMapping()
+    for i in range(-100, 101):
+        joystick = round(i / 100, 2)
+        assert car_mapping.get_raw_dir_from_xbox_joystick(joystick) == \
+            car_mapping._compute_raw_dir_from_xbox_joystick(joystick)
+    for raw in range(700):
+        assert car_mapping.get_label_from_raw_dir(raw) == \
+            cm.CarMapping.get_closest_value_index_in_sorted_list(raw, car_mapping.raw_dir_to_label_mapping)
+        assert car_mapping.get_normalized_speed(raw) == car_mapping._compute_normalized_speed(raw)
+
+
+def test_car_mapping_not_quantized_values():
+    car_mapping = cm.CarMapping()
+    assert car_mapping.get_raw_dir_from_xbox_joystick(0.123) == \
+        round(car_mapping.joystick_slope * 0.123 + car_mapping.joystick_intercept)
+    assert car_mapping.get_normalized_direction(326.5) == car_mapping._compute_normalized_direction(326.5)
+    assert car_mapping.get_label_from_raw_dir(2000) == len(car_mapping.raw_dir_to_label_mapping) - 1
+
+
+def test_car_mapping_array_same_as_scalar():
+    car_mapping = cm.CarMapping()
+    joysticks = np.array([-1, -0.55, 0, 0.123, 0.99, 1.5])
+    assert car_mapping.get_raw_dir_from_xbox_joystick_array(joysticks).tolist() == \
+        [car_mapping.get_raw_dir_from_xbox_joystick(x) for x in joysticks.tolist()]
+    triggers = np.array([0, 0.5, 0.777, 1])
+    assert car_mapping.get_raw_speed_from_xbox_trigger_array(triggers).tolist() == \
+        [car_mapping.get_raw_speed_from_xbox_trigger(x) for x in triggers.tolist()]
+    raw_values = np.array([1, 250, 326, 651, 1500])
+    assert car_mapping.get_label_from_raw_dir_array(raw_values).tolist() == \
+        [car_mapping.get_label_from_raw_dir(x) for x in raw_values.tolist()]
+    assert car_mapping.get_normalized_direction_array(raw_values).tolist() == \
+        [car_mapping.get_normalized_direction(x) for x in raw_values.tolist()]
+    speeds = np.array([307, 311, 316, 322, 330])
+    assert car_mapping.get_label_from_raw_speed_array(speeds, stop_speed_label=-1).tolist() == \
+        [car_mapping.get_label_from_raw_speed(x, stop_speed_label=-1) for x in speeds.tolist()]
+
+
+def test_car_mapping_label_array():
+    car_mapping = cm.CarMapping()
+    labels = np.array([0, 4, 2])
+    assert car_mapping.get_raw_dir_from_label_array(labels).tolist() == \
+        [LABEL_TO_RAW_DIR_MAPPING[label] for label in labels]
+    assert car_mapping.get_raw_speed_from_label_array([1, 0]).tolist() == \
+        [LABEL_TO_RAW_SPEED_MAPPING[1], LABEL_TO_RAW_SPEED_MAPPING[0]]
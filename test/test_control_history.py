@@ -0,0 +1,30 @@
+from utils.control_history import ControlHistory, ControlSample
+
+
+def _sample(timestamp, label_direction=2):
+    return ControlSample(timestamp, 0.0, 0.0, 0, 0, 1, label_direction)
+
+
+def test_nearest_empty():
+    assert ControlHistory().nearest(1.0) is None
+    assert ControlHistory().last_time is None
+
+
+def test_nearest():
+    history = ControlHistory(maxlen=10)
+    for i, timestamp in enumerate([1.0, 1.02, 1.04, 1.06]):
+        history.append(_sample(timestamp, label_direction=i))
+    assert history.last_time == 1.06
+    assert history.nearest(0.5).label_direction == 0
+    assert history.nearest(1.029).label_direction == 1
+    assert history.nearest(1.031).label_direction == 2
+    assert history.nearest(1.03).label_direction == 1  # tie: earliest sample
+    assert history.nearest(2.0).label_direction == 3
+
+
+def test_history_maxlen():
+    history = ControlHistory(maxlen=2)
+    for timestamp in [1.0, 2.0, 3.0]:
+        history.append(_sample(timestamp))
+    assert len(history) == 2
+    assert history.nearest(0.0).time == 2.0
@@ -1,4 +1,8 @@
+import json
+from threading import Event, Lock, Thread
+
 import pytest
+from elasticsearch.serializer import JSONSerializer
 
 from get_data.src import es_utils
 
@@ -154,3 +158,245 @@ def test_two_field_bool_search(get_dic_and_package_query):
     }
     query = es_utils.get_search_query_from_dict("", d_query)
     assert query.to_dict() == expected_query
+
+
+class FakeElasticsearch:
+    """Elasticsearch client answering search requests from a list of documents, sorted and paged as a cluster does"""
+
+    def __init__(self, l_doc):
+        self.l_doc = l_doc
+        self.l_body = []
+        self.nb_bulk = 0
+        self.nb_reject = {}
+        self.lock = Lock()
+
+    class Transport:
+        serializer = JSONSerializer()
+
+    transport = Transport()
+
+    def bulk(self, body, **kwargs):
+        """Index or delete the documents. The first 'nb_reject[_id]' attempts of a document are rejected (429)"""
+        lines = [json.loads(line) for line in body.splitlines()]
+        items = []
+        with self.lock:
+            self.nb_bulk += 1
+            while lines:
+                (op_type, meta), = lines.pop(0).items()
+                doc = lines.pop(0) if op_type != "delete" else None
+                if self.nb_reject.get(meta["_id"], 0) > 0:
+                    self.nb_reject[meta["_id"]] -= 1
+                    items.append({op_type: {"_id": meta["_id"], "status": 429,
+                                            "error": {"type": "es_rejected_execution_exception", "reason": "busy"}}})
+                else:
+                    self.l_doc.append(doc)
+                    items.append({op_type: {"_id": meta["_id"], "status": 201}})
+        return {"errors": any(item[op_type]["status"] >= 300 for item in items), "items": items}
+
+    def search(self, index=None, body=None, **kwargs):
+        self.l_body.append(body)
+        sort_field = list(body["sort"][0])[0] if isinstance(body["sort"][0], dict) else body["sort"][0]
+        l_doc = sorted(self.l_doc, key=lambda doc: doc[sort_field])
+        if "search_after" in body:
+            l_doc = [doc for doc in l_doc if [doc[sort_field]] > body["search_after"]]
+        hits = [{"_source": doc, "sort": [doc[sort_field]]} for doc in l_doc[:body["size"]]]
+        if "_source" in body:
+            for hit in hits:
+                hit["_source"] = {field: hit["_source"][field] for field in body["_source"]}
+        return {"hits": {"hits": hits}}
+
+
+def get_fake_labels(nb_label):
+    return [{"img_id": f'img_{i:04d}', "label_fingerprint": f'fp_{i:04d}', "event": "test"}
+            for i in reversed(range(nb_label))]
+
+
+@pytest.mark.parametrize("nb_label,page_size,nb_request", [(0, 10, 1), (25, 10, 3), (30, 10, 4), (5, 1000, 1)])
+def test_scan_query_pages(nb_label, page_size, nb_request):
+    es = FakeElasticsearch(get_fake_labels(nb_label))
+    l_label = list(es_utils.scan_query(es, es_utils.get_search_query_from_dict("test", {}), page_size=page_size))
+    assert [label["label_fingerprint"] for label in l_label] == [f'fp_{i:04d}' for i in range(nb_label)]
+    assert len(es.l_body) == nb_request
+    assert all(body["size"] == page_size for body in es.l_body)
+
+
+def test_scan_query_is_lazy_and_filters_source():
+    es = FakeElasticsearch(get_fake_labels(25))
+    labels = es_utils.scan_query(es, es_utils.get_search_query_from_dict("test", {}), source_filter=["img_id"],
+                                 page_size=10)
+    assert next(labels) == {"img_id": "img_0000"}
+    assert len(es.l_body) == 1
+
+
+@pytest.fixture()
+def fake_ping(monkeypatch):
+    """Replace the ping of the Elasticsearch clients by a counter returning 'ping_result["ok"]'"""
+    ping_result = {"ok": True, "nb_ping": 0}
+
+    def ping(self, *args, **kwargs):
+        ping_result["nb_ping"] += 1
+        return ping_result["ok"]
+
+    monkeypatch.setattr(es_utils.elasticsearch.Elasticsearch, "ping", ping)
+    es_utils.close_es_sessions()
+    yield ping_result
+    es_utils.close_es_sessions()
+
+
+def test_get_es_session_is_shared(fake_ping):
+    es = es_utils.get_es_session("host_1", 9200)
+    assert es is not None
+    assert es_utils.get_es_session("host_1", 9200) is es
+    assert es_utils.get_es_session("host_2", 9200) is not es
+    assert fake_ping["nb_ping"] == 2
+    stats = es_utils.get_es_session_stats()
+    assert stats["host_1:9200"]["nb_get"] == 2
+    assert stats["host_1:9200"]["nb_health_check"] == 1
+
+
+def test_get_es_session_depends_on_credentials(fake_ping, monkeypatch):
+    es = es_utils.get_es_session("host_1", 9200)
+    monkeypatch.setenv(es_utils.ENV_VAR_FOR_ES_USER_ID, "other_user")
+    monkeypatch.setenv(es_utils.ENV_VAR_FOR_ES_USER_KEY, "other_password")
+    assert es_utils.get_es_session("host_1", 9200) is not es
+
+
+def test_get_es_session_health_check_ttl(fake_ping):
+    es = es_utils.get_es_session("host_1", 9200, health_check_ttl=0)
+    assert es_utils.get_es_session("host_1", 9200, health_check_ttl=0) is es
+    assert fake_ping["nb_ping"] == 2
+    fake_ping["ok"] = False
+    assert es_utils.get_es_session("host_1", 9200, health_check_ttl=0) is None
+    assert es_utils.get_es_session_stats() == {}
+    fake_ping["ok"] = True
+    assert es_utils.get_es_session("host_1", 9200) not in (None, es)
+
+
+def test_get_es_session_failed_ping_keeps_client_open(fake_ping, monkeypatch):
+    l_closed = []
+    monkeypatch.setattr(es_utils.elasticsearch.Elasticsearch, "close", lambda self: l_closed.append(self))
+    es = es_utils.get_es_session("host_1", 9200)
+    assert es.transport.retry_on_timeout is False
+    fake_ping["ok"] = False
+    assert es_utils.get_es_session("host_1", 9200, health_check_ttl=0) is None
+    assert l_closed == []
+
+
+def test_get_es_session_ping_outside_lock(fake_ping, monkeypatch):
+    ping_started = Event()
+    release_ping = Event()
+
+    def slow_ping(self, *args, **kwargs):
+        ping_started.set()
+        release_ping.wait(timeout=5)
+        return True
+
+    monkeypatch.setattr(es_utils.elasticsearch.Elasticsearch, "ping", slow_ping)
+    thread = Thread(target=es_utils.get_es_session, args=("host_1", 9200))
+    thread.start()
+    assert ping_started.wait(timeout=5)
+    # The registry stays available while the ping is pending
+    assert es_utils._session_lock.acquire(timeout=1)
+    es_utils._session_lock.release()
+    release_ping.set()
+    thread.join()
+
+
+@pytest.mark.parametrize("nb_threads,chunk_size,max_chunk_bytes,nb_bulk", [(1, 10, 10 ** 6, 3), (3, 10, 10 ** 6, 3),
+                                                                           (4, 100, 10 ** 6, 1), (2, 100, 500, 9)])
+def test_run_bulk_chunks(nb_threads, chunk_size, max_chunk_bytes, nb_bulk):
+    es = FakeElasticsearch([])
+    d_label = {label["img_id"]: label for label in get_fake_labels(25)}
+    success, errors = es_utils.run_bulk(es, es_utils._gen_bulk_doc_ingest(d_label, "test", "create"),
+                                        nb_threads=nb_threads, chunk_size=chunk_size, max_chunk_bytes=max_chunk_bytes)
+    assert (success, errors) == (25, [])
+    assert sorted(doc["img_id"] for doc in es.l_doc) == sorted(d_label)
+    assert es.nb_bulk == nb_bulk
+
+
+def test_run_bulk_retries_rejected_documents():
+    es = FakeElasticsearch([])
+    es.nb_reject = {"fp_0001": 2, "fp_0002": 5}
+    d_label = {label["img_id"]: label for label in get_fake_labels(5)}
+    success, errors = es_utils.run_bulk(es, es_utils._gen_bulk_doc_ingest(d_label, "test", "index"), max_retries=3,
+                                        initial_backoff=0)
+    assert success == 4
+    assert [error["index"]["_id"] for error in errors] == ["fp_0002"]
+    assert es.nb_bulk == 4
+
+
+class FakeTasks:
+    """Tasks API returning the states of 'l_task' one after the other, then the last one"""
+
+    def __init__(self, l_task):
+        self.l_task = l_task
+        self.nb_get = 0
+
+    def get(self, task_id):
+        task = self.l_task[min(self.nb_get, len(self.l_task) - 1)]
+        self.nb_get += 1
+        return task
+
+
+def get_task_state(completed, updated=0, total=100, noops=0, **response):
+    status = {"total": total, "updated": updated, "noops": noops, "version_conflicts": 0}
+    task = {"completed": completed, "task": {"status": status}}
+    if completed:
+        task["response"] = dict(status, failures=[], took=1500)
+        task["response"].update(response)
+    return task
+
+
+def test_run_update_by_query_polls_until_completed():
+    es = FakeElasticsearch([])
+    es.update_by_query = lambda index, body, **params: es.l_body.append((index, body, params)) or {"task": "node:1"}
+    es.tasks = FakeTasks([get_task_state(False), get_task_state(False, updated=40),
+                          get_task_state(True, updated=70, noops=30)])
+    query = {"term": {"dataset.name.keyword": "test"}}
+    success, errors = es_utils.run_update_by_query(es, "test", query, es_utils._REMOVE_DATASET_SCRIPT,
+                                                   params={"name": "test"}, slices=4, poll_interval=0)
+    assert (success, errors) == (100, [])
+    assert es.tasks.nb_get == 3
+    index, body, params = es.l_body[0]
+    assert body["query"] == query
+    assert body["script"]["params"] == {"name": "test"}
+    assert params["slices"] == 4 and params["wait_for_completion"] is False and params["conflicts"] == "proceed"
+
+
+def test_run_update_by_query_errors():
+    es = FakeElasticsearch([])
+    es.update_by_query = lambda index, body, **params: {"task": "node:1"}
+    failure = {"index": "test", "id": "fp_0001", "status": 400,
+               "cause": {"type": "script_exception", "reason": "runtime error"}}
+    es.tasks = FakeTasks([get_task_state(True, updated=97, failures=[failure], version_conflicts=2)])
+    success, errors = es_utils.run_update_by_query(es, "test", None, es_utils._ADD_DATASET_SCRIPT, poll_interval=0)
+    assert success == 97
+    assert errors[0] == {"update": {"_id": "fp_0001", "error": {"type": "script_exception", "reason": "runtime error"}}}
+    assert errors[1]["update"]["error"]["type"] == "version_conflict_engine_exception"
+    es_utils._print_bulk_update_synthesis(success, errors)
+
+
+def test_run_update_by_query_task_error():
+    es = FakeElasticsearch([])
+    es.update_by_query = lambda index, body, **params: {"task": "node:1"}
+    task = get_task_state(True)
+    task["error"] = {"type": "search_phase_execution_exception", "reason": "all shards failed", "phase": "query"}
+    es.tasks = FakeTasks([task])
+    success, errors = es_utils.run_update_by_query(es, "test", None, es_utils._ADD_DATASET_SCRIPT, poll_interval=0)
+    assert success == 0
+    assert errors == [{"update": {"_id": "task node:1", "error": {"type": "search_phase_execution_exception",
+                                                                  "reason": "all shards failed"}}}]
+
+
+def test_add_dataset_cluster_unreachable(monkeypatch):
+    monkeypatch.setattr(es_utils, "get_es_session", lambda *args, **kwargs: None)
+    success, errors = es_utils.add_dataset({"name": "test"}, "test", "host_1", 9200, d_label={}, verbose=0)
+    assert success == 0
+    assert errors[0]["update"]["error"]["type"] == "connection_error"
+    success, errors = es_utils.remove_dataset("test", "test", "host_1", 9200, verbose=0)
+    assert (success, len(errors)) == (0, 1)
+
+
+def test_get_ids_queries():
+    l_query = list(es_utils._get_ids_queries([f'fp_{i}' for i in range(25)], size=10))
+    assert [len(query["ids"]["values"]) for query in l_query] == [10, 10, 5]
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+from utils.frame_ring import FrameRing, InputBatch, get_padded_size, get_input_batch, RECENT_FRAMES, CROPS
+
+
+def _write_frame(ring, value, nb_chunks=3):
+    data = bytes([value]) * ring.frame_size
+    chunk = len(data) // nb_chunks + 1
+    for i in range(0, len(data), chunk):
+        ring.write(data[i:i + chunk])
+    ring.flush()
+
+
+def test_get_padded_size():
+    assert get_padded_size((160, 96)) == (160, 96)
+    assert get_padded_size((100, 50)) == (128, 64)
+
+
+def test_frame_ring_no_frame():
+    ring = FrameRing(size=(160, 96), nb_slots=3)
+    assert ring.array is None
+
+
+def test_frame_ring_shape_and_value():
+    ring = FrameRing(size=(160, 96), nb_slots=3)
+    _write_frame(ring, 42)
+    assert ring.array.shape == (96, 160, 3)
+    assert ring.array.dtype == np.uint8
+    assert np.all(ring.array == 42)
+
+
+def test_frame_ring_reuse_slots():
+    ring = FrameRing(size=(160, 96), nb_slots=3)
+    views = []
+    for i in range(4):
+        _write_frame(ring, i)
+        views.append(ring.array)
+    assert ring.nb_frames == 4
+    assert np.shares_memory(views[0], views[3])
+    assert np.all(views[1] == 1)
+    assert np.all(views[3] == 3)
+
+
+def test_frame_ring_padded_size():
+    ring = FrameRing(size=(100, 50), nb_slots=2)
+    _write_frame(ring, 7)
+    assert ring.array.shape == (50, 100, 3)
+
+
+def test_frame_ring_incomplete_frame_not_published():
+    ring = FrameRing(size=(160, 96), nb_slots=2)
+    ring.write(b"\x01" * 10)
+    ring.flush()
+    assert ring.array is None
+    assert ring.nb_incomplete == 1
+
+
+def test_frame_ring_min_slots():
+    with pytest.raises(ValueError):
+        FrameRing(nb_slots=1)
+
+
+def test_input_batch_load():
+    batch = InputBatch(shape=(96, 160, 3))
+    frame = np.full((96, 160, 3), 255, dtype=np.uint8)
+    array = batch.load(frame)
+    assert array is batch.array
+    assert array.dtype == np.float32
+    assert array.shape == (1, 96, 160, 3)
+    assert np.allclose(array, 1.0)
+
+
+def test_input_batch_without_rescaling():
+    batch = get_input_batch(CROPS, batch_size=3, shape=(10, 2, 3), scale=1.0)
+    frame = np.full((10, 2, 3), 200, dtype=np.uint8)
+    assert np.array_equal(batch.load(frame), np.full((3, 10, 2, 3), 200, dtype=np.float32))
+
+
+def test_recent_frames_batch():
+    batch = get_input_batch(RECENT_FRAMES, batch_size=3, shape=(2, 2, 3))
+    batch.load(np.full((2, 2, 3), 255, dtype=np.uint8))
+    assert np.allclose(batch.array, 1.0)  # first frame fills the batch
+    array = batch.load(np.zeros((2, 2, 3), dtype=np.uint8))
+    assert array.shape == (3, 2, 2, 3)
+    assert [float(frame.mean()) for frame in array] == [1.0, 0.0, 1.0]
+    assert batch.lag == 1
+
+
+def test_crops_batch():
+    batch = get_input_batch(CROPS, batch_size=3, shape=(10, 2, 3))
+    frame = np.repeat(np.arange(10, dtype=np.uint8), 6).reshape((10, 2, 3))
+    array = batch.load(frame) * 255
+    assert np.allclose(array[1], frame)
+    assert np.allclose(array[0, :6, 0, 0], [4, 5, 6, 7, 8, 9])
+    assert np.allclose(array[0, 6:, 0, 0], 9)
+    assert np.allclose(array[2, :4, 0, 0], 0)
+    assert np.allclose(array[2, 4:, 0, 0], [0, 1, 2, 3, 4, 5])
+
+
+def test_get_input_batch_invalid():
+    with pytest.raises(ValueError):
+        get_input_batch("video")
@@ -0,0 +1,120 @@
+import json
+
+import numpy as np
+import pytest
+
+from utils.frame_writer import FrameWriter, BLOCK, RAW
+from utils.raw_frame_store import read_raw_store
+
+
+def test_frame_writer_write_pictures_and_labels(tmp_path):
+    label_file = tmp_path / "labels.json"
+    writer = FrameWriter(label_file).start()
+    frame = np.zeros((96, 160, 3), dtype=np.uint8)
+    for i in range(3):
+        writer.put(frame, (tmp_path / f'{i}.jpg').as_posix(), str(i), {"img_id": str(i), "file_name": f'{i}.jpg'})
+    writer.stop()
+    assert writer.nb_written == 3
+    assert writer.nb_dropped == 0
+    for i in range(3):
+        assert (tmp_path / f'{i}.jpg').is_file()
+    with label_file.open(mode='r', encoding='utf-8') as fp:
+        d_label = json.load(fp)
+    assert sorted(d_label) == ["0", "1", "2"]
+    assert d_label["1"]["file_name"] == "1.jpg"
+    assert not writer.journal_file.exists()
+
+
+def test_frame_writer_drop_when_queue_full(tmp_path):
+    writer = FrameWriter(tmp_path / "labels.json", max_queue_size=2)
+    frame = np.zeros((96, 160, 3), dtype=np.uint8)
+    results = [writer.put(frame, (tmp_path / f'{i}.jpg').as_posix(), str(i), {}) for i in range(5)]
+    assert results == [True, True, False, False, False]
+    assert writer.nb_queued == 2
+    assert writer.nb_dropped == 3
+    writer.start()
+    writer.stop()
+    assert writer.nb_written == 2
+
+
+def test_frame_writer_no_label_file_without_frame(tmp_path):
+    writer = FrameWriter(tmp_path / "labels.json").start()
+    writer.stop()
+    assert not (tmp_path / "labels.json").exists()
+
+
+def test_frame_writer_block_policy(tmp_path):
+    writer = FrameWriter(tmp_path / "labels.json", max_queue_size=2, nb_workers=3, policy=BLOCK).start()
+    frame = np.zeros((96, 160, 3), dtype=np.uint8)
+    results = [writer.put(frame, (tmp_path / f'{i}.jpg').as_posix(), str(i), {}) for i in range(20)]
+    writer.stop()
+    assert all(results)
+    assert writer.nb_dropped == 0
+    assert writer.nb_written == 20
+    with (tmp_path / "labels.json").open(mode='r', encoding='utf-8') as fp:
+        assert len(json.load(fp)) == 20
+
+
+def test_frame_writer_invalid_policy(tmp_path):
+    with pytest.raises(ValueError):
+        FrameWriter(tmp_path / "labels.json", policy="wait")
+
+
+class FakeLabelSession:
+    def get_session_metadata(self):
+        return {"track": "home", "raw_value": {"max": 1}}
+
+    def get_frame_fields(self, record):
+        return {"img_id": record, "raw_value": {"speed": int(record)}}
+
+
+def test_frame_writer_label_session(tmp_path):
+    label_file = tmp_path / "labels.json"
+    writer = FrameWriter(label_file, label_session=FakeLabelSession()).start()
+    frame = np.zeros((96, 160, 3), dtype=np.uint8)
+    for i in range(2):
+        writer.put(frame, (tmp_path / f'{i}.jpg').as_posix(), str(i), str(i))
+    writer.stop()
+    with label_file.open(mode='r', encoding='utf-8') as fp:
+        d_label = json.load(fp)
+    assert d_label["1"] == {"track": "home", "raw_value": {"max": 1, "speed": 1}, "img_id": "1"}
+
+
+def test_frame_writer_raw_storage(tmp_path):
+    label_file = tmp_path / "labels.json"
+    writer = FrameWriter(label_file, nb_workers=2, storage=RAW).start()
+    for i in range(3):
+        writer.put(np.full((96, 160, 3), i, dtype=np.uint8), (tmp_path / f'{i}.jpg').as_posix(), str(i),
+                   {"img_id": str(i), "file_name": f'{i}.jpg'})
+    writer.stop()
+    assert writer.nb_written == 3
+    assert not (tmp_path / "0.jpg").exists()
+    assert sorted(file_name for file_name, _ in read_raw_store(writer.raw_file)) == ["0.jpg", "1.jpg", "2.jpg"]
+    assert label_file.is_file()
+
+
+def test_frame_writer_raw_storage_without_frame(tmp_path):
+    writer = FrameWriter(tmp_path / "labels.json", storage=RAW).start()
+    writer.stop()
+    assert not writer.raw_file.exists()
+
+
+def test_frame_writer_keeps_going_after_failed_write(tmp_path):
+    writer = FrameWriter(tmp_path / "labels.json", max_queue_size=2, nb_workers=2, policy=BLOCK).start()
+    frame = np.zeros((96, 160, 3), dtype=np.uint8)
+    for i in range(10):
+        directory = tmp_path if i % 2 == 0 else tmp_path / "missing_dir"
+        assert writer.put(frame, (directory / f'{i}.jpg').as_posix(), str(i), {})
+    writer.stop()
+    assert writer.get_stats()["nb_failed"] == 5
+    assert writer.nb_written == 5
+    with (tmp_path / "labels.json").open(mode='r', encoding='utf-8') as fp:
+        assert sorted(json.load(fp)) == ["0", "2", "4", "6", "8"]
+
+
+def test_frame_writer_stop_with_dead_workers(tmp_path):
+    writer = FrameWriter(tmp_path / "labels.json", max_queue_size=1).start()
+    writer.queue.put(None)  # the worker stops before the queue is emptied
+    writer._threads[0].join()
+    writer.put(np.zeros((96, 160, 3), dtype=np.uint8), (tmp_path / "0.jpg").as_posix(), "0", {})
+    writer.stop()  # must not wait for a free place in the full queue
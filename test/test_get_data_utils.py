@@ -66,3 +66,9 @@ def test_get_label_fingerprint_depends_on_imgid():
     fingerprint = utils_fct.get_label_finger_print(label)
     label["img_id"] = img_id[1:]
     assert fingerprint != utils_fct.get_label_finger_print(label)
+
+
+def test_get_label_dict_from_journal(tmp_path):
+    journal_file = tmp_path / "labels.jsonl"
+    journal_file.write_text('{"img_id": "1", "label": {"img_id": "1"}}\n', encoding='utf-8')
+    assert utils_fct.get_label_dict_from_file(journal_file) == {"1": {"img_id": "1"}}
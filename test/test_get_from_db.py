@@ -1,6 +1,10 @@
+import json
+
+import elasticsearch
 import pytest
 
 from get_data.src import get_from_db
+from test.test_es_utils import FakeElasticsearch
 
 
 @pytest.fixture()
@@ -56,3 +60,30 @@ def test_get_missing_picture_not_a_dir(list_of_missing_pic, list_of_existing_pic
     l_missing_pic = {}
     l_wanted_pic = {}
     assert get_from_db._get_missing_picture(pic_dir, l_wanted_pic) == l_missing_pic
+
+
+@pytest.mark.parametrize("d_label", [{}, {"a": {"img_id": "a", "dataset": [{"name": "d1"}]}, "b": {"img_id": "b"}}])
+def test_write_labels_to_file_same_as_json_dump(tmp_path, d_label):
+    output = tmp_path / "labels.json"
+    nb_label = get_from_db._write_labels_to_file(output, (item for item in d_label.items()), verbose=0)
+    assert nb_label == len(d_label)
+    assert output.read_text(encoding="utf-8") == json.dumps(d_label, indent=4)
+
+
+def test_iter_search_query_skips_labels_of_same_picture():
+    l_doc = [{"img_id": "img_1", "label_fingerprint": "fp_1"}, {"img_id": "img_2", "label_fingerprint": "fp_2"},
+             {"img_id": "img_1", "label_fingerprint": "fp_3"}]
+    labels = get_from_db.iter_search_query(FakeElasticsearch(l_doc), {}, es_index="test",
+                                           source_filter=["label_fingerprint"], page_size=2, verbose=0)
+    assert [(img_id, label["label_fingerprint"]) for img_id, label in labels] == [("img_1", "fp_1"), ("img_2", "fp_2")]
+
+
+def test_write_labels_to_file_no_partial_file(tmp_path):
+    def gen_label():
+        yield "a", {"img_id": "a"}
+        raise elasticsearch.ConnectionTimeout("TIMEOUT", "timeout", None)
+
+    output = tmp_path / "labels.json"
+    with pytest.raises(elasticsearch.ConnectionTimeout):
+        get_from_db._write_labels_to_file(output, gen_label(), verbose=0)
+    assert list(tmp_path.iterdir()) == []
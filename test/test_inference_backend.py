@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from utils import inference_backend as ib
+
+
+def test_get_backend_unknown():
+    with pytest.raises(ValueError):
+        ib.get_backend("model.h5", backend="unknown")
+
+
+def test_tflite_quantize_float_input():
+    detail = {"dtype": np.float32, "quantization": (0.0, 0)}
+    batch = np.ones((1, 2, 2, 3), dtype=np.float32)
+    assert ib.TFLiteBackend._quantize(batch, detail) is batch
+
+
+def test_tflite_quantize_dequantize_uint8():
+    detail = {"dtype": np.uint8, "quantization": (1 / 255.0, 0)}
+    batch = np.array([0.0, 0.4, 1.0, 2.0], dtype=np.float32)
+    quantized = ib.TFLiteBackend._quantize(batch, detail)
+    assert quantized.dtype == np.uint8
+    assert list(quantized) == [0, 102, 255, 255]
+    assert np.allclose(ib.TFLiteBackend._dequantize(quantized, detail), [0, 102 / 255.0, 1, 1])
+
+
+def test_tflite_quantize_int8_zero_point():
+    detail = {"dtype": np.int8, "quantization": (1 / 255.0, -128)}
+    quantized = ib.TFLiteBackend._quantize(np.array([0.0, 1.0], dtype=np.float32), detail)
+    assert list(quantized) == [-128, 127]
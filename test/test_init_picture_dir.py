@@ -8,8 +8,9 @@ from conf.path import SESSION_TEMPLATE_NAME
 
 
 @pytest.fixture
-def init_test(monkeypatch):
+def init_test(monkeypatch, tmp_path):
     monkeypatch.setattr('sys.stdin', StringIO("\n"))
+    monkeypatch.setattr(init, "CACHE_DIR", str(tmp_path / ".cache"))
     output = Path("test/test_tmp_dir")
     session_template = {
         "event": "unittest",
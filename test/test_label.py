@@ -74,5 +74,39 @@ def test_label_handler_get_copy():
             assert item["label"][key] == val
 
 
+def test_label_handler_expand_record():
+    output = "test/resources"
+    label = lb.Label(picture_dir=output)
+    label.set_label(img_id="42", file_name="42.jpg", timestamp="42", raw_speed=10, raw_direction=20,
+                    label_speed=1, label_direction=3)
+    expected = json.loads(str(label))
+    record = label.new_record(img_id="42", file_name="42.jpg", timestamp="42", raw_speed=10, raw_direction=20,
+                              label_speed=1, label_direction=3)
+    expanded = label.expand(record)
+    expanded["label"].pop("created_on_date")
+    expected["label"].pop("created_on_date")
+    assert expanded == expected
+
+
+def test_label_handler_expand_does_not_share_session_fields():
+    label = lb.Label(picture_dir="test/resources")
+    l_label = [label.expand(label.new_record(img_id=str(i), file_name=f'{i}.jpg', timestamp=str(i), raw_speed=10,
+                                             raw_direction=20, label_speed=1, label_direction=3, camera_position=i))
+               for i in range(2)]
+    assert [item["car_setting"]["camera"]["camera_position"] for item in l_label] == [0, 1]
+    assert label["car_setting"]["camera"]["camera_position"] == "unknown"
+    assert l_label[0]["hardware_conf"] is not l_label[1]["hardware_conf"]
+
+
+def test_label_handler_session_metadata():
+    label = lb.Label(picture_dir="test/resources")
+    metadata = label.get_session_metadata()
+    for field in lb.FRAME_FIELDS:
+        assert field not in metadata
+    assert "label_direction" not in metadata["label"]
+    assert metadata["label"]["created_by"] == "auto"
+    assert metadata["car_setting"] is not label["car_setting"]
+
+
 if __name__ == "__main__":
     test_label_handler_empty_init()
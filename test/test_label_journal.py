@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from utils.label_journal import LabelJournal, read_journal, read_label_file, compact_journal, merge_label
+
+
+def test_label_journal_append_and_read(tmp_path):
+    journal = LabelJournal(tmp_path / "labels.jsonl")
+    journal.append("1", {"img_id": "1", "file_name": "1.jpg"})
+    journal.append("2", {"img_id": "2", "file_name": "2.jpg"})
+    # labels are readable before the journal is closed
+    assert sorted(read_journal(tmp_path / "labels.jsonl")) == ["1", "2"]
+    journal.append("1", {"img_id": "1", "file_name": "1bis.jpg"})
+    journal.close()
+    d_label = read_journal(tmp_path / "labels.jsonl")
+    assert d_label["1"]["file_name"] == "1bis.jpg"
+    assert journal.nb_label == 3
+
+
+def test_read_journal_interrupted_write(tmp_path):
+    journal_file = tmp_path / "labels.jsonl"
+    journal = LabelJournal(journal_file, fsync_period=0)
+    journal.append("1", {"img_id": "1"})
+    journal.close()
+    with journal_file.open(mode='a', encoding='utf-8') as fp:
+        fp.write('{"img_id": "2", "lab')
+    assert list(read_journal(journal_file)) == ["1"]
+
+
+def test_read_journal_corrupted_line(tmp_path):
+    journal_file = tmp_path / "labels.jsonl"
+    journal_file.write_text('{"img_id": "1", "lab\n{"img_id": "2", "label": {}}\n', encoding='utf-8')
+    with pytest.raises(json.JSONDecodeError):
+        read_journal(journal_file)
+
+
+def test_compact_journal(tmp_path):
+    journal = LabelJournal(tmp_path / "labels.jsonl")
+    journal.append("1", {"img_id": "1"})
+    journal.close()
+    assert compact_journal(tmp_path / "labels.jsonl", tmp_path / "labels.json") == 1
+    assert not (tmp_path / "labels.jsonl").exists()
+    with (tmp_path / "labels.json").open(mode='r', encoding='utf-8') as fp:
+        assert json.load(fp) == {"1": {"img_id": "1"}}
+    assert read_label_file(tmp_path / "labels.json") == {"1": {"img_id": "1"}}
+
+
+def test_compact_empty_journal(tmp_path):
+    LabelJournal(tmp_path / "labels.jsonl").close()
+    assert compact_journal(tmp_path / "labels.jsonl", tmp_path / "labels.json") == 0
+    assert not (tmp_path / "labels.json").exists()
+
+
+def test_label_journal_session_header(tmp_path):
+    journal = LabelJournal(tmp_path / "labels.jsonl", session={"track": "home", "camera": {"position": 1, "fps": 30}})
+    journal.append("a", {"img_id": "a", "camera": {"position": 2}})
+    journal.append("b", {"img_id": "b"})
+    journal.close()
+    d_label = read_journal(journal.file)
+    assert d_label["a"] == {"track": "home", "camera": {"position": 2, "fps": 30}, "img_id": "a"}
+    assert d_label["b"] == {"track": "home", "camera": {"position": 1, "fps": 30}, "img_id": "b"}
+    assert d_label["a"]["camera"] is not d_label["b"]["camera"]
+
+
+def test_merge_label_does_not_modify_inputs():
+    session = {"camera": {"position": 1}}
+    fields = {"camera": {"position": 2}, "raw": [1, 2]}
+    label = merge_label(session, fields)
+    assert label == {"camera": {"position": 2}, "raw": [1, 2]}
+    assert session == {"camera": {"position": 1}}
+    assert label["raw"] is not fields["raw"]
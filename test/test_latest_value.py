@@ -0,0 +1,39 @@
+import threading
+
+from utils.latest_value import LatestValue
+
+
+def test_latest_value_latest_wins():
+    slot = LatestValue()
+    slot.put(1)
+    slot.put(2)
+    version, value = slot.get()
+    assert value == 2
+    assert version == 2
+
+
+def test_latest_value_timeout_no_new_value():
+    slot = LatestValue()
+    version = slot.put("a")
+    assert slot.get(last_version=version, timeout=0.01) == (version, None)
+
+
+def test_latest_value_close_wakes_up_consumer():
+    slot = LatestValue()
+    result = []
+    consumer = threading.Thread(target=lambda: result.append(slot.get(last_version=0)))
+    consumer.start()
+    slot.close()
+    consumer.join(timeout=1)
+    assert not consumer.is_alive()
+    assert result == [(0, None)]
+
+
+def test_latest_value_get_blocks_until_put():
+    slot = LatestValue()
+    result = []
+    consumer = threading.Thread(target=lambda: result.append(slot.get(last_version=0, timeout=1)))
+    consumer.start()
+    slot.put("frame")
+    consumer.join(timeout=1)
+    assert result == [(1, "frame")]
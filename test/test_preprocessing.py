@@ -0,0 +1,62 @@
+import numpy as np
+
+from utils.preprocessing import normalize, normalize_channels, get_channel_stats, crop, resize, to_grayscale, \
+    Preprocessing, PIXEL_SCALE
+
+
+def _batch(batch_size=2):
+    return np.random.RandomState(0).randint(0, 256, size=(batch_size, 96, 160, 3)).astype(np.uint8)
+
+
+def test_normalize():
+    images = _batch()
+    normalized = normalize(images)
+    assert normalized.dtype == np.float32
+    assert np.allclose(normalized, images / 255.0, atol=1e-6)
+    out = np.empty(images.shape[1:], dtype=np.float32)
+    assert normalize(images[0], out=out) is out
+    assert np.array_equal(normalize(images[0], scale=1.0), images[0].astype(np.float32))
+
+
+def test_normalize_channels():
+    images = normalize(_batch(4))
+    mean, std = get_channel_stats(images)
+    assert mean.shape == (3,) and mean.dtype == np.float32
+    standardized = normalize_channels(images, mean, std)
+    assert standardized.dtype == np.float32
+    assert np.allclose(standardized.mean(axis=(0, 1, 2)), 0, atol=1e-4)
+    assert np.allclose(standardized.std(axis=(0, 1, 2)), 1, atol=1e-3)
+
+
+def test_crop_and_resize():
+    images = _batch()
+    cropped = crop(images, top=16, left=10, right=6)
+    assert cropped.shape == (2, 80, 144, 3)
+    assert np.shares_memory(cropped, images)
+    resized = resize(images, (80, 48))
+    assert resized.shape == (2, 48, 80, 3)
+    assert np.array_equal(resized[1], images[1, ::2, ::2])
+    image = images[0]
+    assert resize(image, (160, 96)) is image
+
+
+def test_to_grayscale():
+    images = np.zeros((1, 2, 2, 3), dtype=np.uint8)
+    images[..., 1] = 100
+    gray = to_grayscale(images)
+    assert gray.shape == (1, 2, 2, 1)
+    assert gray.dtype == np.float32
+    assert np.allclose(gray, 58.7)
+    assert to_grayscale(images, keep_channels=True).shape == (1, 2, 2, 3)
+
+
+def test_preprocessing_pipeline():
+    images = _batch()
+    assert np.array_equal(Preprocessing()(images), images * PIXEL_SCALE)
+    inputs = Preprocessing(crop_box=(16, 0, 0, 0), size=(80, 40), grayscale=True)(images)
+    assert inputs.shape == (2, 40, 80, 1)
+    assert inputs.dtype == np.float32
+    assert 0 <= inputs.min() and inputs.max() <= 1
+    assert Preprocessing(rescale=False)(images).max() == images.max()
+    inputs = Preprocessing(mean=[0.5, 0.5, 0.5], std=[0.5, 0.5, 0.5])(images)
+    assert -1 <= inputs.min() and inputs.max() <= 1
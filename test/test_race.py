@@ -0,0 +1,84 @@
+from queue import Queue
+import time
+from threading import Thread
+
+import numpy as np
+import pytest
+
+import race
+from utils.latest_value import LatestValue
+from utils.simulators import SimulatedCamera, SimulatedPCA9685
+
+
+class FakeBackend:
+    """Model predicting the center direction at the first speed, whatever the input"""
+
+    def predict(self, batch):
+        return [np.eye(5, dtype=np.float32)[[2] * len(batch)], np.eye(2, dtype=np.float32)[[1] * len(batch)]]
+
+
+@pytest.fixture()
+def race_on(monkeypatch):
+    monkeypatch.setattr(race, "get_backend", lambda *args, **kwargs: FakeBackend())
+    race_on = race.RaceOn("fake_model.tflite", video_stream=SimulatedCamera(fps=50).start(), pwm=SimulatedPCA9685())
+    yield race_on
+    race_on.racing = False
+    race_on.video_stream.stop()
+
+
+def count_read_new(video_stream):
+    """Wrap the read_new method of a video stream to count its calls"""
+    counter = {"nb_call": 0}
+    read_new = video_stream.read_new
+
+    def counted_read_new(*args, **kwargs):
+        counter["nb_call"] += 1
+        return read_new(*args, **kwargs)
+
+    video_stream.read_new = counted_read_new
+    return counter
+
+
+def test_inference_stage_waits_for_frames_while_paused(race_on):
+    race_on._treat_user_input('p')
+    counter = count_read_new(race_on.video_stream)
+    race_on.racing = True
+    inference_thread = Thread(target=race_on._inference_stage, args=(LatestValue(),))
+    inference_thread.start()
+    time.sleep(0.5)
+    race_on.racing = False
+    inference_thread.join()
+    assert counter["nb_call"] <= 30  # at most one call per frame (50 fps) or per timeout
+    assert race_on.nb_pred == 0
+
+
+def test_pipeline_pause_resets_counters(race_on):
+    queue_input = Queue()
+    race_thread = Thread(target=race_on.race_pipeline, kwargs={"queue_input": queue_input})
+    race_thread.start()
+    time.sleep(0.3)
+    queue_input.put('p')
+    time.sleep(0.3)
+    nb_pred, frame_seq = race_on.nb_pred, race_on.frame_seq
+    time.sleep(0.2)
+    race_on.racing = False
+    race_thread.join()
+    assert race_on.pause
+    assert (nb_pred, frame_seq) == (0, 0)
+    assert (race_on.nb_pred, race_on.frame_seq, race_on.nb_dropped, race_on.nb_duplicate) == (0, 0, 0, 0)
+
+
+@pytest.mark.parametrize("race_mode", ["race", "race_pipeline"])
+def test_debug_labels_same_in_both_modes(race_on, race_mode):
+    l_debug = []
+    race_on._check_debug_mode = lambda *args: l_debug.append(args)
+    race_thread = Thread(target=getattr(race_on, race_mode), kwargs={"queue_input": Queue()})
+    race_thread.start()
+    time.sleep(0.2)
+    race_on.racing = False
+    race_thread.join()
+    assert len(l_debug) > 0
+    predicted_labels, motor_direction, motor_head, motor_speed = l_debug[0]
+    assert predicted_labels == [2, 1]
+    assert motor_head == race.HEAD_UP
+    assert motor_speed == race_on.car_mapping.get_raw_speed_from_label(1)
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from utils.raw_frame_store import RawFrameStore, read_raw_store, read_raw_index, transcode_raw_store, get_index_file
+
+
+def _frame(value):
+    return np.full((96, 160, 3), value, dtype=np.uint8)
+
+
+def test_raw_frame_store_append_and_read(tmp_path):
+    store = RawFrameStore(tmp_path / "labels.raw", chunk_size=2)
+    for i in range(5):
+        assert store.append(_frame(i), f'{i}.jpg') == i
+    store.close()
+    assert (tmp_path / "labels.raw").stat().st_size == 5 * 96 * 160 * 3
+    l_item = list(read_raw_store(tmp_path / "labels.raw"))
+    assert [file_name for file_name, _ in l_item] == [f'{i}.jpg' for i in range(5)]
+    for i, (_, frame) in enumerate(l_item):
+        assert frame.shape == (96, 160, 3)
+        assert (frame == i).all()
+
+
+def test_raw_frame_store_wrong_shape(tmp_path):
+    store = RawFrameStore(tmp_path / "labels.raw")
+    with pytest.raises(ValueError):
+        store.append(np.zeros((10, 10, 3), dtype=np.uint8), "0.jpg")
+    store.close()
+
+
+def test_raw_frame_store_not_closed(tmp_path):
+    store = RawFrameStore(tmp_path / "labels.raw", chunk_size=4)
+    store.append(_frame(7), "0.jpg")
+    store._chunk.flush()
+    with get_index_file(store.file).open(mode='a', encoding='utf-8') as fp:
+        fp.write('{"slot": 1, "file_')  # interrupted write
+    shape, l_entry = read_raw_index(store.file)
+    assert shape == (96, 160, 3)
+    assert l_entry == [(0, "0.jpg")]
+    (_, frame), = read_raw_store(store.file)
+    assert (frame == 7).all()
+    store.close()
+
+
+def test_transcode_raw_store(tmp_path):
+    store = RawFrameStore(tmp_path / "labels.raw")
+    for i in range(3):
+        store.append(_frame(50 * i), f'{i}.jpg')
+    store.close()
+    assert transcode_raw_store(store.file, nb_workers=2, remove=True) == 3
+    for i in range(3):
+        image = np.asarray(Image.open(tmp_path / f'{i}.jpg'))
+        assert image.shape == (96, 160, 3)
+        assert abs(int(image.mean()) - 50 * i) <= 1
+    assert not store.file.exists()
+    assert not get_index_file(store.file).exists()
@@ -0,0 +1,108 @@
+import json
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from utils.replay import load_session, ReplayVideoStream
+from utils.simulators import SimulatedPCA9685
+import race
+from replay_race import get_label_agreement, parse_config, replay
+from test.test_race import FakeBackend
+
+
+def _write_session(directory, nb_frames):
+    d_label = {}
+    for i in reversed(range(nb_frames)):
+        img_id = f'20200204T15-23-0{i}-000000'
+        Image.fromarray(np.full((96, 160, 3), 10 * i, dtype=np.uint8)).save(directory / f'{img_id}.png')
+        d_label[img_id] = {"img_id": img_id, "file_name": f'{img_id}.png'}
+    label_file = directory / "labels.json"
+    with label_file.open(mode='w', encoding='utf-8') as fp:
+        json.dump(d_label, fp)
+    return label_file
+
+
+def test_load_session_sorted_by_img_id(tmp_path):
+    label_file = _write_session(tmp_path, 3)
+    frames, labels = load_session(label_file)
+    assert len(frames) == len(labels) == 3
+    assert frames[0].shape == (96, 160, 3)
+    assert frames[0].dtype == np.uint8
+    assert [int(frame[0, 0, 0]) for frame in frames] == [0, 10, 20]
+    l_img_id = [label["img_id"] for label in labels]
+    assert l_img_id == sorted(l_img_id)
+
+
+def test_load_session_directory_and_nb_frames(tmp_path):
+    _write_session(tmp_path, 3)
+    frames, labels = load_session(tmp_path, nb_frames=2)
+    assert len(frames) == len(labels) == 2
+
+
+def test_replay_video_stream_lockstep_replays_every_frame():
+    frames = [np.full((96, 160, 3), i, dtype=np.uint8) for i in range(20)]
+    stream = ReplayVideoStream(frames).start()
+    l_value = []
+    last_seq = 0
+    while len(l_value) < len(frames):
+        stamped = stream.read_new(timeout=1, last_seq=last_seq)
+        assert stamped is not None
+        last_seq, _, frame = stamped
+        l_value.append(int(frame[0, 0, 0]))
+    assert l_value == list(range(20))
+    assert stream.wait_finished(timeout=1)
+    assert stream.finished
+
+
+def test_replay_video_stream_fps():
+    frames = [np.zeros((96, 160, 3), dtype=np.uint8)] * 5
+    stream = ReplayVideoStream(frames, fps=100).start()
+    assert stream.wait_finished(timeout=0.01) is False  # published at fps whether read or not
+    assert stream.frame_seq == 5
+    assert stream.read_new(timeout=0.01) is not None
+    assert stream.read_new(timeout=0.01) is None
+
+
+def test_fake_pca9685_record_commands():
+    pwm = SimulatedPCA9685()
+    pwm.set_pwm_freq(50)
+    pwm.set_pwm(0, 0, 300)
+    pwm.set_pwm(1, 0, 310)
+    pwm.set_pwm(0, 0, 320)
+    assert pwm.freq == 50
+    assert pwm.get_channel_commands(0) == [300, 320]
+    assert pwm.get_channel_commands(1) == [310]
+
+
+def test_get_label_agreement():
+    labels = [{"label": {"label_direction": 2, "label_speed": 1}},
+              {"label": {"label_direction": 1, "label_speed": 1}},
+              {"label": {"label_direction": None, "label_speed": None}}]
+    prediction_log = [(1, [2, 1]), (2, [2, 1]), (3, [0, 0])]
+    assert get_label_agreement(prediction_log, labels) == {"direction": 0.5, "speed": 1.0}
+    assert get_label_agreement([], labels) == {"direction": None, "speed": None}
+
+
+def test_parse_config():
+    assert parse_config("frames:3:ema:0.5") == {"batch_mode": "frames", "batch_size": 3, "smoothing": "ema",
+                                                "smoothing_param": 0.5}
+    assert parse_config("single:1:none")["smoothing_param"] is None
+    with pytest.raises(ValueError):
+        parse_config("single")
+
+
+def test_replay_without_stats_file(monkeypatch, tmp_path):
+    monkeypatch.setattr(race, "LOG_DIRECTORY", str(tmp_path))
+    monkeypatch.setattr(race, "get_backend", lambda *args, **kwargs: FakeBackend())
+    frames = [np.full((96, 160, 3), i, dtype=np.uint8) for i in range(10)]
+    labels = [{"label": {"label_direction": 2, "label_speed": 1}}] * len(frames)
+    race_on = race.RaceOn("fake_model.tflite", video_stream=ReplayVideoStream(frames[:1]).start(),
+                          pwm=SimulatedPCA9685())
+    start = time.perf_counter()
+    report = replay(race_on, frames, labels)
+    assert time.perf_counter() - start < 1.5
+    assert report["nb_pred"] == 10
+    assert report["label_agreement"] == {"direction": 1.0, "speed": 1.0}
+    assert list(tmp_path.iterdir()) == []
@@ -1,4 +1,10 @@
+import io
 from datetime import datetime
+from threading import Lock
+
+import boto3
+import pytest
+from botocore.exceptions import ClientError
 
 from get_data.src import s3_utils
 from get_data.src import upload_to_db as upload
@@ -139,3 +145,103 @@ def test_delete_all_bucket_refused():
     assert not s3_utils.delete_all_in_s3_folder("test", "", ["test"])
     assert not s3_utils.delete_all_in_s3_folder("test", None, ["test"])
 
+
+class FakeS3Client:
+    """Thread safe in memory s3 client. The first 'nb_reject[key]' requests on a key fail with 'reject_code'"""
+
+    def __init__(self, reject_code="SlowDown"):
+        self.objects = {}
+        self.nb_reject = {}
+        self.reject_code = reject_code
+        self.lock = Lock()
+
+    def _check(self, bucket, key, operation):
+        with self.lock:
+            if self.nb_reject.get(key, 0) > 0:
+                self.nb_reject[key] -= 1
+                raise ClientError({"Error": {"Code": self.reject_code, "Message": "rejected"}}, operation)
+            if operation != "PutObject" and (bucket, key) not in self.objects:
+                raise ClientError({"Error": {"Code": "404" if operation == "HeadObject" else "NoSuchKey",
+                                             "Message": "Not Found"}}, operation)
+
+    def put_object(self, Bucket, Key, Body):
+        self._check(Bucket, Key, "PutObject")
+        self.objects[(Bucket, Key)] = Body
+
+    def head_object(self, Bucket, Key):
+        self._check(Bucket, Key, "HeadObject")
+        return {}
+
+    def get_object(self, Bucket, Key):
+        self._check(Bucket, Key, "GetObject")
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)])}
+
+
+def create_pictures(picture_dir, nb_picture):
+    d_label = {}
+    for i in range(nb_picture):
+        img_id = f'img_{i:03d}'
+        (picture_dir / f'{img_id}.jpg').write_bytes(img_id.encode())
+        d_label[img_id] = {"img_id": img_id, "file_name": f'{img_id}.jpg', "s3_bucket": "bucket/prefix/"}
+    return d_label
+
+
+def test_transfer_engine_upload_and_download(tmp_path):
+    client = FakeS3Client()
+    client.objects[("bucket", "prefix/img_000")] = b"already there"
+    client.nb_reject = {"prefix/img_001": 2}
+    d_label = create_pictures(tmp_path, 20)
+    engine = s3_utils.S3TransferEngine(client=client, max_in_flight=4, initial_backoff=0)
+    (tmp_path / "img_019.jpg").unlink()
+    succeeded, skipped, failed = s3_utils.upload_to_s3_from_label(d_label, tmp_path, "bucket", prefix="prefix/",
+                                                                  engine=engine)
+    assert sorted(succeeded) == sorted(set(d_label) - {"img_000", "img_019"})
+    assert (skipped, failed) == (["img_000"], ["img_019"])
+    assert client.objects[("bucket", "prefix/img_005")] == b"img_005"
+    assert engine.nb_retry == 2
+
+    output_dir = tmp_path / "download"
+    output_dir.mkdir()
+    s3_utils.download_from_s3(d_label, output_dir, engine=engine)
+    assert (output_dir / "img_000.jpg").read_bytes() == b"already there"
+    assert (output_dir / "img_018.jpg").read_bytes() == b"img_018"
+    assert sorted(output_dir.iterdir()) == sorted(output_dir / label["file_name"] for label in d_label.values()
+                                                  if label["img_id"] != "img_019")
+
+
+def test_transfer_engine_failures(tmp_path):
+    client = FakeS3Client(reject_code="AccessDenied")
+    client.nb_reject = {"key_1": 1, "key_2": 10}
+    (tmp_path / "picture.jpg").write_bytes(b"data")
+    engine = s3_utils.S3TransferEngine(client=client, max_in_flight=2, max_retries=3, initial_backoff=0)
+    d_file = {f'id_{i}': (tmp_path / "picture.jpg", "bucket", f'key_{i}') for i in range(4)}
+    d_file["id_missing"] = (tmp_path / "missing.jpg", "bucket", "key_missing")
+    result = engine.upload(d_file)
+    assert sorted(result.succeeded) == ["id_0", "id_3"]
+    assert sorted(item_id for item_id, _ in result.failed) == ["id_1", "id_2", "id_missing"]
+    assert all("AccessDenied" in reason for item_id, reason in result.failed if item_id in ("id_1", "id_2"))
+    assert engine.nb_retry == 0
+    assert str(result) == "2 succeeded, 0 skipped, 3 failed"
+
+    client = FakeS3Client()
+    client.nb_reject = {"key_1": 10}
+    engine = s3_utils.S3TransferEngine(client=client, max_in_flight=2, max_retries=3, initial_backoff=0)
+    result = engine.upload({"id_1": (tmp_path / "picture.jpg", "bucket", "key_1")})
+    assert result.failed[0][0] == "id_1" and "SlowDown" in result.failed[0][1]
+    assert engine.nb_retry == 3
+
+
+def test_transfer_engine_with_moto(tmp_path):
+    moto = pytest.importorskip("moto")
+    mock = moto.mock_aws() if hasattr(moto, "mock_aws") else moto.mock_s3()
+    with mock:
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket="bucket")
+        d_label = create_pictures(tmp_path, 10)
+        engine = s3_utils.S3TransferEngine(client=client, max_in_flight=8)
+        succeeded, skipped, failed = s3_utils.upload_to_s3_from_label(d_label, tmp_path, "bucket", prefix="prefix/",
+                                                                      engine=engine)
+        assert (len(succeeded), skipped, failed) == (10, [], [])
+        result = engine.download({"img_003": ("bucket", "prefix/img_003", tmp_path / "copy.jpg")})
+        assert result.succeeded == ["img_003"]
+        assert (tmp_path / "copy.jpg").read_bytes() == b"img_003"
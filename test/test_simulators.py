@@ -0,0 +1,105 @@
+import json
+import time
+
+import numpy as np
+import pytest
+
+from conf.path import SESSION_TEMPLATE_NAME
+from get_data.src import xbox
+from get_data.src.label_handler import Label
+from get_data.src.training_session import TrainingSession
+from utils import devices
+from utils.actuator import DIRECTION_CHANNEL
+from utils.simulators import SimulatedCamera, SimulatedPCA9685, SimulatedGamepad, gamepad_state, synthetic_frames
+
+
+def test_synthetic_frames():
+    frames = synthetic_frames(nb_frames=4)
+    assert len(frames) == 4
+    assert frames[0].shape == (96, 160, 3) and frames[0].dtype == np.uint8
+    assert not np.array_equal(frames[0], frames[1])
+
+
+def test_simulated_camera():
+    camera = SimulatedCamera(frames=synthetic_frames(nb_frames=2), fps=100).start()
+    seq, frame_time, frame = camera.read_new(timeout=1.0)
+    assert seq >= 1
+    assert frame.shape == (96, 160, 3)
+    assert camera.read_new(timeout=1.0)[0] > seq
+    camera.stop()
+
+
+def test_simulated_pca9685_write_time():
+    driver = SimulatedPCA9685(write_latency=0.001, bus_speed=100000)
+    assert driver.get_write_time(1) == pytest.approx(0.001 + 6 * 9 / 100000)
+    assert driver.get_write_time(3) == pytest.approx(0.001 + 14 * 9 / 100000)
+    driver.set_pwm(0, 0, 300)
+    driver.set_pwm_block(0, [(0, 310), (0, 320)])
+    assert driver.nb_write == 2
+    assert driver.write_time == pytest.approx(driver.get_write_time(1) + driver.get_write_time(2))
+    assert driver.get_channel_commands(0) == [300, 310]
+    assert SimulatedPCA9685().get_write_time(3) == 0.0
+
+
+def test_gamepad_state():
+    state = gamepad_state(left_x=-1.0, right_trigger=1.0, pressed=(xbox.BUTTON_A,))
+    assert state.connected
+    assert (state.left_x, state.right_trigger) == (-32768, 255)
+    assert state.buttons[xbox.BUTTON_A] == 1
+    assert sum(state.buttons) == 1
+
+
+def test_simulated_gamepad_keyframes():
+    gamepad = SimulatedGamepad([(0.0, gamepad_state(left_x=0.5)), (0.05, gamepad_state(pressed=(xbox.BUTTON_A,)))],
+                               rate=500)
+    deadline = time.time() + 2.0
+    while not gamepad.A() and time.time() < deadline:
+        time.sleep(0.01)
+    assert gamepad.A() == 1
+    assert gamepad.leftX() == 0.0
+    assert gamepad.nb_event == 2
+    gamepad.close()
+
+
+def test_invalid_device_mode():
+    with pytest.raises(ValueError):
+        devices.get_pwm_driver("fake")
+
+
+def test_training_session_simulated(tmp_path):
+    with (tmp_path / SESSION_TEMPLATE_NAME).open(mode='w', encoding='utf-8') as fp:
+        json.dump(Label.get_default_session_template(), fp)
+
+    def script(elapsed_time):
+        if elapsed_time >= 0.5:
+            return gamepad_state(pressed=(xbox.BUTTON_A,))
+        return gamepad_state(left_x=0.5, right_trigger=0.8)
+
+    session = TrainingSession(0.05, tmp_path.as_posix(), control_rate=100, min_difference=0,
+                              video_stream=devices.get_camera(devices.SIMULATED, fps=60),
+                              pwm=devices.get_pwm_driver(devices.SIMULATED),
+                              joystick=devices.get_gamepad(devices.SIMULATED, script))
+    x_cursor = round(xbox.Gamepad.axisScale(gamepad_state(left_x=0.5).left_x, 4000), 2)
+    session.run()
+    session.joy.close()
+    session.video_stream.stop()
+    l_label_file = list(tmp_path.glob("labels_*.json"))
+    assert len(l_label_file) == 1
+    with l_label_file[0].open(mode='r', encoding='utf-8') as fp:
+        d_label = json.load(fp)
+    assert len(d_label) >= 3
+    for label in d_label.values():
+        assert (tmp_path / label["file_name"]).is_file()
+        assert label["raw_value"]["raw_direction"] == session.car_mapping.get_raw_dir_from_xbox_joystick(x_cursor)
+    assert session.pwm.driver.get_channel_commands(DIRECTION_CHANNEL)
+
+
+def test_training_session_without_delay(tmp_path):
+    with (tmp_path / SESSION_TEMPLATE_NAME).open(mode='w', encoding='utf-8') as fp:
+        json.dump(Label.get_default_session_template(), fp)
+    session = TrainingSession(0, tmp_path.as_posix(), max_capture_fps=20,
+                              video_stream=SimulatedCamera(frames=synthetic_frames(nb_frames=2), fps=100).start(),
+                              pwm=SimulatedPCA9685(), joystick=SimulatedGamepad([(0.0, gamepad_state())]))
+    session.joy.close()
+    session.video_stream.stop()
+    assert session.capture_scheduler.target_fps == 20
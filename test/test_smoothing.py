@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from utils.smoothing import get_smoother, EmaSmoother, WindowSmoother, NoSmoother, EMA, WINDOW
+
+
+def test_no_smoothing():
+    smoother = get_smoother()
+    assert isinstance(smoother, NoSmoother)
+    l_proba = [np.array([0.2, 0.8]), np.array([1.0, 0.0])]
+    assert smoother.update(l_proba) is l_proba
+    assert smoother.lag == 0
+
+
+def test_ema_smoother():
+    smoother = get_smoother(EMA, 0.5)
+    assert isinstance(smoother, EmaSmoother)
+    smoother.update([np.array([1.0, 0.0])])
+    direction, = smoother.update([np.array([0.0, 1.0])])
+    assert np.allclose(direction, [0.5, 0.5])
+    direction, = smoother.update([np.array([0.0, 1.0])])
+    assert np.allclose(direction, [0.25, 0.75])
+    assert smoother.lag == 1
+    smoother.reset()
+    direction, = smoother.update([np.array([0.0, 1.0])])
+    assert np.allclose(direction, [0.0, 1.0])
+
+
+def test_ema_smoother_does_not_modify_input():
+    smoother = EmaSmoother(0.5)
+    first = np.array([1.0, 0.0], dtype=np.float32)
+    smoother.update([first])
+    smoother.update([np.array([0.0, 1.0])])
+    assert np.allclose(first, [1.0, 0.0])
+
+
+def test_window_smoother():
+    smoother = get_smoother(WINDOW, 2)
+    assert isinstance(smoother, WindowSmoother)
+    smoother.update([np.array([1.0, 0.0]), np.array([0.0, 1.0])])
+    direction, speed = smoother.update([np.array([0.0, 1.0]), np.array([0.0, 1.0])])
+    assert np.allclose(direction, [0.5, 0.5])
+    assert np.allclose(speed, [0.0, 1.0])
+    direction, _ = smoother.update([np.array([0.0, 1.0]), np.array([0.0, 1.0])])
+    assert np.allclose(direction, [0.0, 1.0])
+    assert smoother.lag == 0.5
+
+
+def test_get_smoother_invalid():
+    with pytest.raises(ValueError):
+        get_smoother("median")
+    with pytest.raises(ValueError):
+        get_smoother(EMA, 0)
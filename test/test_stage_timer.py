@@ -0,0 +1,56 @@
+import json
+import random
+
+import pytest
+
+from utils.stage_timer import LatencyHistogram, StageTimer
+
+
+def test_histogram_empty():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(50) is None
+    assert histogram.to_dict() == {"count": 0}
+
+
+def test_histogram_percentiles_precision():
+    histogram = LatencyHistogram()
+    rng = random.Random(42)
+    values = [rng.uniform(0.001, 0.1) for _ in range(1000)]
+    for value in values:
+        histogram.add(value)
+    values.sort()
+    for percent in [50, 95, 99]:
+        exact = values[int(percent / 100 * len(values)) - 1]
+        assert histogram.percentile(percent) == pytest.approx(exact, rel=0.06)
+    assert histogram.max == values[-1]
+    assert histogram.count == 1000
+
+
+def test_histogram_out_of_range_values():
+    histogram = LatencyHistogram(min_value=1e-3, max_value=1)
+    histogram.add(0)
+    histogram.add(100)
+    assert histogram.percentile(100) == 100
+    assert histogram.percentile(1) == 1e-3
+
+
+def test_histogram_fixed_memory():
+    histogram = LatencyHistogram()
+    nb_buckets = len(histogram.counts)
+    for i in range(10000):
+        histogram.add(i * 1e-4)
+    assert len(histogram.counts) == nb_buckets
+
+
+def test_stage_timer_dump(tmp_path):
+    timer = StageTimer(["inference", "pwm"])
+    timer.add("inference", 0.02)
+    timer.add("inference", 0.03)
+    stats_file = tmp_path / "stats" / "race_stats.json"
+    timer.dump(stats_file)
+    with stats_file.open(mode='r', encoding='utf-8') as fp:
+        stats = json.load(fp)
+    assert stats["inference"]["count"] == 2
+    assert stats["inference"]["max_ms"] == pytest.approx(30)
+    assert stats["pwm"] == {"count": 0}
+    assert "inference" in str(timer)
@@ -0,0 +1,15 @@
+import json
+
+from get_data.src import es_utils
+from get_data.src import update_db
+
+
+def test_create_dataset_cluster_unreachable(monkeypatch, tmp_path):
+    monkeypatch.setattr(es_utils, "get_es_session", lambda *args, **kwargs: None)
+    monkeypatch.setattr(update_db, "_ask_user_dataset_details", lambda dataset: dict(dataset, name="test"))
+    label_file = tmp_path / "labels.json"
+    d_label = {"img_0": {"img_id": "img_0", "label_fingerprint": "fp_0", "dataset": None}}
+    label_file.write_text(json.dumps(d_label, indent=4), encoding="utf-8")
+    content = label_file.read_text(encoding="utf-8")
+    assert update_db.create_dataset(label_file.as_posix(), es_host_ip="host_1", es_host_port=9200) is False
+    assert label_file.read_text(encoding="utf-8") == content
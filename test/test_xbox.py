@@ -0,0 +1,26 @@
+from get_data.src import xbox
+
+READING = b'X1: -1200 Y1:   300  X2: 32767 Y2:-32768  du:1 dd:0 dl:0 dr:0  back:0 guide:0 start:1  ' \
+          b'TL:0 TR:0  A:1 B:0 X:0 Y:1  LB:0 RB:1  LT:  0 RT:255\n'
+
+
+def test_parse_reading():
+    assert len(READING) == xbox.XBOXDRV_LINE_LENGTH
+    state = xbox.parse_reading(READING, timestamp=12.5)
+    assert state.timestamp == 12.5
+    assert state.connected
+    assert (state.left_x, state.left_y, state.right_x, state.right_y) == (-1200, 300, 32767, -32768)
+    assert (state.left_trigger, state.right_trigger) == (0, 255)
+    assert state.buttons[xbox.DPAD_UP] == 1
+    assert state.buttons[xbox.START] == 1
+    assert state.buttons[xbox.BUTTON_A] == 1
+    assert state.buttons[xbox.BUTTON_B] == 0
+    assert state.buttons[xbox.BUTTON_Y] == 1
+    assert state.buttons[xbox.RIGHT_BUMPER] == 1
+    assert sum(state.buttons) == 5
+
+
+def test_idle_state():
+    assert not xbox.IDLE_STATE.connected
+    assert sum(xbox.IDLE_STATE.buttons) == 0
+    assert xbox.IDLE_STATE.right_trigger == 0
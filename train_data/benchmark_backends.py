@@ -0,0 +1,67 @@
+import argparse
+import time
+from pathlib import Path
+import sys
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).absolute().parents[1]))
+from utils.frame_ring import InputBatch
+from utils.inference_backend import get_backend
+from utils.replay import load_session
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Compare the speed (pred/s) and the predictions (argmax agreement) of "
+                                                 "several models / inference backends on recorded pictures. The first "
+                                                 "model is the reference.")
+    parser.add_argument("labels_path", type=str,
+                        help="Labels json file of the recorded pictures (pictures in the same folder).")
+    parser.add_argument("model_path", type=str, nargs="+",
+                        help="Models to compare. Backend is deduced from the extension (.tflite or keras).")
+    parser.add_argument("-n", "--nb_frames", type=int, default=500,
+                        help="Max number of pictures to use.")
+    parser.add_argument("-t", "--num_threads", type=int, default=None,
+                        help="Number of threads used by the tflite interpreter.")
+    return parser.parse_args()
+
+
+def run_backend(backend, frames):
+    """Predict every frame one by one as in the race loop. Return (pred/s, array of predicted labels)."""
+    input_batch = InputBatch()
+    backend.predict(input_batch.load(frames[0]))  # warm up
+    predicted_labels = []
+    start = time.perf_counter()
+    for frame in frames:
+        predictions = backend.predict(input_batch.load(frame))
+        predicted_labels.append([int(np.argmax(pred)) for pred in predictions])
+    elapsed_time = time.perf_counter() - start
+    return len(frames) / elapsed_time, np.array(predicted_labels)
+
+
+def benchmark(frames, l_model_path, num_threads=None):
+    """
+    Run every model on the frames and print their speed and their agreement with the first one.
+    :return:                [list]      one dict per model: {"model", "backend", "pred_rate", "direction_agreement",
+                                        "speed_agreement"}
+    """
+    results = []
+    reference = None
+    for model_path in l_model_path:
+        backend = get_backend(model_path, num_threads=num_threads)
+        pred_rate, predicted_labels = run_backend(backend, frames)
+        if reference is None:
+            reference = predicted_labels
+        agreement = (predicted_labels == reference).mean(axis=0)
+        results.append({"model": str(model_path), "backend": backend.name, "pred_rate": pred_rate,
+                        "direction_agreement": float(agreement[0]), "speed_agreement": float(agreement[1])})
+        print(f'{model_path} ({backend.name}): {pred_rate:.1f} pred/s ; argmax agreement with reference: '
+              f'direction={100 * agreement[0]:.1f}% speed={100 * agreement[1]:.1f}%')
+    return results
+
+
+if __name__ == '__main__':
+    options = get_args()
+    l_frame, _ = load_session(options.labels_path, options.nb_frames)
+    print(f'{len(l_frame)} frame(s) loaded.')
+    benchmark(l_frame, options.model_path, num_threads=options.num_threads)
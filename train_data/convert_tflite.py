@@ -0,0 +1,95 @@
+import argparse
+import json
+import random
+from pathlib import Path
+import sys
+
+import numpy as np
+from PIL import Image
+import tensorflow as tf
+
+sys.path.append(str(Path(__file__).absolute().parents[1]))
+from conf.const import IMAGE_SIZE
+from utils.preprocessing import normalize, PIXEL_SCALE
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Convert a Keras model (as built by model_setter.get_model_params) "
+                                                 "into a TFLite flatbuffer to be run with the 'tflite' backend.")
+    parser.add_argument("model_path", type=str,
+                        help="Path to the Keras model: .h5 file or checkpoint directory.")
+    parser.add_argument("-o", "--output", type=str, default=None,
+                        help="Path to the output .tflite file. Default is the model path with a .tflite extension.")
+    parser.add_argument("-q", "--quantize", action="store_true",
+                        help="Apply int8 post-training quantization. Requires a calibration label file.")
+    parser.add_argument("-l", "--labels_path", type=str, default=None,
+                        help="Labels json file of the calibration pictures (pictures in the same folder).")
+    parser.add_argument("-n", "--nb_calibration", type=int, default=200,
+                        help="Number of pictures used for calibration.")
+    parser.add_argument("-r", "--random_seed", type=int, default=42,
+                        help="Random seed used to pick calibration pictures.")
+    parser.add_argument("--rescaling", action="store_true",
+                        help="The model normalizes its input itself: calibration pictures are not normalized.")
+    return parser.parse_args()
+
+
+def get_calibration_images(labels_path, nb_images=200, seed=42, rescale=True):
+    """
+    Return a list of normalized pictures (float32, between 0 and 1) picked at random in a labels json file.
+    :param rescale:         [bool]      False to keep the pixel values, for a model rescaling its input itself
+    :param labels_path:     [str]       Path to the labels file, pictures are expected in the same folder
+    :param nb_images:       [int]       Max number of pictures to return
+    :param seed:            [int]       Random seed
+    :return:                [list]      List of np.array of shape (96, 160, 3)
+    """
+    labels_path = Path(labels_path)
+    with labels_path.open(mode='r', encoding='utf-8') as fp:
+        d_label = json.load(fp)
+    l_label = list(d_label.values())
+    random.Random(seed).shuffle(l_label)
+    images = []
+    for label in l_label[:nb_images]:
+        image = Image.open(labels_path.parent / label["file_name"]).convert("RGB")
+        if image.size != IMAGE_SIZE:
+            image = image.resize(IMAGE_SIZE)
+        images.append(normalize(np.asarray(image), scale=PIXEL_SCALE if rescale else 1.0))
+    return images
+
+
+def convert(model_path, output=None, calibration_images=None):
+    """
+    Convert a Keras model to a TFLite flatbuffer.
+    :param model_path:          [str]   Path to the Keras model (.h5 file or SavedModel directory)
+    :param output:              [str]   Path to the output file. Default is the model path with a .tflite extension
+    :param calibration_images:  [list]  If not None, the model is int8 quantized, calibrated on those pictures.
+                                        Model input and outputs remain float32.
+    :return:                    [Path]  Path to the .tflite file
+    """
+    output = Path(model_path).with_suffix(".tflite") if output is None else Path(output)
+    model = tf.keras.models.load_model(model_path)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if calibration_images is not None:
+        def representative_dataset():
+            for image in calibration_images:
+                yield [image[np.newaxis, ...]]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    tflite_model = converter.convert()
+    output.write_bytes(tflite_model)
+    return output
+
+
+if __name__ == '__main__':
+    options = get_args()
+    l_image = None
+    if options.quantize:
+        if options.labels_path is None:
+            print("A calibration label file (-l) is required for quantization.")
+            exit(1)
+        l_image = get_calibration_images(options.labels_path, options.nb_calibration, options.random_seed,
+                                         rescale=not options.rescaling)
+        print(f'{len(l_image)} picture(s) loaded for calibration.')
+    tflite_file = convert(options.model_path, output=options.output, calibration_images=l_image)
+    print(f'TFLite model saved to "{tflite_file}"')
@@ -1,16 +1,25 @@
+from pathlib import Path
+import sys
+
 import tensorflow as tf
 # noinspection PyUnresolvedReferences
 from tensorflow.keras.layers import Convolution2D, BatchNormalization, Activation, Dropout, Flatten, Input, Dense
 
+sys.path.append(str(Path(__file__).absolute().parents[1]))
+from utils.preprocessing import get_rescaling_layer
+
 
 # noinspection PyUnresolvedReferences
-def get_model_params():
+def get_model_params(rescaling=False):
+    """:param rescaling: [bool] Normalize the input in the model: it takes the pictures pixel values (0-255)"""
     # TODO padding=same, activation in FC and activation with convolution ? ...
 
     tf.keras.backend.clear_session()
 
     img_in = Input(shape=(96, 160, 3), name='img_in')
     x = img_in
+    if rescaling:
+        x = get_rescaling_layer()(x)
 
     x = Convolution2D(2, (5, 5), strides=(2, 2), use_bias=False)(x)
     x = BatchNormalization()(x)
@@ -4,6 +4,7 @@ import json
 import pathlib
 import random
 import shutil
+import sys
 
 import matplotlib.pyplot as plt
 import numpy as np
@@ -11,6 +12,8 @@ import tensorflow as tf
 
 import model_setter
 import validation
+sys.path.append(str(pathlib.Path(__file__).absolute().parents[1]))
+from utils.preprocessing import normalize
 
 
 def get_args():
@@ -27,14 +30,18 @@ def get_args():
                         help="Number of epochs of the training.")
     parser.add_argument("-r", "--random_seed", type=int, default=42,
                         help="Random seed used to shuffle dataset.")
+    parser.add_argument("--rescaling", action="store_true",
+                        help="The model normalizes the pictures itself (first layer): they are kept as uint8, 4 times "
+                             "smaller in memory than float32. Race with 'race.py --model_rescaling'.")
     return parser.parse_args()
 
 
 # noinspection PyUnresolvedReferences
 class TrainModel:
     def __init__(self, labels_path, name='training_race_1',
-                 validation_split=0.15, test_split=0.15, nb_epochs=20, seed=42):
+                 validation_split=0.15, test_split=0.15, nb_epochs=20, seed=42, rescaling=False):
         self.seed = seed
+        self.rescaling = rescaling
         tf.random.set_seed(seed)
         random.seed(seed)
         self.images_json = None
@@ -70,7 +77,7 @@ class TrainModel:
         pathlib.Path(self.output_path).mkdir(parents=True, exist_ok=True)
         params_path = f"{self.output_path}/params.json"
         params_dic = {"validation_split": self.validation_split, "test_split": self.test_split,
-                      "nb_epochs": self.nb_epochs, "random_seed": self.seed}
+                      "nb_epochs": self.nb_epochs, "random_seed": self.seed, "rescaling": self.rescaling}
         with open(params_path, 'w', encoding='utf-8') as fd:
             json.dump(params_dic, fd, indent=4)
 
@@ -89,18 +96,22 @@ class TrainModel:
                 test_speeds.append(item['label']['label_speed'])
                 test_directions.append(item['label']['label_direction'])
 
-        self.images = np.asarray(features)
+        self.images = self._preprocess(np.asarray(features))
         self.directions_labels = np.asarray(directions, dtype='int16')
         self.speeds_labels = np.asarray(speeds, dtype='int16')
-        self.test_images = np.asarray(test_features)
+        self.test_images = self._preprocess(np.asarray(test_features))
         self.test_directions_labels = np.asarray(test_directions, dtype='int16')
         self.test_speeds_labels = np.asarray(test_speeds, dtype='int16')
 
     @staticmethod
     def _get_image(image_path):
+        """Return the uint8 picture, see '_preprocess'."""
         image_str = tf.io.read_file(image_path)
-        image = tf.image.decode_jpeg(image_str, channels=3).numpy() / 255.0
-        return image
+        return tf.image.decode_jpeg(image_str, channels=3).numpy()
+
+    def _preprocess(self, images):
+        """Normalize uint8 picture(s) at once (float32), unless the model does it itself."""
+        return images if self.rescaling else normalize(images)
     # TODO def train preprocess ? tf.image brightness, saturation... or put it separately and create images ?
 
     def show_images(self, rows, cols):
@@ -113,7 +124,7 @@ class TrainModel:
         plt.show()
 
     def train(self):
-        self.model = model_setter.get_model_params()
+        self.model = model_setter.get_model_params(rescaling=self.rescaling)
         self.model.build(input_shape=(None, 96, 160, 3))
         self.model.compile(loss=tf.keras.losses.SparseCategoricalCrossentropy(),
                            optimizer=tf.keras.optimizers.Adam(learning_rate=0.001), metrics=['accuracy'])
@@ -133,7 +144,7 @@ class TrainModel:
             validation.evaluate(self)
 
     def predict(self, image_path):
-        image = self._get_image(image_path)
+        image = self._preprocess(self._get_image(image_path)[np.newaxis])
         predictions = self.model(image)
         # put as @tf.function if many
         speed_preds = []
@@ -159,7 +170,8 @@ class TrainModel:
 if __name__ == '__main__':
     options = get_args()
     train_model = TrainModel(options.labels_path, name=options.name, validation_split=options.validation_split,
-                             nb_epochs=options.nb_epochs, seed=options.random_seed, test_split=options.test_split)
+                             nb_epochs=options.nb_epochs, seed=options.random_seed, test_split=options.test_split,
+                             rescaling=options.rescaling)
     # train_model.show_images(5, 10)
     train_model.train()
     train_model.show_balance()
@@ -16,6 +16,7 @@ import numpy as np
 
 from train_data import model_params_setter_new
 from conf.path import TRAINING_IMAGES_DIRECTORY, VALIDATION_IMAGES_DIRECTORY
+from utils.preprocessing import tf_load_image
 
 
 
@@ -64,10 +65,7 @@ class TrainModel:
             yield str(image_path), tf.constant(label_dir)
 
     def _get_image(self, image_path, labels):
-        image_str = tf.io.read_file(image_path)
-        image = tf.image.decode_jpeg(image_str, channels=3)
-        normalized_image = tf.cast(image, tf.float32) / 255.0
-        return normalized_image, labels
+        return tf_load_image(image_path), labels
 
     # def train preprocess ? tf.image brightness, saturation... or put it separately and create images ?
 
@@ -0,0 +1,133 @@
+"""
+Actuator layer in front of the PCA9685 PWM driver. Each set_pwm of the Adafruit driver costs 4 I2C transactions, so the
+actuator keeps the last value written to each channel and skips the writes that would not change anything.
+
+    actuator = Actuator(Adafruit_PCA9685.PCA9685(), refresh_period=1.0, batch_write=True)
+    actuator.set_pwm_freq(50)
+    actuator.set_channels([(DIRECTION_CHANNEL, 327), (SPEED_CHANNEL, 316), (HEAD_CHANNEL, 120)])
+"""
+import time
+
+
+DIRECTION_CHANNEL = 0
+SPEED_CHANNEL = 1
+HEAD_CHANNEL = 2
+
+# PCA9685 registers
+MODE1 = 0x00
+AUTO_INCREMENT = 0x20
+LED0_ON_L = 0x06
+
+
+class Actuator:
+    """
+    Write on change cache of the PWM channels. It can be used in place of the PCA9685 driver (same 'set_pwm' and
+    'set_pwm_freq' methods).
+    If 'refresh_period' is not None, a channel is written again when its last write is older than 'refresh_period'
+    seconds, even if its value didn't change, so that a glitch on the bus doesn't last.
+    If 'batch_write' is True, 'set_channels' writes consecutive channels in a single I2C block write, using the register
+    auto increment of the PCA9685 (the driver shall be an Adafruit PCA9685 or have a 'set_pwm_block' method).
+    """
+
+    def __init__(self, driver, refresh_period=None, batch_write=False):
+        self.driver = driver
+        self.refresh_period = refresh_period
+        self.batch_write = batch_write
+        self.d_value = {}
+        self.d_write_time = {}
+        self.nb_write = 0
+        self.nb_skipped = 0
+        self.nb_block_write = 0
+        if batch_write and not hasattr(driver, "set_pwm_block"):
+            # noinspection PyProtectedMember
+            device = driver._device
+            device.write8(MODE1, device.readU8(MODE1) | AUTO_INCREMENT)
+
+    def set_pwm_freq(self, freq_hz):
+        self.driver.set_pwm_freq(freq_hz)
+
+    def _is_up_to_date(self, channel, value, now):
+        if self.d_value.get(channel) != value:
+            return False
+        return self.refresh_period is None or now - self.d_write_time[channel] < self.refresh_period
+
+    def _written(self, channel, value, now):
+        self.d_value[channel] = value
+        self.d_write_time[channel] = now
+        self.nb_write += 1
+
+    def set_pwm(self, channel, on, off, force=False):
+        """
+        Write a channel if its value changed.
+        :param force:       [bool]      Write even if the value didn't change
+        :return:            [bool]      True if the channel has been written
+        """
+        now = time.time()
+        on, off = int(on), int(off)
+        if not force and self._is_up_to_date(channel, (on, off), now):
+            self.nb_skipped += 1
+            return False
+        self.driver.set_pwm(channel, on, off)
+        self._written(channel, (on, off), now)
+        return True
+
+    def set_channels(self, l_channel_value, force=False):
+        """
+        Write the 'off' value of several channels ('on' is 0), skipping the ones that didn't change.
+        :param l_channel_value: [list]  (channel, value) tuples
+        :param force:           [bool]  Write even the values that didn't change
+        :return:                [int]   Number of channels written
+        """
+        now = time.time()
+        l_changed = []
+        for channel, value in l_channel_value:
+            value = (0, int(value))
+            if force or not self._is_up_to_date(channel, value, now):
+                l_changed.append((channel, value))
+            else:
+                self.nb_skipped += 1
+        if not l_changed:
+            return 0
+        if self.batch_write and len(l_changed) > 1:
+            self._write_block(l_changed, now)
+        else:
+            for channel, (on, off) in l_changed:
+                self.driver.set_pwm(channel, on, off)
+                self._written(channel, (on, off), now)
+        return len(l_changed)
+
+    def _write_block(self, l_changed, now):
+        """Write every channel from the lowest to the highest changed one in a single block write."""
+        d_block = dict(self.d_value)
+        d_block.update(l_changed)
+        first, last = min(l_changed)[0], max(l_changed)[0]
+        if any(channel not in d_block for channel in range(first, last + 1)):
+            # a channel in between was never written: its value is unknown, write channels one by one
+            for channel, (on, off) in l_changed:
+                self.driver.set_pwm(channel, on, off)
+                self._written(channel, (on, off), now)
+            return
+        l_value = [d_block[channel] for channel in range(first, last + 1)]
+        if hasattr(self.driver, "set_pwm_block"):
+            self.driver.set_pwm_block(first, l_value)
+        else:
+            data = []
+            for on, off in l_value:
+                data += [on & 0xFF, on >> 8, off & 0xFF, off >> 8]
+            # noinspection PyProtectedMember
+            self.driver._device.writeList(LED0_ON_L + 4 * first, data)
+        self.nb_block_write += 1
+        for channel, value in zip(range(first, last + 1), l_value):
+            self._written(channel, value, now)
+
+    def stop_channels(self, l_channel):
+        """Set channels to 0 (no pulse), always written."""
+        return self.set_channels([(channel, 0) for channel in l_channel], force=True)
+
+    def invalidate(self):
+        """Forget the values written so far: the next write of each channel happens whatever its value."""
+        self.d_value.clear()
+        self.d_write_time.clear()
+
+    def get_stats(self):
+        return {"nb_write": self.nb_write, "nb_skipped": self.nb_skipped, "nb_block_write": self.nb_block_write}
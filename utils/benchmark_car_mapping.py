@@ -0,0 +1,68 @@
+import argparse
+import timeit
+from pathlib import Path
+import sys
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).absolute().parents[1]))
+from utils.car_mapping import CarMapping
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Micro-benchmark of the CarMapping conversions: computed, read from "
+                                                 "the lookup tables and vectorized.")
+    parser.add_argument("-n", "--nb_values", type=int, default=10000,
+                        help="Number of values converted by each variant.")
+    parser.add_argument("-r", "--repeat", type=int, default=5,
+                        help="Number of runs of each variant, the best one is kept.")
+    return parser.parse_args()
+
+
+def _best_time(function, repeat):
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def benchmark(nb_values=10000, repeat=5, seed=42):
+    """
+    Time each conversion on nb_values random inputs. Return a dict: {conversion: {variant: duration per value in ns}}.
+    """
+    car_mapping = CarMapping()
+    rng = np.random.default_rng(seed)
+    joysticks = np.round(rng.uniform(-1, 1, nb_values), 2)
+    triggers = np.round(rng.uniform(0, 1, nb_values), 2)
+    directions = rng.integers(1, 652, nb_values)
+    l_joystick, l_trigger, l_direction = joysticks.tolist(), triggers.tolist(), directions.tolist()
+    conversions = {
+        "joystick -> raw dir": (
+            lambda: [car_mapping._compute_raw_dir_from_xbox_joystick(x) for x in l_joystick],
+            lambda: [car_mapping.get_raw_dir_from_xbox_joystick(x) for x in l_joystick],
+            lambda: car_mapping.get_raw_dir_from_xbox_joystick_array(joysticks)),
+        "trigger -> raw speed": (
+            lambda: [car_mapping._compute_raw_speed_from_xbox_trigger(x) for x in l_trigger],
+            lambda: [car_mapping.get_raw_speed_from_xbox_trigger(x) for x in l_trigger],
+            lambda: car_mapping.get_raw_speed_from_xbox_trigger_array(triggers)),
+        "raw dir -> label": (
+            lambda: [CarMapping.get_closest_value_index_in_sorted_list(x, car_mapping.raw_dir_to_label_mapping)
+                     for x in l_direction],
+            lambda: [car_mapping.get_label_from_raw_dir(x) for x in l_direction],
+            lambda: car_mapping.get_label_from_raw_dir_array(directions)),
+        "raw dir -> normalized": (
+            lambda: [car_mapping._compute_normalized_direction(x) for x in l_direction],
+            lambda: [car_mapping.get_normalized_direction(x) for x in l_direction],
+            lambda: car_mapping.get_normalized_direction_array(directions)),
+    }
+    results = {}
+    for conversion, variants in conversions.items():
+        results[conversion] = {name: 1e9 * _best_time(function, repeat) / nb_values
+                               for name, function in zip(("computed", "lookup", "array"), variants)}
+    return results
+
+
+if __name__ == '__main__':
+    options = get_args()
+    d_result = benchmark(options.nb_values, options.repeat)
+    print(f'{"conversion (ns / value)":<24}{"computed":>10}{"lookup":>10}{"array":>10}{"speedup":>10}')
+    for name, timing in d_result.items():
+        print(f'{name:<24}{timing["computed"]:>10.1f}{timing["lookup"]:>10.1f}{timing["array"]:>10.1f}'
+              f'{timing["computed"] / timing["array"]:>9.0f}x')
@@ -0,0 +1,99 @@
+import numpy as np
+
+
+class CaptureScheduler:
+    """
+    Decide which camera frames of a training session are recorded, to keep about 'target_fps' pictures per second of
+    driving whatever the loop speed:
+        - recorded frames are scheduled every 1 / target_fps, shortened when the steering changes quickly (up to
+          1 / max_fps), so that corners get more pictures than straights
+        - a frame too close to the last recorded one (mean absolute difference of subsampled pixels below
+          'min_difference') is skipped
+    The schedule doesn't drift with the camera frame times: with a 30 fps camera and a 10 fps target, one frame out of
+    3 is recorded even if the frame times jitter.
+    Every decision is counted in the scheduler statistics.
+
+    Usage:
+        scheduler = CaptureScheduler(target_fps=10)
+        if scheduler.should_capture(frame_time, frame, steering):
+            ...
+        print(scheduler.get_stats())
+    """
+
+    def __init__(self, target_fps=10.0, max_fps=30.0, steering_gain=2.0, min_difference=2.0, subsampling=8):
+        """
+        :param target_fps:      [float]     Pictures per second recorded when the steering doesn't change
+        :param max_fps:         [float]     Max pictures per second, when the steering changes quickly
+        :param steering_gain:   [float]     Capture rate increase per unit of steering rate (full steering range / s)
+        :param min_difference:  [float]     Min mean absolute pixel difference (0-255) with the last recorded frame. 0
+                                            to record near duplicate frames
+        :param subsampling:     [int]       Only 1 pixel out of 'subsampling' in each direction is compared
+        """
+        self.target_fps = float(target_fps)
+        self.max_fps = max(float(max_fps), self.target_fps)
+        self.steering_gain = steering_gain
+        self.min_difference = min_difference
+        self.subsampling = subsampling
+        self.reset()
+
+    def reset(self):
+        # time the last recorded frame was scheduled at: the next one is due one interval later
+        self.capture_time = None
+        self._last_capture_frame = None
+        self._last_time = None
+        self._last_steering = None
+        self.steering_rate = 0.0
+        self.nb_kept = 0
+        self.nb_skipped_rate = 0
+        self.nb_skipped_duplicate = 0
+        self.nb_skipped_stopped = 0
+
+    def get_interval(self):
+        """Current min time in second between two recorded frames."""
+        capture_fps = min(self.target_fps * (1 + self.steering_gain * self.steering_rate), self.max_fps)
+        return 1 / capture_fps
+
+    def get_difference(self, frame):
+        """Mean absolute difference of the subsampled pixels of 'frame' and of the last recorded frame."""
+        if self._last_capture_frame is None:
+            return float("inf")
+        sample = frame[::self.subsampling, ::self.subsampling].astype(np.int16)
+        return float(np.abs(sample - self._last_capture_frame).mean())
+
+    def should_capture(self, frame_time, frame, steering, moving=True):
+        """
+        :param frame_time:  [float]     Capture time of the frame in second
+        :param frame:       [np.array]  uint8 frame
+        :param steering:    [float]     Steering input when the frame was captured (joystick position, -1.0 to 1.0)
+        :param moving:      [bool]      False if the car is stopped: nothing is recorded
+        :return:            [bool]      True if the frame should be recorded
+        """
+        if self._last_time is not None and frame_time > self._last_time:
+            self.steering_rate = abs(steering - self._last_steering) / (frame_time - self._last_time)
+        self._last_time, self._last_steering = frame_time, steering
+        if not moving:
+            self.nb_skipped_stopped += 1
+            return False
+        interval = self.get_interval()
+        if self.capture_time is not None and frame_time < self.capture_time + interval:
+            self.nb_skipped_rate += 1
+            return False
+        if self.min_difference > 0 and self.get_difference(frame) < self.min_difference:
+            self.nb_skipped_duplicate += 1
+            return False
+        if self.capture_time is None or frame_time - self.capture_time > 2 * interval:
+            self.capture_time = frame_time  # late (car stopped, duplicates...): restart the schedule
+        else:
+            self.capture_time += interval
+        if self.min_difference > 0:
+            self._last_capture_frame = frame[::self.subsampling, ::self.subsampling].astype(np.int16)
+        self.nb_kept += 1
+        return True
+
+    def get_stats(self):
+        return {"nb_kept": self.nb_kept, "nb_skipped_rate": self.nb_skipped_rate,
+                "nb_skipped_duplicate": self.nb_skipped_duplicate, "nb_skipped_stopped": self.nb_skipped_stopped}
+
+    def __str__(self):
+        return f'{self.nb_kept} frame(s) kept, skipped: {self.nb_skipped_rate} (capture rate), ' \
+               f'{self.nb_skipped_duplicate} (near duplicate), {self.nb_skipped_stopped} (car stopped)'
@@ -1,11 +1,24 @@
 import bisect
 
+import numpy as np
+
 from conf.const import MAX_DIRECTION_LEFT, MAX_DIRECTION_RIGHT, MAX_SPEED, STOP_SPEED
 from conf.const import RAW_DIR_TO_LABEL_MAPPING, JOYSTICK_TO_RAW_DIR_MAPPING, LABEL_TO_RAW_DIR_MAPPING
 from conf.const import TRIGGER_TO_RAW_SPEED_MAPPING, RAW_SPEED_TO_LABEL_MAPPING, LABEL_TO_RAW_SPEED_MAPPING
 
 
+# Joystick and trigger positions are rounded to 2 decimals by the training session: lookup tables hold one value per
+# hundredth. Raw direction and speed are integer PWM values: one value per integer below RAW_LUT_SIZE.
+POSITION_LUT_STEPS = 100
+RAW_LUT_SIZE = 1024
+
+
 class CarMapping:
+    """
+    Conversions between xbox controller positions, raw PWM values, labels and normalized values.
+    The conversions of quantized inputs (positions rounded to 2 decimals, integer raw values) are read from lookup
+    tables built once at construction. Other inputs are computed. The '_array' methods convert whole numpy arrays.
+    """
 
     @staticmethod
     def get_linear_coef(p1, p2):
@@ -62,6 +75,49 @@ class CarMapping:
             self.joystick_linear_mapping = True
         if len(self.trigger_to_raw_speed_mapping) == 0:
             self.trigger_linear_mapping = True
+        self._build_lookup_tables()
+
+    def _build_lookup_tables(self):
+        """Precompute every conversion of a quantized input, with the same code as for any other input."""
+        steps = POSITION_LUT_STEPS
+        # positions are looked up by value: hashing a float is cheaper than computing its index
+        self._joystick_lut = {i / steps: self._compute_raw_dir_from_xbox_joystick(i / steps)
+                              for i in range(-steps, steps + 1)}
+        self._trigger_lut = {i / steps: self._compute_raw_speed_from_xbox_trigger(i / steps) for i in range(steps + 1)}
+        self._dir_label_lut = [self.get_closest_value_index_in_sorted_list(raw, self.raw_dir_to_label_mapping)
+                               for raw in range(RAW_LUT_SIZE)]
+        self._speed_label_lut = [self.get_closest_value_index_in_sorted_list(raw, self.raw_speed_to_label_mapping)
+                                 for raw in range(RAW_LUT_SIZE)]
+        self._normalized_dir_lut = [self._compute_normalized_direction(raw) for raw in range(RAW_LUT_SIZE)]
+        self._normalized_speed_lut = [self._compute_normalized_speed(raw) for raw in range(RAW_LUT_SIZE)]
+        # numpy versions, for the '_array' methods
+        self._np_joystick_lut = np.array(list(self._joystick_lut.values()))
+        self._np_trigger_lut = np.array(list(self._trigger_lut.values()))
+        self._np_dir_label_lut = np.array(self._dir_label_lut)
+        self._np_speed_label_lut = np.array(self._speed_label_lut)
+        self._np_normalized_dir_lut = np.array(self._normalized_dir_lut)
+        self._np_normalized_speed_lut = np.array(self._normalized_speed_lut)
+
+    @staticmethod
+    def _lookup_array(lut, index, on_grid, values, compute):
+        """Read the values on the lookup table grid from 'lut' and compute the other ones one by one."""
+        result = np.empty(values.shape, dtype=lut.dtype)
+        result[on_grid] = lut[index[on_grid]]
+        if not on_grid.all():
+            result[~on_grid] = [compute(value) for value in values[~on_grid]]
+        return result
+
+    def _lookup_position_array(self, lut, positions, offset, compute):
+        positions = np.asarray(positions, dtype=np.float64)
+        index = np.rint(positions * POSITION_LUT_STEPS).astype(np.int64)
+        on_grid = (index / POSITION_LUT_STEPS == positions) & (index >= -offset) & (index <= POSITION_LUT_STEPS)
+        return self._lookup_array(lut, index + offset, on_grid, positions, compute)
+
+    def _lookup_raw_array(self, lut, raw_values, compute):
+        raw_values = np.asarray(raw_values)
+        index = np.rint(raw_values).astype(np.int64)
+        on_grid = (index == raw_values) & (index >= 0) & (index < RAW_LUT_SIZE)
+        return self._lookup_array(lut, index, on_grid, raw_values, compute)
 
     def get_label_from_raw_dir(self, direction):
         """
@@ -69,8 +125,15 @@ class CarMapping:
         :param direction:       [int or float]  raw direction value (float accepted for joystick_linear_mapping mapping only)
         :return:                [int]           direction label value
         """
+        if isinstance(direction, int) and 0 <= direction < RAW_LUT_SIZE:
+            return self._dir_label_lut[direction]
         return CarMapping.get_closest_value_index_in_sorted_list(direction, self.raw_dir_to_label_mapping)
 
+    def get_label_from_raw_dir_array(self, directions):
+        """Vectorized get_label_from_raw_dir: return the np.array of the direction labels of an array of raw values."""
+        return self._lookup_raw_array(self._np_dir_label_lut, directions, lambda direction: (
+            CarMapping.get_closest_value_index_in_sorted_list(direction, self.raw_dir_to_label_mapping)))
+
     def get_label_from_raw_speed(self, speed, stop_speed_label=None):
         """
         Return the speed label associated to the raw speed value based on the defined mapping.
@@ -81,17 +144,37 @@ class CarMapping:
         """
         if stop_speed_label is not None and speed >= STOP_SPEED:
             return stop_speed_label
+        if isinstance(speed, int) and 0 <= speed < RAW_LUT_SIZE:
+            return self._speed_label_lut[speed]
         return CarMapping.get_closest_value_index_in_sorted_list(speed, self.raw_speed_to_label_mapping)
 
+    def get_label_from_raw_speed_array(self, speeds, stop_speed_label=None):
+        """Vectorized get_label_from_raw_speed: return the np.array of the speed labels of an array of raw values."""
+        labels = self._lookup_raw_array(self._np_speed_label_lut, speeds, lambda speed: (
+            CarMapping.get_closest_value_index_in_sorted_list(speed, self.raw_speed_to_label_mapping)))
+        if stop_speed_label is not None:
+            labels[np.asarray(speeds) >= STOP_SPEED] = stop_speed_label
+        return labels
+
     def get_raw_speed_from_xbox_trigger(self, trigger):
         """
         Return the raw speed value from the xbox trigger position according to the defined mapping.
         :param trigger:         [float]         trigger position
         :return:                [int]           raw direction value
         """
+        raw_speed = self._trigger_lut.get(trigger)
+        if raw_speed is None:
+            return self._compute_raw_speed_from_xbox_trigger(trigger)
+        return raw_speed
+
+    def get_raw_speed_from_xbox_trigger_array(self, triggers):
+        """Vectorized get_raw_speed_from_xbox_trigger: return the np.array of the raw speeds of the positions."""
+        return self._lookup_position_array(self._np_trigger_lut, triggers, 0, self._compute_raw_speed_from_xbox_trigger)
+
+    def _compute_raw_speed_from_xbox_trigger(self, trigger):
         if self.trigger_linear_mapping:
             return round(self.trigger_slope * trigger + self.trigger_intercept)
-        for i, position in self.trigger_to_raw_speed_mapping:
+        for i, position in enumerate(self.trigger_to_raw_speed_mapping):
             if trigger < position:
                 return self.label_to_raw_speed_mapping[i]
         return self.label_to_raw_speed_mapping[-1]
@@ -102,9 +185,20 @@ class CarMapping:
         :param joystick:        [float]         joystick position
         :return:                [int]           raw direction value
         """
+        raw_direction = self._joystick_lut.get(joystick)
+        if raw_direction is None:
+            return self._compute_raw_dir_from_xbox_joystick(joystick)
+        return raw_direction
+
+    def get_raw_dir_from_xbox_joystick_array(self, joysticks):
+        """Vectorized get_raw_dir_from_xbox_joystick: return the np.array of the raw directions of the positions."""
+        return self._lookup_position_array(self._np_joystick_lut, joysticks, POSITION_LUT_STEPS,
+                                           self._compute_raw_dir_from_xbox_joystick)
+
+    def _compute_raw_dir_from_xbox_joystick(self, joystick):
         if self.joystick_linear_mapping:
             return round(self.joystick_slope * joystick + self.joystick_intercept)
-        for i, position in self.joystick_to_raw_dir_mapping:
+        for i, position in enumerate(self.joystick_to_raw_dir_mapping):
             if joystick < position:
                 return self.label_to_raw_dir_mapping[i]
         return self.label_to_raw_dir_mapping[-1]
@@ -116,6 +210,15 @@ class CarMapping:
         :param direction:   [int]   Raw direction value
         :return:            [float] Normalized direction
         """
+        if isinstance(direction, int) and 0 <= direction < RAW_LUT_SIZE:
+            return self._normalized_dir_lut[direction]
+        return self._compute_normalized_direction(direction)
+
+    def get_normalized_direction_array(self, directions):
+        """Vectorized get_normalized_direction: return the np.array of the normalized values of the raw values."""
+        return self._lookup_raw_array(self._np_normalized_dir_lut, directions, self._compute_normalized_direction)
+
+    def _compute_normalized_direction(self, direction):
         return round(self.normal_joystick_slope * direction + self.normal_joystick_intercept, 2)
 
     def get_normalized_speed(self, speed):
@@ -125,6 +228,15 @@ class CarMapping:
         :param speed:       [int]   Raw speed value
         :return:            [float] Normalized speed
         """
+        if isinstance(speed, int) and 0 <= speed < RAW_LUT_SIZE:
+            return self._normalized_speed_lut[speed]
+        return self._compute_normalized_speed(speed)
+
+    def get_normalized_speed_array(self, speeds):
+        """Vectorized get_normalized_speed: return the np.array of the normalized values of the raw values."""
+        return self._lookup_raw_array(self._np_normalized_speed_lut, speeds, self._compute_normalized_speed)
+
+    def _compute_normalized_speed(self, speed):
         return round(self.normal_trigger_slope * speed + self.normal_trigger_intercept, 2)
 
     def get_raw_dir_from_label(self, label):
@@ -150,3 +262,11 @@ class CarMapping:
         except IndexError as err:
             err.args = (f'Label "{label}" is not a valid index of the mapping : {self.label_to_raw_speed_mapping}',)
             raise
+
+    def get_raw_dir_from_label_array(self, labels):
+        """Vectorized get_raw_dir_from_label: return the np.array of the raw directions of an array of labels."""
+        return np.asarray(self.label_to_raw_dir_mapping)[np.asarray(labels)]
+
+    def get_raw_speed_from_label_array(self, labels):
+        """Vectorized get_raw_speed_from_label: return the np.array of the raw speeds of an array of labels."""
+        return np.asarray(self.label_to_raw_speed_mapping)[np.asarray(labels)]
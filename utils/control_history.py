@@ -0,0 +1,47 @@
+import bisect
+from collections import deque, namedtuple
+
+
+# Controller state and motor commands at one iteration of the training session control loop
+ControlSample = namedtuple("ControlSample", ["time", "trigger", "x_cursor", "speed", "direction", "label_speed",
+                                             "label_direction"])
+
+
+class ControlHistory:
+    """
+    Samples of the last iterations of a control loop, in time order, to find the one nearest to a frame capture time.
+
+    Usage:
+        history = ControlHistory(maxlen=100)
+        history.append(ControlSample(time.time(), ...))
+        sample = history.nearest(frame_time)
+    """
+
+    def __init__(self, maxlen=100):
+        self.samples = deque(maxlen=maxlen)
+        self.times = deque(maxlen=maxlen)
+
+    def __len__(self):
+        return len(self.samples)
+
+    def append(self, sample):
+        """Add a sample, more recent than the previous ones."""
+        self.samples.append(sample)
+        self.times.append(sample.time)
+
+    @property
+    def last_time(self):
+        return self.times[-1] if self.times else None
+
+    def nearest(self, timestamp):
+        """Return the sample nearest in time to 'timestamp' (the earliest one on ties), or None if there is none."""
+        if not self.samples:
+            return None
+        pos = bisect.bisect_left(self.times, timestamp)
+        if pos == 0:
+            return self.samples[0]
+        if pos == len(self.times):
+            return self.samples[-1]
+        if self.times[pos] - timestamp < timestamp - self.times[pos - 1]:
+            return self.samples[pos]
+        return self.samples[pos - 1]
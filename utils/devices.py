@@ -0,0 +1,66 @@
+"""
+Devices of the car, real or simulated (see utils.simulators), behind the interfaces the race and training loops use:
+    - camera: started utils.frame_source.FrameSource (read, read_stamped, read_new, stop). PiVideoStream or
+      SimulatedCamera
+    - PWM driver: set_pwm_freq(freq_hz), set_pwm(channel, on, off) and optionally set_pwm_block(first_channel,
+      l_value), to be wrapped in a utils.actuator.Actuator. Adafruit_PCA9685.PCA9685 or SimulatedPCA9685
+    - gamepad: get_data.src.xbox.Gamepad (state, refresh, leftX, rightTrigger, A..., close). xbox.Joystick or
+      SimulatedGamepad
+Hardware packages (picamera, Adafruit_PCA9685, xboxdrv) are only needed when a HARDWARE device is requested.
+"""
+from conf.const import FRAME_RATE
+
+
+HARDWARE = "hardware"
+SIMULATED = "simulated"
+DEVICE_MODE_LIST = [HARDWARE, SIMULATED]
+
+# Default I2C clock of the Raspberry Pi
+I2C_BUS_SPEED = 100000
+
+
+def _check_mode(mode):
+    if mode not in DEVICE_MODE_LIST:
+        raise ValueError(f'Unknown device mode "{mode}". Valid modes are: {DEVICE_MODE_LIST}')
+
+
+def get_camera(mode=HARDWARE, frame_ring=0, frames=None, fps=FRAME_RATE):
+    """
+    Return a started camera.
+    :param frame_ring:  [int]       HARDWARE: size of the ring of preallocated frames (see PiVideoStream)
+    :param frames:      [list]      SIMULATED: frames to publish. Default: synthetic frames
+    :param fps:         [float]     SIMULATED: frame rate
+    """
+    _check_mode(mode)
+    if mode == SIMULATED:
+        from utils.simulators import SimulatedCamera
+        return SimulatedCamera(frames=frames, fps=fps).start()
+    from utils.pivideostream import PiVideoStream
+    return PiVideoStream(ring_size=frame_ring).start()
+
+
+def get_pwm_driver(mode=HARDWARE, write_latency=0.0, bus_speed=I2C_BUS_SPEED):
+    """
+    Return a PWM driver.
+    :param write_latency:   [float]     SIMULATED: fixed duration of a write in second
+    :param bus_speed:       [int]       SIMULATED: I2C clock in Hz, None to ignore the bus transfer time
+    """
+    _check_mode(mode)
+    if mode == SIMULATED:
+        from utils.simulators import SimulatedPCA9685
+        return SimulatedPCA9685(write_latency=write_latency, bus_speed=bus_speed)
+    import Adafruit_PCA9685
+    return Adafruit_PCA9685.PCA9685()
+
+
+def get_gamepad(mode=HARDWARE, script=None):
+    """
+    Return a gamepad.
+    :param script:      [object]    SIMULATED: script of the inputs (see SimulatedGamepad). Default: no input
+    """
+    _check_mode(mode)
+    if mode == SIMULATED:
+        from utils.simulators import SimulatedGamepad
+        return SimulatedGamepad([] if script is None else script)
+    from get_data.src import xbox
+    return xbox.Joystick()
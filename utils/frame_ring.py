@@ -0,0 +1,165 @@
+import numpy as np
+
+from conf.const import IMAGE_SIZE
+from utils.preprocessing import normalize, PIXEL_SCALE
+
+
+def get_padded_size(size):
+    """The camera pads raw captures: width to a multiple of 32 and height to a multiple of 16."""
+    width, height = size
+    return (width + 31) // 32 * 32, (height + 15) // 16 * 16
+
+
+class FrameRing:
+    """
+    Custom picamera output that writes each rgb frame into a small ring of preallocated uint8 arrays, instead of the
+    new array PiRGBArray allocates for every frame.
+    It can be used in place of PiRGBArray with 'camera.capture_continuous(ring, format="rgb", use_video_port=True)':
+    'array' is a view on the last complete frame, shape (height, width, 3). This view stays valid until 'nb_slots' - 1
+    other frames have been captured, so consumers shall copy what they keep longer than that.
+    """
+
+    def __init__(self, size=IMAGE_SIZE, nb_slots=4):
+        if nb_slots < 2:
+            raise ValueError(f'A frame ring needs at least 2 slots, got {nb_slots}')
+        self.width, self.height = size
+        padded_width, padded_height = get_padded_size(size)
+        self.slots = np.zeros((nb_slots, padded_height, padded_width, 3), dtype=np.uint8)
+        self._buffers = [memoryview(slot.reshape(-1)) for slot in self.slots]
+        self.frame_size = self.slots[0].nbytes
+        self.write_index = 0
+        self.offset = 0
+        self.last_index = None
+        self.nb_frames = 0
+        self.nb_incomplete = 0
+
+    def write(self, buf):
+        """Called by the camera with the frame data, possibly in several chunks."""
+        size = min(len(buf), self.frame_size - self.offset)
+        if size > 0:
+            self._buffers[self.write_index][self.offset:self.offset + size] = memoryview(buf)[:size]
+            self.offset += size
+        return len(buf)
+
+    def flush(self):
+        """Called by the camera at the end of each frame: publish the frame and move to the next slot."""
+        if self.offset == 0:
+            return
+        if self.offset < self.frame_size:
+            self.nb_incomplete += 1
+        else:
+            self.last_index = self.write_index
+            self.write_index = (self.write_index + 1) % len(self.slots)
+            self.nb_frames += 1
+        self.offset = 0
+
+    def truncate(self, size=None):
+        self.offset = 0
+
+    def seek(self, offset, whence=0):
+        self.offset = offset
+        return offset
+
+    def close(self):
+        pass
+
+    @property
+    def array(self):
+        """View on the last complete frame, or None if no frame has been captured yet."""
+        if self.last_index is None:
+            return None
+        return self.slots[self.last_index, :self.height, :self.width]
+
+
+SINGLE_FRAME = "single"
+RECENT_FRAMES = "frames"
+CROPS = "crops"
+BATCH_MODE_LIST = [SINGLE_FRAME, RECENT_FRAMES, CROPS]
+
+
+class InputBatch:
+    """
+    Preallocated float32 model input. Loading a uint8 frame normalizes it in place (values between 0 and 1, see
+    utils.preprocessing) so that the steady state inference doesn't allocate any new array. With 'scale' 1.0, the
+    pixel values are kept, for a model rescaling its input itself.
+    """
+
+    # Mean age of the frames of the batch, in number of frames, once 'load' has been called with the latest frame
+    lag = 0
+
+    def __init__(self, shape=(IMAGE_SIZE[1], IMAGE_SIZE[0], 3), batch_size=1, scale=PIXEL_SCALE):
+        self.array = np.zeros((batch_size, *shape), dtype=np.float32)
+        self.scale = scale
+
+    def load(self, frame, index=0):
+        """Write the normalized frame at position 'index' of the batch and return the whole batch."""
+        normalize(frame, out=self.array[index], scale=self.scale)
+        return self.array
+
+    def reset(self):
+        """Forget the frames loaded so far (batches of recent frames)."""
+
+
+class RecentFramesBatch(InputBatch):
+    """
+    Batch of the 'batch_size' most recent frames: each 'load' normalizes only the new frame, in place of the oldest one.
+    The first frame fills the whole batch.
+    """
+
+    def __init__(self, shape=(IMAGE_SIZE[1], IMAGE_SIZE[0], 3), batch_size=3, scale=PIXEL_SCALE):
+        super().__init__(shape=shape, batch_size=batch_size, scale=scale)
+        self.lag = (batch_size - 1) / 2
+        self.nb_loaded = 0
+
+    def load(self, frame, index=None):
+        if self.nb_loaded == 0:
+            super().load(frame, index=0)
+            self.array[1:] = self.array[0]
+        else:
+            super().load(frame, index=self.nb_loaded % len(self.array))
+        self.nb_loaded += 1
+        return self.array
+
+    def reset(self):
+        self.nb_loaded = 0
+
+
+class CropsBatch(InputBatch):
+    """
+    Batch of several crops of one frame, shifted vertically by 'offsets' rows (the rows shifted in repeat the frame
+    edge). Vertical shifts keep the horizontal position of the track, which the direction depends on.
+    """
+
+    def __init__(self, shape=(IMAGE_SIZE[1], IMAGE_SIZE[0], 3), offsets=(-4, 0, 4), scale=PIXEL_SCALE):
+        super().__init__(shape=shape, batch_size=len(offsets), scale=scale)
+        self.offsets = offsets
+
+    def load(self, frame, index=None):
+        height = len(frame)
+        for slot, offset in zip(self.array, self.offsets):
+            if offset >= 0:
+                normalize(frame[:height - offset], out=slot[offset:], scale=self.scale)
+                slot[:offset] = slot[offset]
+            else:
+                normalize(frame[-offset:], out=slot[:offset], scale=self.scale)
+                slot[offset:] = slot[offset - 1]
+        return self.array
+
+
+def get_input_batch(batch_mode=SINGLE_FRAME, batch_size=1, shape=(IMAGE_SIZE[1], IMAGE_SIZE[0], 3), scale=PIXEL_SCALE):
+    """
+    Return the model input batch of a batch mode.
+    :param batch_mode:      [str]       One of BATCH_MODE_LIST. None is SINGLE_FRAME
+    :param batch_size:      [int]       Number of recent frames (RECENT_FRAMES) or of crops (CROPS, offsets of 4 rows)
+    :param shape:           [tuple]     Shape of a frame
+    :param scale:           [float]     Pixel scale, 1.0 for a model rescaling its input itself
+    :return:                [object]    InputBatch
+    """
+    if batch_mode is None or batch_mode == SINGLE_FRAME:
+        return InputBatch(shape=shape, scale=scale)
+    if batch_mode == RECENT_FRAMES:
+        return RecentFramesBatch(shape=shape, batch_size=batch_size, scale=scale)
+    if batch_mode == CROPS:
+        offsets = tuple(4 * (i - (batch_size - 1) // 2) for i in range(batch_size))
+        return CropsBatch(shape=shape, offsets=offsets, scale=scale)
+    raise ValueError(f'Unknown batch mode "{batch_mode}". Valid batch modes are: {BATCH_MODE_LIST}')
@@ -0,0 +1,63 @@
+import time
+from threading import Condition
+
+
+class FrameSource:
+    """
+    Base class of the threaded frame sources (camera, replay...). The capture thread calls 'publish' for every frame,
+    which is stamped with a sequence number (starting at 1) and its capture time. Consumers read the latest frame with
+    'read' / 'read_stamped' or wait for a new one with 'read_new'.
+    """
+
+    def __init__(self):
+        # initialize the frame and the variable used to indicate
+        # if the thread should be stopped
+        self.frame = None
+        self.stopped = False
+
+        # every frame is stamped with a sequence number (starting at 1) and its capture time
+        self.frame_seq = 0
+        self.frame_time = None
+        self.last_read_seq = 0
+        self.new_frame = Condition()
+
+    def publish(self, frame, frame_time=None):
+        """Make 'frame' the latest frame and wake up the consumers waiting for it."""
+        with self.new_frame:
+            self.frame = frame
+            self.frame_time = time.time() if frame_time is None else frame_time
+            self.frame_seq += 1
+            self.new_frame.notify_all()
+
+    def read(self):
+        # return the frame most recently read
+        return self.frame
+
+    def read_stamped(self):
+        """Return the frame most recently read as a tuple (sequence number, capture time, frame)."""
+        with self.new_frame:
+            self.last_read_seq = self.frame_seq
+            return self.frame_seq, self.frame_time, self.frame
+
+    def read_new(self, timeout=None, last_seq=None):
+        """
+        Wait for a frame newer than the last one returned by 'read_stamped' or 'read_new'.
+        :param timeout:     [float]     Max time to wait in second. If None, wait until a new frame is captured.
+        :param last_seq:    [int]       Sequence number of the last frame the caller got. By default, the one of the
+                                        last frame returned by this stream.
+        :return:            [tuple]     (sequence number, capture time, frame) or None if no new frame came in time
+        """
+        last_seq = self.last_read_seq if last_seq is None else last_seq
+        with self.new_frame:
+            if not self.new_frame.wait_for(lambda: self.frame_seq > last_seq or self.stopped, timeout=timeout):
+                return None
+            if self.frame_seq <= last_seq:
+                return None
+            self.last_read_seq = self.frame_seq
+            return self.frame_seq, self.frame_time, self.frame
+
+    def stop(self):
+        # indicate that the thread should be stopped
+        self.stopped = True
+        with self.new_frame:
+            self.new_frame.notify_all()
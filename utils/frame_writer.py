@@ -0,0 +1,180 @@
+import queue
+import time
+from pathlib import Path
+from threading import Thread, Lock
+
+from PIL import Image
+
+from utils.label_journal import LabelJournal, compact_journal, JOURNAL_SUFFIX
+from utils.raw_frame_store import RawFrameStore, remove_raw_store, RAW_SUFFIX
+
+
+DROP = "drop"
+BLOCK = "block"
+POLICY_LIST = [DROP, BLOCK]
+
+JPEG = "jpeg"
+RAW = "raw"
+STORAGE_LIST = [JPEG, RAW]
+
+
+class FrameWriter:
+    """
+    Pool of background threads saving frames as JPEG pictures and their labels to disk, fed through a bounded queue so
+    that the encoding never happens in the control loop.
+    With the RAW storage, frames are copied into a raw frame store (label file with a .raw suffix, see
+    utils.raw_frame_store) instead of being encoded: the JPEG pictures are written later, on the desktop.
+    Labels are appended to a label journal (label file with a .jsonl suffix) as soon as their picture is saved, synced
+    to the disk at most every 'label_period' seconds and when 'flush_labels' is called. On 'stop', the journal is
+    compacted into the labels json file expected by upload_to_db ({img_id: label, ...}).
+    When the queue is full, the 'policy' applies: with DROP, the frame is dropped and counted in 'nb_dropped' ; with
+    BLOCK, 'put' waits for a free place (total waiting time in 'blocked_time'). A frame which can't be written (disk
+    full, bad path...) is reported and counted in 'nb_failed', the writer goes on with the next ones.
+    With a 'label_session' (see get_data.src.label_handler.Label), labels are compact per frame records: the fields
+    common to the session are journaled once and each record is turned into its own fields by the writer threads.
+
+    Usage:
+        writer = FrameWriter(label_file, nb_workers=2).start()
+        writer.put(array, picture_file, img_id, label)
+        writer.stop()
+    """
+
+    _FLUSH = "flush"
+
+    def __init__(self, label_file, max_queue_size=100, label_period=5.0, nb_workers=1, policy=DROP, label_session=None,
+                 storage=JPEG):
+        """
+        :param storage:         [str]       JPEG to encode the pictures, RAW to store the raw frames
+        :param label_session:   [object]    If not None, provides 'get_session_metadata()' (fields common to every
+                                            label) and 'get_frame_fields(record)' (fields of the label of a frame)
+        """
+        if policy not in POLICY_LIST:
+            raise ValueError(f'Unknown policy "{policy}". Valid policies are: {POLICY_LIST}')
+        if storage not in STORAGE_LIST:
+            raise ValueError(f'Unknown storage "{storage}". Valid storages are: {STORAGE_LIST}')
+        self.label_file = Path(label_file)
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.label_period = label_period
+        self.nb_workers = nb_workers
+        self.policy = policy
+        self.label_session = label_session
+        self.storage = storage
+        self.raw_store = None
+        self.journal = None
+        self.nb_queued = 0
+        self.nb_written = 0
+        self.nb_dropped = 0
+        self.nb_failed = 0
+        self.blocked_time = 0.0
+        self._lock = Lock()
+        self._threads = []
+
+    @property
+    def journal_file(self):
+        return self.label_file.with_suffix(JOURNAL_SUFFIX)
+
+    @property
+    def raw_file(self):
+        return self.label_file.with_suffix(RAW_SUFFIX)
+
+    def start(self):
+        if self.storage == RAW and self.raw_store is None:
+            self.raw_store = RawFrameStore(self.raw_file)
+        if self.journal is None:
+            session = None if self.label_session is None else self.label_session.get_session_metadata()
+            self.journal = LabelJournal(self.journal_file, fsync_period=self.label_period, session=session)
+        self._threads = [Thread(target=self._run, daemon=True) for _ in range(self.nb_workers)]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def put(self, array, picture_file, img_id, label):
+        """
+        Queue a frame and its label for writing. Doesn't block unless the policy is BLOCK and the queue is full.
+        :param array:           [np.array]  rgb frame, uint8. The writer keeps a reference: don't modify it afterwards
+        :param picture_file:    [str]       Path of the picture to write
+        :param img_id:          [str]       Key of the label in the labels file
+        :param label:           [dict]      Label of the picture, or its record if the writer has a label_session
+        :return:                [bool]      False if the frame has been dropped because the queue is full
+        """
+        item = (array, picture_file, img_id, label)
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            if self.policy == DROP:
+                self.nb_dropped += 1
+                return False
+            start = time.perf_counter()
+            self.queue.put(item)
+            self.blocked_time += time.perf_counter() - start
+        self.nb_queued += 1
+        return True
+
+    def flush_labels(self):
+        """Ask the writer to sync the journal once the frames queued so far are written. Doesn't block."""
+        try:
+            self.queue.put_nowait(self._FLUSH)
+        except queue.Full:
+            pass
+
+    def stop(self):
+        """Write every queued frame, stop the threads and compact the journal into the labels file. Blocking."""
+        nb_stop = 0
+        while nb_stop < len(self._threads) and any(thread.is_alive() for thread in self._threads):
+            try:
+                self.queue.put(None, timeout=0.1)
+                nb_stop += 1
+            except queue.Full:
+                pass
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self.raw_store is not None:
+            self.raw_store.close()
+            if self.raw_store.nb_frame == 0:
+                remove_raw_store(self.raw_file)
+            self.raw_store = None
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+            compact_journal(self.journal_file, self.label_file)
+
+    def get_stats(self):
+        return {"nb_queued": self.nb_queued, "nb_written": self.nb_written, "nb_dropped": self.nb_dropped,
+                "nb_failed": self.nb_failed, "blocked_time": self.blocked_time, "queue_size": self.queue.qsize()}
+
+    def _sync_labels(self):
+        with self._lock:
+            if self.journal is not None:
+                self.journal.sync()
+
+    def _run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self.label_period)
+            except queue.Empty:
+                self._sync_labels()
+                continue
+            if item is None:
+                return
+            if item is self._FLUSH:
+                self._sync_labels()
+                continue
+            array, picture_file, img_id, label = item
+            try:
+                self._write(array, picture_file, img_id, label)
+            except Exception as err:  # a failed frame (disk full, bad path...) must not stop the worker
+                with self._lock:
+                    self.nb_failed += 1
+                print(f'Failed to write picture "{picture_file}" and its label: {err!r}')
+
+    def _write(self, array, picture_file, img_id, label):
+        if self.raw_store is not None:
+            self.raw_store.append(array, Path(picture_file).name)
+        else:
+            Image.fromarray(array, 'RGB').save(picture_file)
+        if self.label_session is not None:
+            label = self.label_session.get_frame_fields(label)
+        with self._lock:
+            self.journal.append(img_id, label)
+            self.nb_written += 1
@@ -7,35 +7,48 @@ In this case it should be clear.
 
 import time
 
-# noinspection PyUnresolvedReferences
-import Adafruit_PCA9685
-
 from conf.const import HEAD_DOWN, HEAD_UP
-from utils.pivideostream import PiVideoStream
+from conf.path import HARDWARE_TEST_IMAGES_DIRECTORY
+from utils.actuator import Actuator, HEAD_CHANNEL
+from utils import devices
+
+
+def save_test_image(video_stream, timeout=5.0):
+    """Save the next frame of a started camera to HARDWARE_TEST_IMAGES_DIRECTORY."""
+    from PIL import Image
+    stamped_frame = video_stream.read_new(timeout=timeout)
+    if stamped_frame is None:
+        print(f'No image captured in {timeout}s')
+        return
+    timestamp = time.time()
+    Image.fromarray(stamped_frame[2]).save("{}test_{}.png".format(HARDWARE_TEST_IMAGES_DIRECTORY, timestamp))
+    print("An image should have been saved: test_{}.png".format(timestamp))
 
 
 class TestHardware:
-    def __init__(self, pwm_freq=50):
-        self.pwm = Adafruit_PCA9685.PCA9685()
+    def __init__(self, pwm_freq=50, device_mode=devices.HARDWARE):
+        """:param device_mode: [str] HARDWARE, or SIMULATED to check the tests themselves without the car"""
+        self.device_mode = device_mode
+        self.pwm = Actuator(devices.get_pwm_driver(device_mode))
         self.pwm.set_pwm_freq(pwm_freq)
         print("Starting tests...")
 
     def test_head(self, up=150, down=120):
         time.sleep(1)
-        self.pwm.set_pwm(2, 0, up)
+        self.pwm.set_pwm(HEAD_CHANNEL, 0, up)
         print("Heads should be up (value of:{}".format(up))
         time.sleep(3)
-        self.pwm.set_pwm(2, 0, down)
+        self.pwm.set_pwm(HEAD_CHANNEL, 0, down)
         print("Heads should be down (value of:{}".format(down))
         time.sleep(1)
-        self.pwm.set_pwm(2, 0, 0)  # Why reinit on 0?
+        self.pwm.set_pwm(HEAD_CHANNEL, 0, 0)  # Why reinit on 0?
         print("End of head tests")
 
     def test_video_stream(self):
-        video_stream = PiVideoStream()
-        video_stream.test()
+        video_stream = devices.get_camera(self.device_mode)
+        save_test_image(video_stream)
         time.sleep(3)
-        video_stream.test()
+        save_test_image(video_stream)
         video_stream.stop()
         print("End of video-stream tests")
 
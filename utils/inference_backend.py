@@ -0,0 +1,112 @@
+"""
+Inference backends used to run the driving model.
+All backends take a float32 batch of normalized frames, shape (batch, 96, 160, 3), and return the list of the model
+outputs, in the same order as the Keras model: [direction probabilities, speed probabilities].
+
+    backend = get_backend("models/my_model.tflite")
+    predictions = backend.predict(batch)
+"""
+from pathlib import Path
+
+import numpy as np
+
+
+KERAS = "keras"
+TFLITE = "tflite"
+BACKEND_LIST = [KERAS, TFLITE]
+MODEL_OUTPUT_NAMES = ("direction", "speed")
+
+
+class KerasBackend:
+    """Full TensorFlow backend, loads a Keras model (.h5 file or SavedModel directory)."""
+
+    name = KERAS
+
+    def __init__(self, model_path):
+        import tensorflow as tf
+        from tensorflow.keras.models import load_model
+
+        self.model = load_model(model_path)
+        self._graph_predict = tf.function(self.model)
+
+    def predict(self, batch):
+        return [output.numpy() for output in self._graph_predict(batch)]
+
+
+class TFLiteBackend:
+    """
+    Lightweight backend running a TFLite flatbuffer with the tflite_runtime interpreter (never imports full TensorFlow
+    when tflite_runtime is installed). Quantized inputs and outputs are (de)quantized on the fly.
+    """
+
+    name = TFLITE
+
+    def __init__(self, model_path, num_threads=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ModuleNotFoundError:
+            print("WARNING: tflite_runtime not found, falling back on tensorflow.lite (slow import).")
+            from tensorflow.lite import Interpreter
+        self.interpreter = Interpreter(model_path=str(model_path), num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self.input_detail = self.interpreter.get_input_details()[0]
+        self.output_details = self._get_ordered_output_details()
+        self.batch_size = self.input_detail["shape"][0]
+
+    def _get_ordered_output_details(self):
+        """Sort the interpreter outputs as the Keras model outputs, using the model signature when available."""
+        output_details = self.interpreter.get_output_details()
+        try:
+            named_outputs = self.interpreter.get_signature_runner().get_output_details()
+        except (AttributeError, ValueError):
+            return output_details
+        if sorted(named_outputs) != sorted(MODEL_OUTPUT_NAMES):
+            return output_details
+        return [named_outputs[name] for name in MODEL_OUTPUT_NAMES]
+
+    @staticmethod
+    def _quantize(array, detail):
+        scale, zero_point = detail["quantization"]
+        if detail["dtype"] == np.float32 or scale == 0:
+            return array.astype(detail["dtype"], copy=False)
+        info = np.iinfo(detail["dtype"])
+        return np.clip(np.round(array / scale + zero_point), info.min, info.max).astype(detail["dtype"])
+
+    @staticmethod
+    def _dequantize(array, detail):
+        scale, zero_point = detail["quantization"]
+        if detail["dtype"] == np.float32 or scale == 0:
+            return array
+        return (array.astype(np.float32) - zero_point) * scale
+
+    def _resize_input(self, batch_size):
+        self.interpreter.resize_tensor_input(self.input_detail["index"], [batch_size, *self.input_detail["shape"][1:]])
+        self.interpreter.allocate_tensors()
+        self.input_detail = self.interpreter.get_input_details()[0]
+        self.output_details = self._get_ordered_output_details()
+        self.batch_size = batch_size
+
+    def predict(self, batch):
+        if len(batch) != self.batch_size:
+            self._resize_input(len(batch))
+        self.interpreter.set_tensor(self.input_detail["index"], self._quantize(batch, self.input_detail))
+        self.interpreter.invoke()
+        return [self._dequantize(self.interpreter.get_tensor(detail["index"]), detail)
+                for detail in self.output_details]
+
+
+def get_backend(model_path, backend=None, num_threads=None):
+    """
+    Return the inference backend for the model.
+    :param model_path:      [str]       Path to the model
+    :param backend:         [str]       One of BACKEND_LIST. If None, deduced from the model file extension.
+    :param num_threads:     [int]       Number of threads used by the TFLite interpreter. Ignored by Keras backend.
+    :return:                [object]    Backend object with a 'predict' method
+    """
+    if backend is None:
+        backend = TFLITE if Path(model_path).suffix == ".tflite" else KERAS
+    if backend == KERAS:
+        return KerasBackend(model_path)
+    if backend == TFLITE:
+        return TFLiteBackend(model_path, num_threads=num_threads)
+    raise ValueError(f'Unknown backend "{backend}". Valid backends are: {BACKEND_LIST}')
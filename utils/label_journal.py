@@ -0,0 +1,131 @@
+"""
+Append only JSON Lines journal of the labels of a capture session. Each label is written on its own line as soon as its
+picture is saved, and the file is fsync-ed periodically, so that a crash or a power loss loses at most the last
+'fsync_period' seconds of labels. At the end of the session, the journal is compacted into the usual labels json file
+({img_id: label, ...}).
+The fields common to every label of a session (car setting, hardware conf...) can be written once, as a header line
+{"session": {...}}: the labels that follow only hold their own fields and are merged into the header when read.
+
+    journal = LabelJournal("pictures/labels_20200204T15-23-08-574348.jsonl", session=session_metadata)
+    journal.append(img_id, label)
+    journal.close()
+    compact_journal(journal.file, "pictures/labels_20200204T15-23-08-574348.json")
+"""
+import copy
+import json
+import os
+import time
+from pathlib import Path
+
+
+JOURNAL_SUFFIX = ".jsonl"
+
+
+class LabelJournal:
+    def __init__(self, file, fsync_period=1.0, session=None):
+        """
+        :param file:            [str]       Path to the journal. Appended to if it exists
+        :param fsync_period:    [float]     Max time in second between two fsync. 0 to fsync after each label
+        :param session:         [dict]      Fields common to every label, written once at the start of the journal
+        """
+        self.file = Path(file)
+        self.fsync_period = fsync_period
+        self.nb_label = 0
+        self._nb_synced = 0
+        self._fp = self.file.open(mode='a', encoding='utf-8')
+        self._last_sync = time.time()
+        if session is not None:
+            self._fp.write(json.dumps({"session": session}) + "\n")
+            self.sync()
+
+    def append(self, img_id, label):
+        self._fp.write(json.dumps({"img_id": img_id, "label": label}) + "\n")
+        self._fp.flush()
+        self.nb_label += 1
+        if time.time() - self._last_sync >= self.fsync_period:
+            self.sync()
+
+    def sync(self):
+        """Flush the journal to the disk, if labels were appended since the last sync."""
+        if self._nb_synced < self.nb_label:
+            self._fp.flush()
+            os.fsync(self._fp.fileno())
+            self._nb_synced = self.nb_label
+        self._last_sync = time.time()
+
+    def close(self):
+        if not self._fp.closed:
+            self.sync()
+            self._fp.close()
+
+
+def merge_label(session, fields):
+    """
+    Return a new label made of the session fields updated with the label own fields. Nested dictionaries are merged
+    key by key and nothing is shared with the inputs.
+    :param session:     [dict]      Fields common to every label of a session
+    :param fields:      [dict]      Fields of one label
+    :return:            [dict]      Full label
+    """
+    label = copy.deepcopy(session)
+    for key, val in fields.items():
+        if isinstance(val, dict) and isinstance(label.get(key), dict):
+            label[key] = merge_label(label[key], val)
+        else:
+            label[key] = copy.deepcopy(val)
+    return label
+
+
+def read_journal(file):
+    """
+    Read a label journal. A later entry of an img_id replaces the earlier ones. An incomplete last line (interrupted
+    write) is ignored. Labels following a session header are merged into it.
+    :return:            [dict]      Dictionary of labels {img_id: label, ...}
+    """
+    d_label = {}
+    session = None
+    with Path(file).open(mode='r', encoding='utf-8') as fp:
+        lines = fp.read().split("\n")
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError:
+            if line_number == len(lines):
+                break  # last line written partially
+            raise
+        if "session" in entry:
+            session = entry["session"]
+            continue
+        d_label[entry["img_id"]] = entry["label"] if session is None else merge_label(session, entry["label"])
+    return d_label
+
+
+def read_label_file(file):
+    """Read a labels json file or a label journal (.jsonl). Return the dictionary of labels {img_id: label, ...}."""
+    if Path(file).suffix == JOURNAL_SUFFIX:
+        return read_journal(file)
+    with Path(file).open(mode='r', encoding='utf-8') as fp:
+        return json.load(fp)
+
+
+def compact_journal(journal_file, label_file, remove_journal=True):
+    """
+    Write the labels of a journal into a labels json file.
+    :param journal_file:    [str]       Path to the journal
+    :param label_file:      [str]       Path to the labels json file to write
+    :param remove_journal:  [bool]      Remove the journal once the labels json file is written
+    :return:                [int]       Number of labels written
+    """
+    d_label = read_journal(journal_file)
+    if d_label:
+        tmp_file = Path(label_file).with_suffix(".tmp")
+        with tmp_file.open(mode='w', encoding='utf-8') as fp:
+            json.dump(d_label, fp, indent=4)
+            fp.flush()
+            os.fsync(fp.fileno())
+        tmp_file.replace(label_file)
+    if remove_journal:
+        Path(journal_file).unlink()
+    return len(d_label)
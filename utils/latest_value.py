@@ -0,0 +1,56 @@
+import threading
+
+
+class LatestValue:
+    """
+    Single slot handoff between threads: every put overwrites the previous value ("latest value wins").
+    A consumer never blocks a producer and never gets a value older than the last one published.
+
+    Usage:
+        slot = LatestValue()
+        slot.put(item)                                  # producer side
+        version, item = slot.get(last_version=version)  # consumer side, blocks until a newer item is available
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._value = None
+        self._version = 0
+        self._closed = False
+
+    def put(self, value):
+        """Publish a new value, replacing the one not yet consumed (if any). Return the version of the new value."""
+        with self._cond:
+            self._value = value
+            self._version += 1
+            self._cond.notify_all()
+            return self._version
+
+    def get(self, last_version=0, timeout=None):
+        """
+        Wait for a value newer than 'last_version'.
+        :param last_version:    [int]       Version of the last value the caller has consumed
+        :param timeout:         [float]     Max time to wait in second. If None, wait until a value is available.
+        :return:                [tuple]     (version, value). If the timeout expires or the slot is closed before a
+                                            newer value is published, return (last_version, None)
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._version > last_version or self._closed, timeout=timeout)
+            if self._version > last_version:
+                return self._version, self._value
+            return last_version, None
+
+    def peek(self):
+        """Return (version, value) of the current value without waiting."""
+        with self._cond:
+            return self._version, self._value
+
+    def close(self):
+        """Wake up every waiting consumer. Values can still be read but 'get' won't block anymore."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
@@ -4,11 +4,11 @@ import time
 from picamera.array import PiRGBArray
 # noinspection PyUnresolvedReferences
 from picamera import PiCamera
-# noinspection PyUnresolvedReferences
-from PIL import Image
 from threading import Thread
 from conf.path import HARDWARE_TEST_IMAGES_DIRECTORY
 from conf.const import IMAGE_SIZE, FRAME_RATE, EXPOSURE_MODE
+from utils.frame_ring import FrameRing
+from utils.frame_source import FrameSource
 
 
 #initialize the camera
@@ -22,18 +22,22 @@ def init_cam():
     return camera, rawCapture
 
 
-class PiVideoStream:
-    def __init__(self):
+class PiVideoStream(FrameSource):
+    def __init__(self, ring_size=0):
+        """
+        :param ring_size:   [int]   If > 1, frames are written into a ring of 'ring_size' preallocated arrays instead
+                                    of a new array per frame. A frame returned by 'read' is then overwritten after
+                                    'ring_size' - 1 new captures.
+        """
+        super().__init__()
         # initialize the camera and stream
         self.camera, self.rawCapture = init_cam()
+        if ring_size > 1:
+            self.rawCapture.close()
+            self.rawCapture = FrameRing(size=IMAGE_SIZE, nb_slots=ring_size)
         self.stream = self.camera.capture_continuous(self.rawCapture,
                                                      format="rgb", use_video_port=True)
 
-        # initialize the frame and the variable used to indicate
-        # if the thread should be stopped
-        self.frame = None
-        self.stopped = False
-
     def start(self):
         # start the thread to read frames from the video stream
         Thread(target=self.update, args=()).start()
@@ -44,7 +48,7 @@ class PiVideoStream:
         for f in self.stream:
             # grab the frame from the stream and clear the stream in
             # preparation for the next frame
-            self.frame = f.array
+            self.publish(f.array)
             self.rawCapture.truncate(0)
 
             # if the thread indicator variable is set, stop the thread
@@ -53,17 +57,12 @@ class PiVideoStream:
                 self.stream.close()
                 self.rawCapture.close()
                 self.camera.close()
+                with self.new_frame:
+                    self.new_frame.notify_all()
                 return
 
-    def read(self):
-        # return the frame most recently read
-        return self.frame
-
-    def stop(self):
-        # indicate that the thread should be stopped
-        self.stopped = True
-
     def test(self):
+        from PIL import Image
         self.start()
         frame = self.read()
         img = Image.fromarray(frame)
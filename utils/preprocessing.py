@@ -0,0 +1,149 @@
+"""
+Image preprocessing shared by the race (utils.frame_ring input batches) and the training scripts, so that the models
+see the same input at training and inference time.
+Contract: pictures are uint8 RGB, (height, width, 3) or batches (batch, height, width, 3), as captured by the camera or
+decoded from the JPEG files. Model inputs are float32 between 0 and 1, unless the model rescales its input itself (see
+'get_rescaling_layer'): it is then fed with the uint8 values. No function computes in float64.
+Every numpy function works on a single picture or on a whole batch at once.
+"""
+import numpy as np
+
+# Factor from uint8 pixels to normalized float32 pixels
+PIXEL_SCALE = np.float32(1 / 255.0)
+# ITU-R 601 luma weights, as used by PIL 'L' conversion
+GRAYSCALE_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def normalize(images, out=None, scale=PIXEL_SCALE):
+    """
+    :param images:      [np.array]  uint8 picture(s)
+    :param out:         [np.array]  float32 array to write the result into, to avoid an allocation
+    :param scale:       [float]     PIXEL_SCALE, or 1.0 for a model rescaling its input itself
+    :return:            [np.array]  float32 picture(s) between 0 and 1
+    """
+    if out is None:
+        out = np.empty(images.shape, dtype=np.float32)
+    return np.multiply(images, np.float32(scale), out=out)
+
+
+def normalize_channels(images, mean, std, out=None):
+    """
+    Per channel standardization of float32 picture(s): (images - mean) / std.
+    :param mean:        [list]      Mean of each channel
+    :param std:         [list]      Standard deviation of each channel
+    """
+    mean = np.asarray(mean, dtype=np.float32)
+    inv_std = np.float32(1.0) / np.asarray(std, dtype=np.float32)
+    out = np.subtract(images, mean, out=out, dtype=np.float32)
+    return np.multiply(out, inv_std, out=out)
+
+
+def get_channel_stats(images):
+    """Return the per channel mean and standard deviation of picture(s), to be used by 'normalize_channels'."""
+    axes = tuple(range(images.ndim - 1))
+    return images.mean(axis=axes, dtype=np.float64).astype(np.float32), \
+        images.std(axis=axes, dtype=np.float64).astype(np.float32)
+
+
+def crop(images, top=0, bottom=0, left=0, right=0):
+    """Remove rows and columns on the picture(s) edges. Return a view, nothing is copied."""
+    height, width = images.shape[-3:-1]
+    return images[..., top:height - bottom, left:width - right, :]
+
+
+def resize(images, size):
+    """
+    Nearest neighbour resize of picture(s), with a single fancy indexing for the whole batch.
+    :param size:        [tuple]     (width, height), as IMAGE_SIZE
+    """
+    width, height = size
+    in_height, in_width = images.shape[-3:-1]
+    if (in_width, in_height) == (width, height):
+        return images
+    rows = (np.arange(height) * in_height // height)[:, np.newaxis]
+    cols = np.arange(width) * in_width // width
+    return images[..., rows, cols, :]
+
+
+def to_grayscale(images, keep_channels=False):
+    """
+    :param keep_channels:   [bool]      Repeat the gray level on 3 channels, to keep the input shape of a RGB model
+    :return:                [np.array]  float32 picture(s) with 1 (or 3) channel(s), in the range of the input
+    """
+    gray = np.dot(images, GRAYSCALE_WEIGHTS)[..., np.newaxis]
+    return np.repeat(gray, 3, axis=-1) if keep_channels else gray
+
+
+class Preprocessing:
+    """
+    Preprocessing of uint8 pictures into model inputs, applied to a whole batch at once: crop, resize, grayscale, then
+    normalization (0 to 1) and optional per channel standardization.
+
+    Usage:
+        preprocessing = Preprocessing(crop_box=(20, 0, 0, 0), size=(160, 76))
+        inputs = preprocessing(images)
+    """
+
+    def __init__(self, crop_box=None, size=None, grayscale=False, mean=None, std=None, rescale=True):
+        """
+        :param crop_box:    [tuple]     (top, bottom, left, right) number of rows / columns removed. None to keep all
+        :param size:        [tuple]     (width, height) after the crop. None to keep the size
+        :param grayscale:   [bool]      Convert to gray levels (1 channel)
+        :param mean:        [list]      Per channel mean of the normalized pictures, to standardize them (with 'std')
+        :param std:         [list]      Per channel standard deviation of the normalized pictures
+        :param rescale:     [bool]      Scale pixels between 0 and 1. False if the model rescales its input itself
+        """
+        self.crop_box = crop_box
+        self.size = size
+        self.grayscale = grayscale
+        self.mean = mean
+        self.std = std
+        self.rescale = rescale
+
+    def __call__(self, images):
+        """
+        :param images:      [np.array]  uint8 picture or batch of pictures
+        :return:            [np.array]  float32 model input(s)
+        """
+        if self.crop_box is not None:
+            images = crop(images, *self.crop_box)
+        if self.size is not None:
+            images = resize(images, self.size)
+        if self.grayscale:
+            images = to_grayscale(images)
+            if self.rescale:
+                np.multiply(images, PIXEL_SCALE, out=images)
+        else:
+            images = normalize(images, scale=PIXEL_SCALE if self.rescale else 1.0)
+        if self.mean is not None:
+            normalize_channels(images, self.mean, self.std, out=images)
+        return images
+
+
+def tf_normalize(image):
+    """Tensorflow version of 'normalize', for tf.data pipelines: uint8 tensor to float32 tensor between 0 and 1."""
+    import tensorflow as tf
+    return tf.cast(image, tf.float32) * PIXEL_SCALE
+
+
+def tf_load_image(image_path, rescale=True):
+    """
+    Read and decode a JPEG picture in a tf.data pipeline.
+    :param rescale:     [bool]      Normalize the picture. False to keep uint8 values (model rescaling its input)
+    """
+    import tensorflow as tf
+    image = tf.image.decode_jpeg(tf.io.read_file(image_path), channels=3)
+    return tf_normalize(image) if rescale else image
+
+
+def get_rescaling_layer(name="rescaling"):
+    """
+    Keras layer normalizing uint8 pixel values (0-255) inside the model. A model starting with it takes the pictures
+    as they are and its tflite conversion can keep a uint8 input.
+    """
+    import tensorflow as tf
+    try:
+        rescaling = tf.keras.layers.Rescaling
+    except AttributeError:  # tensorflow < 2.6
+        rescaling = tf.keras.layers.experimental.preprocessing.Rescaling
+    return rescaling(scale=float(PIXEL_SCALE), name=name)
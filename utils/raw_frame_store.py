@@ -0,0 +1,165 @@
+"""
+Raw frame store: uint8 frames of a fixed shape appended as fixed size records to a memory mapped binary file, grown
+chunk by chunk, plus an index (JSON Lines) mapping each record to the picture file name it stands for. Storing a frame
+is a memory copy: the JPEG encoding is left to the desktop (see 'transcode_raw_store' and get_data/transcode_raw.py).
+
+    store = RawFrameStore("pictures/labels_20200204T15-23-08-574348.raw")
+    store.append(frame, "20200204T15-23-09-123456.jpg")
+    store.close()
+    transcode_raw_store("pictures/labels_20200204T15-23-08-574348.raw")
+
+The index is written after the frame data, so that a crash leaves at most the last records unreferenced. Its first line
+describes the records: {"shape": [96, 160, 3], "dtype": "uint8"}, then one line per frame: {"slot": 0, "file_name": ...}
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from threading import Lock
+
+import numpy as np
+
+from conf.const import IMAGE_SIZE
+
+
+RAW_SUFFIX = ".raw"
+INDEX_SUFFIX = ".idx"
+DEFAULT_SHAPE = (IMAGE_SIZE[1], IMAGE_SIZE[0], 3)
+
+
+def get_index_file(raw_file):
+    return Path(raw_file).with_suffix(INDEX_SUFFIX)
+
+
+class RawFrameStore:
+    def __init__(self, file, shape=DEFAULT_SHAPE, chunk_size=256):
+        """
+        :param file:        [str]       Path to the raw data file. Its index is the same path with a .idx suffix
+        :param shape:       [tuple]     Shape of the frames (height, width, channels)
+        :param chunk_size:  [int]       Number of records the data file is grown by when full
+        """
+        self.file = Path(file)
+        self.shape = tuple(shape)
+        self.chunk_size = chunk_size
+        self.record_size = int(np.prod(self.shape))
+        self.nb_frame = 0
+        self._lock = Lock()
+        self._chunk = None
+        self._chunk_index = -1
+        self._data_fp = self.file.open(mode='w+b')
+        self._index_fp = get_index_file(self.file).open(mode='w', encoding='utf-8')
+        self._index_fp.write(json.dumps({"shape": list(self.shape), "dtype": "uint8"}) + "\n")
+
+    def append(self, frame, file_name):
+        """
+        Copy a frame into the store. Thread safe.
+        :param frame:       [np.array]  uint8 frame of the store shape
+        :param file_name:   [str]       Name of the picture file the frame is transcoded to
+        :return:            [int]       Slot of the frame in the store
+        """
+        if frame.shape != self.shape:
+            raise ValueError(f'Frame shape {frame.shape} doesn\'t match the store shape {self.shape}')
+        with self._lock:
+            slot = self.nb_frame
+            chunk_index, position = divmod(slot, self.chunk_size)
+            if chunk_index != self._chunk_index:
+                self._map_chunk(chunk_index)
+            self._chunk[position] = frame
+            self._index_fp.write(json.dumps({"slot": slot, "file_name": file_name}) + "\n")
+            self._index_fp.flush()
+            self.nb_frame += 1
+        return slot
+
+    def _map_chunk(self, chunk_index):
+        chunk_bytes = self.chunk_size * self.record_size
+        if self._chunk is not None:
+            self._chunk.flush()
+        self._data_fp.truncate((chunk_index + 1) * chunk_bytes)
+        self._chunk = np.memmap(self._data_fp, dtype=np.uint8, mode='r+', offset=chunk_index * chunk_bytes,
+                                shape=(self.chunk_size,) + self.shape)
+        self._chunk_index = chunk_index
+
+    def close(self):
+        """Flush the frames and the index to the disk and trim the unused records of the last chunk."""
+        with self._lock:
+            if self._data_fp.closed:
+                return
+            if self._chunk is not None:
+                self._chunk.flush()
+                self._chunk = None
+            self._data_fp.truncate(self.nb_frame * self.record_size)
+            os.fsync(self._data_fp.fileno())
+            self._data_fp.close()
+            self._index_fp.flush()
+            os.fsync(self._index_fp.fileno())
+            self._index_fp.close()
+
+
+def read_raw_index(raw_file):
+    """
+    Read the index of a raw frame store. An incomplete last line (interrupted write) is ignored.
+    :return:            [tuple]     (frame shape, list of (slot, file_name))
+    """
+    with get_index_file(raw_file).open(mode='r', encoding='utf-8') as fp:
+        lines = [line for line in fp.read().split("\n") if line.strip()]
+    shape = tuple(json.loads(lines[0])["shape"])
+    l_entry = []
+    for line_number, line in enumerate(lines[1:], start=2):
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError:
+            if line_number == len(lines):
+                break  # last line written partially
+            raise
+        l_entry.append((entry["slot"], entry["file_name"]))
+    return shape, l_entry
+
+
+def read_raw_store(raw_file):
+    """
+    Generator over the frames of a raw frame store.
+    :return:            [generator] (file_name, read only uint8 np.array) for every indexed frame
+    """
+    shape, l_entry = read_raw_index(raw_file)
+    record_size = int(np.prod(shape))
+    nb_record = os.path.getsize(raw_file) // record_size
+    if nb_record == 0:
+        return
+    frames = np.memmap(raw_file, dtype=np.uint8, mode='r', shape=(nb_record,) + shape)
+    for slot, file_name in l_entry:
+        if slot < nb_record:
+            yield file_name, frames[slot]
+
+
+def transcode_raw_store(raw_file, output_dir=None, nb_workers=4, remove=False, overwrite=False):
+    """
+    Encode the frames of a raw frame store into the JPEG pictures their labels point to.
+    :param raw_file:    [str]       Path to the raw data file
+    :param output_dir:  [str]       Folder of the pictures. Default is the folder of the raw data file
+    :param nb_workers:  [int]       Number of threads encoding pictures
+    :param remove:      [bool]      Remove the raw data file and its index once every picture is written
+    :param overwrite:   [bool]      Encode the pictures that already exist again
+    :return:            [int]       Number of pictures written
+    """
+    from PIL import Image
+
+    output_dir = Path(raw_file).parent if output_dir is None else Path(output_dir)
+
+    def encode(item):
+        file_name, frame = item
+        picture_file = output_dir / file_name
+        if picture_file.exists() and not overwrite:
+            return 0
+        Image.fromarray(np.asarray(frame), 'RGB').save(picture_file)
+        return 1
+
+    with ThreadPoolExecutor(max_workers=nb_workers) as executor:
+        nb_written = sum(executor.map(encode, read_raw_store(raw_file)))
+    if remove:
+        remove_raw_store(raw_file)
+    return nb_written
+
+
+def remove_raw_store(raw_file):
+    Path(raw_file).unlink()
+    get_index_file(raw_file).unlink()
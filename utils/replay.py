@@ -0,0 +1,103 @@
+"""
+Replay of a recorded session (pictures + labels json, as written by TrainingSession or by race debug mode) to run the
+race loop without the car: ReplayVideoStream stands for PiVideoStream, and utils.simulators.SimulatedPCA9685 for the
+Adafruit PWM driver.
+See replay_race.py for the benchmark script.
+"""
+import time
+from pathlib import Path
+from threading import Thread
+
+import numpy as np
+from PIL import Image
+
+from conf.const import IMAGE_SIZE
+from utils.frame_source import FrameSource
+from utils.label_journal import read_label_file
+
+
+def load_session(path, nb_frames=None):
+    """
+    Load the pictures of a recorded session, in capture order (sorted by img_id).
+    :param path:        [str]       Labels json file or label journal (pictures in the same folder) or directory
+                                    holding one or more labels*.json(l) files and their pictures
+    :param nb_frames:   [int]       Max number of pictures to load. All by default
+    :return:            [tuple]     (list of uint8 np.array of shape (96, 160, 3), list of the matching labels)
+    """
+    path = Path(path)
+    l_label_file = sorted(path.glob("labels*.json*")) if path.is_dir() else [path]
+    d_label = {}
+    for label_file in l_label_file:
+        for img_id, label in read_label_file(label_file).items():
+            d_label[img_id] = (label_file.parent / label["file_name"], label)
+    frames, labels = [], []
+    for img_id in sorted(d_label)[:nb_frames]:
+        picture_file, label = d_label[img_id]
+        image = Image.open(picture_file).convert("RGB")
+        if image.size != IMAGE_SIZE:
+            image = image.resize(IMAGE_SIZE)
+        frames.append(np.asarray(image, dtype=np.uint8))
+        labels.append(label)
+    return frames, labels
+
+
+class ReplayVideoStream(FrameSource):
+    """
+    Threaded video stream publishing recorded frames, with the same interface as PiVideoStream.
+    If fps is None, frames are replayed in lockstep: a frame is published as soon as the previous one has been read, so
+    that the consumer runs as fast as possible and no frame is dropped. Otherwise, frames are published at 'fps', as
+    the camera would, whether they are read or not.
+    'finished' is set once the last frame has been published.
+    """
+
+    def __init__(self, frames, fps=None):
+        super().__init__()
+        self.frames = frames
+        self.fps = fps
+        self.finished = False
+
+    def start(self):
+        Thread(target=self.update, args=(), daemon=True).start()
+        return self
+
+    def update(self):
+        next_time = time.perf_counter()
+        for frame in self.frames:
+            if self.fps is None:
+                with self.new_frame:
+                    self.new_frame.wait_for(lambda: self.last_read_seq >= self.frame_seq or self.stopped)
+            else:
+                time.sleep(max(0.0, next_time - time.perf_counter()))
+                next_time += 1 / self.fps
+            if self.stopped:
+                break
+            self.publish(frame)
+        with self.new_frame:
+            self.finished = True
+            self.new_frame.notify_all()
+
+    def read_stamped(self):
+        stamped = super().read_stamped()
+        self._notify_read()
+        return stamped
+
+    def read_new(self, timeout=None, last_seq=None):
+        stamped = super().read_new(timeout=timeout, last_seq=last_seq)
+        self._notify_read()
+        return stamped
+
+    def _notify_read(self):
+        # lockstep mode: wakes up the replay thread waiting for the last frame to be read
+        with self.new_frame:
+            self.new_frame.notify_all()
+
+    def wait_finished(self, timeout=None):
+        """
+        Wait until every frame has been published and the last one has been read.
+        :param timeout:     [float]     Max time to wait for the last frame to be read once published, in second
+        :return:            [bool]      False if the last frame was not read in time
+        """
+        with self.new_frame:
+            self.new_frame.wait_for(lambda: self.finished or self.stopped)
+            return self.new_frame.wait_for(lambda: self.last_read_seq >= self.frame_seq or self.stopped,
+                                           timeout=timeout)
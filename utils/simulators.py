@@ -0,0 +1,179 @@
+"""
+In-process simulators of the car devices, to run and profile the race and training loops without the car:
+    - SimulatedCamera: camera publishing synthetic or recorded frames at the camera frame rate
+    - SimulatedPCA9685: PWM driver recording its commands and emulating the I2C write time
+    - SimulatedGamepad: Xbox controller playing a script of stick and button inputs
+They implement the device interfaces described in utils.devices.
+"""
+import bisect
+import math
+import time
+from threading import Thread
+
+import numpy as np
+
+from conf.const import IMAGE_SIZE, FRAME_RATE
+from get_data.src.xbox import Gamepad, JoystickState, IDLE_STATE
+from utils.frame_source import FrameSource
+
+
+# PCA9685 I2C transaction sizes in bytes: device address + register address + 4 bytes (ON_L, ON_H, OFF_L, OFF_H) per
+# channel. Each byte takes 9 clock cycles on the bus (8 bits + ack).
+I2C_HEADER_BYTES = 2
+I2C_CHANNEL_BYTES = 4
+I2C_BITS_PER_BYTE = 9
+
+
+def synthetic_frames(nb_frames=64, shape=(IMAGE_SIZE[1], IMAGE_SIZE[0], 3)):
+    """
+    Frames of a bright vertical band sweeping left and right over a gradient, so that consecutive frames differ.
+    :return:            [list]      list of uint8 np.array of shape 'shape'
+    """
+    height, width, _ = shape
+    background = np.tile(np.linspace(0, 120, width, dtype=np.uint8), (height, 1))
+    frames = []
+    for i in range(nb_frames):
+        frame = np.repeat(background[:, :, np.newaxis], shape[2], axis=2)
+        center = int((0.5 + 0.4 * math.sin(2 * math.pi * i / nb_frames)) * width)
+        frame[:, max(center - 8, 0):center + 8, :] = 255
+        frames.append(frame)
+    return frames
+
+
+class SimulatedCamera(FrameSource):
+    """
+    Threaded video stream with the same interface as PiVideoStream, publishing 'frames' at 'fps' whether they are read
+    or not, over and over if 'loop' is True.
+    """
+
+    def __init__(self, frames=None, fps=FRAME_RATE, loop=True):
+        """:param frames: [list] uint8 frames to publish (see utils.replay.load_session). Default: synthetic frames"""
+        super().__init__()
+        self.frames = synthetic_frames() if frames is None else frames
+        self.fps = fps
+        self.loop = loop
+
+    def start(self):
+        Thread(target=self.update, args=(), daemon=True).start()
+        return self
+
+    def update(self):
+        next_time = time.perf_counter()
+        while not self.stopped:
+            for frame in self.frames:
+                time.sleep(max(0.0, next_time - time.perf_counter()))
+                next_time += 1 / self.fps
+                if self.stopped:
+                    return
+                self.publish(frame)
+            if not self.loop:
+                return
+
+
+class SimulatedPCA9685:
+    """
+    Stand-in for Adafruit_PCA9685.PCA9685 recording every command as (time, channel, on, off) in 'commands'.
+    Each write (set_pwm or set_pwm_block) waits for 'write_latency' plus, if 'bus_speed' is set, the time to send its
+    bytes on the I2C bus: about 0.5ms for a single channel at 100kHz.
+    """
+
+    def __init__(self, write_latency=0.0, bus_speed=None):
+        """
+        :param write_latency:   [float]     Fixed time of a write in second (driver call, bus arbitration)
+        :param bus_speed:       [int]       I2C clock in Hz (100000 or 400000 on the Raspberry Pi). None to ignore
+        """
+        self.write_latency = write_latency
+        self.bus_speed = bus_speed
+        self.freq = None
+        self.commands = []
+        self.nb_write = 0
+        self.write_time = 0.0
+
+    def get_write_time(self, nb_channel=1):
+        """Simulated duration in second of a write of 'nb_channel' consecutive channels."""
+        write_time = self.write_latency
+        if self.bus_speed:
+            nb_byte = I2C_HEADER_BYTES + I2C_CHANNEL_BYTES * nb_channel
+            write_time += nb_byte * I2C_BITS_PER_BYTE / self.bus_speed
+        return write_time
+
+    def _write(self, nb_channel):
+        write_time = self.get_write_time(nb_channel)
+        if write_time > 0:
+            time.sleep(write_time)
+        self.nb_write += 1
+        self.write_time += write_time
+
+    def set_pwm_freq(self, freq_hz):
+        self.freq = freq_hz
+
+    def set_pwm(self, channel, on, off):
+        self._write(1)
+        self.commands.append((time.time(), channel, on, off))
+
+    def set_pwm_block(self, first_channel, l_value):
+        """Block write of consecutive channels, l_value being their (on, off) values. A single simulated write."""
+        self._write(len(l_value))
+        now = time.time()
+        for channel, (on, off) in enumerate(l_value, start=first_channel):
+            self.commands.append((now, channel, on, off))
+
+    def get_channel_commands(self, channel):
+        """Return the list of 'off' values written to a channel."""
+        return [off for _, command_channel, _, off in self.commands if command_channel == channel]
+
+
+def gamepad_state(left_x=0.0, left_y=0.0, right_x=0.0, right_y=0.0, left_trigger=0.0, right_trigger=0.0,
+                  pressed=()):
+    """
+    Build a JoystickState from scaled values, as returned by the Gamepad methods.
+    :param left_x:          [float]     Sticks between -1.0 and 1.0, triggers between 0.0 and 1.0
+    :param pressed:         [tuple]     Buttons pressed (xbox.BUTTON_A...)
+    """
+    def raw_axis(value):
+        return int(round(value * (32767 if value > 0 else 32768)))
+
+    return IDLE_STATE._replace(connected=True, left_x=raw_axis(left_x), left_y=raw_axis(left_y),
+                               right_x=raw_axis(right_x), right_y=raw_axis(right_y),
+                               left_trigger=int(round(255 * left_trigger)),
+                               right_trigger=int(round(255 * right_trigger)),
+                               buttons=tuple(int(button in pressed) for button in range(len(IDLE_STATE.buttons))))
+
+
+class KeyframeScript:
+    """Gamepad script holding each keyframe state until the next one: 'l_keyframe' is a list of (time, JoystickState)"""
+
+    def __init__(self, l_keyframe):
+        self.l_keyframe = sorted(l_keyframe, key=lambda keyframe: keyframe[0])
+        self.times = [keyframe_time for keyframe_time, _ in self.l_keyframe]
+
+    def __call__(self, elapsed_time):
+        pos = bisect.bisect_right(self.times, elapsed_time)
+        return IDLE_STATE if pos == 0 else self.l_keyframe[pos - 1][1]
+
+
+class SimulatedGamepad(Gamepad):
+    """
+    Gamepad playing a script: a function of the time since start (in second) returning a JoystickState (see
+    gamepad_state and KeyframeScript). The script is sampled at 'rate' Hz by a background thread and, as xboxdrv does,
+    a new snapshot is published only when the input changes.
+    """
+
+    def __init__(self, script, rate=125):
+        super().__init__()
+        self.script = script if callable(script) else KeyframeScript(script)
+        self.rate = rate
+        self.start_time = time.time()
+        Thread(target=self._read_events, daemon=True).start()
+
+    def _read_events(self):
+        period = 1 / self.rate
+        next_time = time.perf_counter()
+        while not self.stopped:
+            now = time.time()
+            state = self.script(now - self.start_time)
+            if state._replace(timestamp=0) != self.state._replace(timestamp=0):
+                self.state = JoystickState(now, *state[1:])
+                self.nb_event += 1
+            next_time += period
+            time.sleep(max(0.0, next_time - time.perf_counter()))
@@ -0,0 +1,84 @@
+"""
+Temporal smoothing of the model outputs (softmax probabilities), to avoid the steering flickering between adjacent
+labels. A smoother takes the list of the model outputs for the latest frame, one 1D array per output, and returns the
+smoothed list, to be argmaxed.
+
+    smoother = get_smoother(EMA, 0.5)
+    direction_proba, speed_proba = smoother.update([direction_proba, speed_proba])
+"""
+from collections import deque
+
+import numpy as np
+
+
+NO_SMOOTHING = "none"
+EMA = "ema"
+WINDOW = "window"
+SMOOTHING_LIST = [NO_SMOOTHING, EMA, WINDOW]
+
+
+class NoSmoother:
+    # Mean delay introduced by the smoothing, in number of frames
+    lag = 0
+
+    def update(self, l_proba):
+        return l_proba
+
+    def reset(self):
+        pass
+
+
+class EmaSmoother:
+    """Exponential moving average: smoothed = alpha * latest + (1 - alpha) * smoothed."""
+
+    def __init__(self, alpha=0.5):
+        if not 0 < alpha <= 1:
+            raise ValueError(f'EMA alpha must be in ]0, 1], got {alpha}')
+        self.alpha = alpha
+        self.lag = (1 - alpha) / alpha
+        self.l_smoothed = None
+
+    def update(self, l_proba):
+        if self.l_smoothed is None:
+            self.l_smoothed = [np.array(proba, dtype=np.float32) for proba in l_proba]
+        else:
+            for smoothed, proba in zip(self.l_smoothed, l_proba):
+                smoothed *= 1 - self.alpha
+                smoothed += self.alpha * proba
+        return self.l_smoothed
+
+    def reset(self):
+        self.l_smoothed = None
+
+
+class WindowSmoother:
+    """Mean of the outputs of the 'size' latest frames."""
+
+    def __init__(self, size=3):
+        if size < 1:
+            raise ValueError(f'Window size must be at least 1, got {size}')
+        self.lag = (size - 1) / 2
+        self.window = deque(maxlen=size)
+
+    def update(self, l_proba):
+        self.window.append(l_proba)
+        return [np.mean(outputs, axis=0) for outputs in zip(*self.window)]
+
+    def reset(self):
+        self.window.clear()
+
+
+def get_smoother(smoothing=NO_SMOOTHING, param=None):
+    """
+    Return a smoother.
+    :param smoothing:   [str]       One of SMOOTHING_LIST. None is NO_SMOOTHING
+    :param param:       [float]     EMA alpha (default 0.5) or window size (default 3)
+    :return:            [object]    Smoother with 'update', 'reset' and 'lag'
+    """
+    if smoothing is None or smoothing == NO_SMOOTHING:
+        return NoSmoother()
+    if smoothing == EMA:
+        return EmaSmoother(0.5 if param is None else param)
+    if smoothing == WINDOW:
+        return WindowSmoother(3 if param is None else int(param))
+    raise ValueError(f'Unknown smoothing "{smoothing}". Valid smoothings are: {SMOOTHING_LIST}')
@@ -0,0 +1,106 @@
+import json
+import math
+from pathlib import Path
+
+
+class LatencyHistogram:
+    """
+    Fixed memory latency histogram: durations (in second) are counted in log spaced buckets, so that percentiles are
+    known within 'growth' relative precision (5% by default) whatever the number of samples.
+    """
+
+    def __init__(self, min_value=1e-5, max_value=10.0, growth=1.05):
+        self.min_value = min_value
+        self.growth = growth
+        self._inv_log_growth = 1 / math.log(growth)
+        self.nb_buckets = int(math.ceil(math.log(max_value / min_value) * self._inv_log_growth)) + 2
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * self.nb_buckets
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        if value <= self.min_value:
+            index = 0
+        else:
+            index = min(int(math.log(value / self.min_value) * self._inv_log_growth) + 1, self.nb_buckets - 1)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percent):
+        """Return the upper bound of the bucket holding the percentile (capped by the max value seen), or None."""
+        if self.count == 0:
+            return None
+        rank = percent / 100 * self.count
+        cumulated = 0
+        for index, count in enumerate(self.counts):
+            cumulated += count
+            if cumulated >= rank and count > 0:
+                if index == self.nb_buckets - 1:  # overflow bucket
+                    return self.max
+                return min(self.min_value * self.growth ** index, self.max)
+        return self.max
+
+    def to_dict(self):
+        """Summary in millisecond."""
+        if self.count == 0:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean_ms": 1000 * self.total / self.count,
+            "p50_ms": 1000 * self.percentile(50),
+            "p95_ms": 1000 * self.percentile(95),
+            "p99_ms": 1000 * self.percentile(99),
+            "max_ms": 1000 * self.max
+        }
+
+
+class StageTimer:
+    """
+    One LatencyHistogram per stage of a loop.
+
+    Usage:
+        timer = StageTimer(["inference", "pwm"])
+        start = time.perf_counter()
+        ...
+        timer.add("inference", time.perf_counter() - start)
+        print(timer)
+    """
+
+    def __init__(self, stages):
+        self.histograms = {stage: LatencyHistogram() for stage in stages}
+
+    def add(self, stage, duration):
+        self.histograms[stage].add(duration)
+
+    def __getitem__(self, stage):
+        return self.histograms[stage]
+
+    def reset(self):
+        for histogram in self.histograms.values():
+            histogram.reset()
+
+    def to_dict(self):
+        return {stage: histogram.to_dict() for stage, histogram in self.histograms.items()}
+
+    def __str__(self):
+        lines = [f'{"stage":<16}{"count":>8}{"mean":>9}{"p50":>9}{"p95":>9}{"p99":>9}{"max":>9}  (ms)']
+        for stage, summary in self.to_dict().items():
+            if summary["count"] == 0:
+                lines.append(f'{stage:<16}{0:>8}')
+                continue
+            lines.append(f'{stage:<16}{summary["count"]:>8}{summary["mean_ms"]:>9.2f}{summary["p50_ms"]:>9.2f}'
+                         f'{summary["p95_ms"]:>9.2f}{summary["p99_ms"]:>9.2f}{summary["max_ms"]:>9.2f}')
+        return "\n".join(lines)
+
+    def dump(self, file):
+        """Write the summary of every stage to a json file."""
+        Path(file).parent.mkdir(parents=True, exist_ok=True)
+        with Path(file).open(mode='w', encoding='utf-8') as fp:
+            json.dump(self.to_dict(), fp, indent=4)